@@ -2,9 +2,15 @@ import logging
 from fastapi import APIRouter
 from app.routes.user import router as user_router
 from app.routes.auth import router as auth_router
+from app.controllers.product_controller import router as product_router
+from app.routes.health import router as health_router
+from app.routes.metrics import router as metrics_router
 
 api_router = APIRouter()
 
 # Include routers
 api_router.include_router(auth_router)
 api_router.include_router(user_router)
+api_router.include_router(product_router)
+api_router.include_router(health_router)
+api_router.include_router(metrics_router)
@@ -1,57 +1,326 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
-from app.models.product import ProductModel, ProductCreateModel, ProductUpdateModel
-from app.services.product_service import ProductService
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorCollection
+from app.models.product_model import (
+    ProductModel,
+    ProductCreateModel,
+    ProductUpdateModel,
+    ProductImportResult,
+    ProductFilterModel,
+    ProductAuditEventModel,
+    CategorySummaryModel,
+    StockCommitResult,
+    StockReleaseResult,
+    StockReservationRequest,
+    StockReservationResult,
+    parse_product_fields,
+)
+from app.services.product_service import ProductService, PRODUCTS_COLLECTION, product_cache, fetch_products_by_id
+from app.core.config import PRODUCT_EVENTS_HEARTBEAT_SECONDS
+from app.core.events import ProductEventSubscription, encode_sse, product_events
 from app.services.logging_service import LoggingService
-from app.db.mongodb_client import get_product_collection
-from pymongo.collection import Collection
+from app.repositories.audit_repository import AuditRepository
+from app.repositories.category_stats_repository import CategoryStatsRepository
+from app.core.db import get_mongo_db
+from app.utils.product_io import parse_csv, parse_ndjson, encode_csv, encode_ndjson
+from app.utils.serialization import FastJSONResponse
+from app.utils.dataloader import DataLoader
+from app.utils.conditional import etag_matches, etag_version, http_date, modified_since, version_etag
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+# Dependency to get the products collection on the shared Motor client
+def get_product_collection() -> AsyncIOMotorCollection:
+    return get_mongo_db()[PRODUCTS_COLLECTION]
+
+# Shared across requests so concurrent lookups of the same products go out as one `$in` query
+product_loader = DataLoader(lambda ids: fetch_products_by_id(get_product_collection(), ids))
+
 # Dependency to get ProductService instance
-def get_product_service(collection: Collection = Depends(get_product_collection)):
-    return ProductService(collection)
+def get_product_service(collection: AsyncIOMotorCollection = Depends(get_product_collection)):
+    return ProductService(
+        collection, cache=product_cache, loader=product_loader, events=product_events, stats=CategoryStatsRepository()
+    )
+
+# Dependency to parse the sparse fieldset requested with `fields=name,price`
+def get_product_fields(fields: Optional[str] = None):
+    if not fields:
+        return None
+    try:
+        return parse_product_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 # Dependency to get LoggingService instance
 def get_logging_service():
-    return LoggingService()
+    return LoggingService(repository=AuditRepository())
+
+def validator_headers(version: Optional[int], updated_at=None) -> dict:
+    headers = {"ETag": version_etag(version)}
+    if updated_at is not None:
+        headers["Last-Modified"] = http_date(updated_at)
+    return headers
 
 @router.get("/", response_model=List[ProductModel])
-def list_products(skip: int = 0, limit: int = 100, service: ProductService = Depends(get_product_service)):
-    """Get a list of products."""
-    return service.get_products(skip=skip, limit=limit)
+async def list_products(
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock_only: bool = False,
+    sort: str = Query("_id", description="_id, price or name; prefix with - for descending"),
+    fields: Optional[Tuple[str, ...]] = Depends(get_product_fields),
+    fast: bool = Query(False, description="Send stored documents without re-validation"),
+    service: ProductService = Depends(get_product_service)
+):
+    """
+    Get a filtered, sorted list of products. Pass the `X-Next-Cursor` header of a page as `cursor` to fetch the next one.
+    Send the page's `ETag` back in `If-None-Match` to get `304 Not Modified` while none of its products changed.
+    """
+    filters = ProductFilterModel(
+        category=category,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock_only=in_stock_only,
+        sort=sort
+    )
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # Revalidation reads only ids and versions; the page itself is read only when it changed
+        etag = await service.get_products_page_etag(skip=skip, limit=limit, cursor=cursor, filters=filters)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    products, next_cursor, etag = await service.get_products_page_with_etag(
+        skip=skip, limit=limit, cursor=cursor, filters=filters, fields=fields, raw=fast
+    )
+    headers = {"ETag": etag}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if fast:
+        return FastJSONResponse(content=products, headers=headers)
+    if fields:
+        # Trimmed products do not satisfy ProductModel; send them as they are
+        return JSONResponse(content=jsonable_encoder([product.dict(by_alias=True) for product in products]), headers=headers)
+    response.headers.update(headers)
+    return products
+
+@router.get("/export")
+async def export_products(format: str = "ndjson", service: ProductService = Depends(get_product_service)):
+    """Stream the full catalog as NDJSON or CSV."""
+    if format == "csv":
+        body, media_type = encode_csv(service.iter_product_documents()), "text/csv"
+    elif format == "ndjson":
+        body, media_type = encode_ndjson(service.iter_product_documents()), "application/x-ndjson"
+    else:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported export format")
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'}
+    )
+
+@router.get("/cache/stats")
+async def product_cache_stats():
+    """Get hit, miss and eviction counters of the product cache."""
+    return product_cache.stats()
+
+@router.get("/categories/summary", response_model=List[CategorySummaryModel])
+async def category_summary(service: ProductService = Depends(get_product_service)):
+    """Get product count, total stock and price range per category, from incrementally maintained aggregates."""
+    return await service.get_category_summary()
+
+async def stream_product_events(
+    request: Request, subscription: ProductEventSubscription, heartbeat: float = PRODUCT_EVENTS_HEARTBEAT_SECONDS
+):
+    # Comment lines keep proxies from closing an idle stream and let us notice disconnects
+    try:
+        yield b"retry: 3000\n\n"
+        while not await request.is_disconnected():
+            event = await subscription.get(timeout=heartbeat)
+            if event is not None:
+                yield encode_sse(event)
+            elif subscription.lagged:
+                return
+            else:
+                yield b": keep-alive\n\n"
+    finally:
+        subscription.close()
+
+@router.get("/changes/stream")
+async def product_changes_stream(
+    request: Request,
+    last_event_id: Optional[str] = Query(None, description="Resume after this event id"),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Server-Sent Events feed of product adds, updates and stock changes. Reconnect with
+    the `Last-Event-ID` header (browsers send it automatically) to resume where the
+    stream stopped; a `reset` event means changes were missed and data should be re-read.
+    """
+    subscription = product_events.subscribe(last_event_id_header or last_event_id)
+    return StreamingResponse(
+        stream_product_events(request, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/stock/reservations", response_model=StockReservationResult)
+async def reserve_stock(
+    reservation: StockReservationRequest,
+    service: ProductService = Depends(get_product_service),
+    logger: LoggingService = Depends(get_logging_service),
+    user: str = "system"  # In real app, get from auth
+):
+    """
+    Reserve stock for several products at once. Each item reports whether it was
+    reserved. Release the returned `reservation_id` if the checkout is abandoned,
+    or commit it once the order is placed.
+    """
+    result = await service.reserve_stock(reservation.items, all_or_nothing=reservation.all_or_nothing)
+    for item in result.items:
+        if item.reserved:
+            logger.log_stock_reservation(item.product_id, user, result.reservation_id, item.quantity)
+    return result
+
+@router.delete("/stock/reservations/{reservation_id}", response_model=StockReleaseResult)
+async def release_stock(
+    reservation_id: str,
+    service: ProductService = Depends(get_product_service),
+    logger: LoggingService = Depends(get_logging_service),
+    user: str = "system"  # In real app, get from auth
+):
+    """Release a stock reservation and return the reserved quantities to stock."""
+    result = await service.release_stock(reservation_id)
+    if not result:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservation not found")
+    for item in result.items:
+        logger.log_stock_release(item.product_id, user, reservation_id, item.quantity)
+    return result
+
+@router.post("/stock/reservations/{reservation_id}/commit", response_model=StockCommitResult)
+async def commit_stock(reservation_id: str, service: ProductService = Depends(get_product_service)):
+    """Finalize a stock reservation after checkout; the stock stays decremented."""
+    result = await service.commit_stock(reservation_id)
+    if not result:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Reservation not found")
+    return result
 
 @router.get("/{product_id}", response_model=ProductModel)
-def get_product(product_id: str, service: ProductService = Depends(get_product_service)):
-    """Get a single product by ID."""
-    product = service.get_product(product_id)
-    if not product:
+async def get_product(
+    product_id: str,
+    request: Request,
+    response: Response,
+    fields: Optional[Tuple[str, ...]] = Depends(get_product_fields),
+    fast: bool = Query(False, description="Send the stored document without re-validation"),
+    service: ProductService = Depends(get_product_service)
+):
+    """
+    Get a single product by ID, optionally trimmed to `fields`. Responses carry `ETag` and
+    `Last-Modified`; `If-None-Match` or `If-Modified-Since` give `304 Not Modified` if it is unchanged.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_none_match or if_modified_since:
+        # Only the version and timestamp are read to answer a revalidation
+        validators = await service.get_product_validators(product_id)
+        if not validators:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+        headers = validator_headers(*validators)
+        # If-None-Match takes precedence; If-Modified-Since is only used without it
+        if if_none_match:
+            not_modified = etag_matches(if_none_match, headers["ETag"])
+        else:
+            not_modified = not modified_since(if_modified_since, validators[1])
+        if not_modified:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    found = await service.get_product_with_validators(product_id, fields=fields, raw=fast)
+    if not found:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+    product, (version, updated_at) = found
+    headers = validator_headers(version, updated_at)
+    if fast:
+        return FastJSONResponse(content=product, headers=headers)
+    if fields:
+        return JSONResponse(content=jsonable_encoder(product.dict(by_alias=True)), headers=headers)
+    response.headers.update(headers)
     return product
 
+@router.get("/{product_id}/history", response_model=List[ProductAuditEventModel])
+async def get_product_history(
+    product_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    logger: LoggingService = Depends(get_logging_service)
+):
+    """Get the audit trail of a product, newest first. Pass `X-Next-Cursor` as `cursor` for older events."""
+    events, next_cursor = await logger.get_product_history(product_id, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return events
+
 @router.post("/", response_model=ProductModel, status_code=status.HTTP_201_CREATED)
-def add_product(
+async def add_product(
     product: ProductCreateModel,
     service: ProductService = Depends(get_product_service),
     logger: LoggingService = Depends(get_logging_service),
     user: str = "system"  # In real app, get from auth
 ):
     """Add a new product."""
-    new_product = service.add_product(product)
+    new_product = await service.add_product(product)
     logger.log_product_addition(str(new_product.id), user, new_product.dict())
     return new_product
 
+@router.post("/import", response_model=ProductImportResult)
+async def import_products(
+    request: Request,
+    format: Optional[str] = None,
+    service: ProductService = Depends(get_product_service),
+    logger: LoggingService = Depends(get_logging_service),
+    user: str = "system"  # In real app, get from auth
+):
+    """Bulk import products from an NDJSON or CSV request body, streamed and inserted in chunks."""
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    if fmt not in ("csv", "ndjson"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported import format")
+    parser = parse_csv if fmt == "csv" else parse_ndjson
+    result = await service.bulk_add_products(parser(request.stream()))
+    logger.log_product_import(user, result.inserted, result.failed)
+    return result
+
 @router.put("/{product_id}", response_model=ProductModel)
-def update_product(
+async def update_product(
     product_id: str,
     update: ProductUpdateModel,
+    response: Response,
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None),
     service: ProductService = Depends(get_product_service),
     logger: LoggingService = Depends(get_logging_service),
     user: str = "system"  # In real app, get from auth
 ):
-    """Update an existing product."""
-    updated_product = service.update_product(product_id, update)
+    """
+    Update an existing product. Pass `expected_version`, or the product's `ETag` in `If-Match`,
+    to reject the update if someone else changed it first.
+    """
+    if if_match is not None and if_match.strip() != "*":
+        expected_version = etag_version(if_match)
+        if expected_version is None:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="If-Match does not name a product version")
+    try:
+        updated_product = await service.update_product(product_id, update, expected_version=expected_version)
+    except HTTPException as e:
+        if e.status_code == status.HTTP_409_CONFLICT and if_match is not None:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail=e.detail)
+        raise
     if not updated_product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found or no update data provided")
     logger.log_product_edit(product_id, user, update.dict(exclude_unset=True))
+    response.headers.update(validator_headers(updated_product.version, updated_product.updated_at))
     return updated_product
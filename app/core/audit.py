@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+from app.core.config import (
+    AUDIT_EVENTS_PATH,
+    AUDIT_QUEUE_SIZE,
+    AUDIT_BATCH_SIZE,
+    AUDIT_FLUSH_INTERVAL_SECONDS,
+    AUDIT_OVERFLOW_POLICY,
+)
+from app.utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop_newest", "drop_oldest")
+
+class JsonLinesFileSink:
+    """
+    Appends audit records to a file as JSON lines. The write runs in a worker thread
+    so disk I/O never happens on the event loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def write(self, records: List[Dict[str, Any]]) -> None:
+        payload = b"".join(dumps(record) + b"\n" for record in records)
+        await asyncio.to_thread(self._append, payload)
+
+    def _append(self, payload: bytes) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(payload)
+
+class AuditPipeline:
+    """
+    Bounded in-memory queue of audit records drained by a background task that
+    writes them to every sink in batches, flushing when `batch_size` records are
+    waiting or `flush_interval` seconds after the first one arrived.
+
+    `submit` never blocks the caller. When the queue is full the overflow policy
+    decides which record is dropped, and drops are counted.
+    """
+
+    def __init__(
+        self,
+        sinks: Sequence[Any],
+        max_queue_size: int = AUDIT_QUEUE_SIZE,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_interval: float = AUDIT_FLUSH_INTERVAL_SECONDS,
+        overflow: str = AUDIT_OVERFLOW_POLICY,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown audit overflow policy: {overflow}")
+        self.sinks = list(sinks)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self._reported_dropped = 0
+
+    def add_sink(self, sink: Any) -> None:
+        """
+        Register a sink, replacing any sink of the same type. Startup may run more
+        than once per process (tests, reloads); records are still written only once
+        per sink kind, and the newest sink holds the current connection.
+        """
+        self.sinks = [existing for existing in self.sinks if type(existing) is not type(sink)]
+        self.sinks.append(sink)
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        """
+        Queue a record for writing. Must be called from the event loop thread.
+        Returns False if a record had to be dropped.
+        """
+        self.submitted += 1
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.overflow == "drop_oldest":
+                self._queue.get_nowait()
+                self._queue.put_nowait(record)
+            return False
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the background writer after flushing everything still queued.
+        """
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def flush(self) -> None:
+        """
+        Write out everything currently queued.
+        """
+        while not self._queue.empty():
+            await self._write(self._drain(self.batch_size))
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            batch = await self._next_batch()
+            if batch:
+                await self._write(batch)
+        await self.flush()
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        first = await self._get(self.flush_interval)
+        if first is None:
+            return []
+        batch = [first] + self._drain(self.batch_size - 1)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            record = await self._get(remaining)
+            if record is None:
+                break
+            batch.append(record)
+            batch.extend(self._drain(self.batch_size - len(batch)))
+        return batch
+
+    async def _get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Wait for the next record; returns None on timeout or when the pipeline is stopping.
+        A cancelled Queue.get leaves its record in the queue, so nothing is lost.
+        """
+        get = asyncio.ensure_future(self._queue.get())
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        try:
+            done, _ = await asyncio.wait({get, stopping}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stopping.cancel()
+        if get in done:
+            return get.result()
+        get.cancel()
+        return None
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        for sink in self.sinks:
+            try:
+                await sink.write(batch)
+            except Exception as e:
+                self.failed_batches += 1
+                logger.error(f"Audit sink {type(sink).__name__} failed to write {len(batch)} records: {e}")
+        self.written += len(batch)
+        if self.dropped > self._reported_dropped:
+            logger.warning(f"Audit queue overflow: {self.dropped - self._reported_dropped} records dropped")
+            self._reported_dropped = self.dropped
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+        }
+
+# Process-wide pipeline for product audit events; started and stopped with the app
+audit_pipeline = AuditPipeline([JsonLinesFileSink(AUDIT_EVENTS_PATH)])
@@ -0,0 +1,77 @@
+import os
+import secrets
+
+# "mongo" talks to MONGO_URI; "memory" uses the embedded backend in app/storage (no mongod needed)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+
+# MongoDB connection (see app/core/db.py); shared by the async and sync clients
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "mydatabase")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+# Connections kept open per server; this many are also opened before the app serves traffic
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "10"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+# 0 means no limit
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "0"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0"))
+# Comma-separated, in order of preference, e.g. "zstd,snappy,zlib"; zstd and snappy need extra packages
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "primary")
+# Empty means the server default
+MONGO_READ_CONCERN = os.getenv("MONGO_READ_CONCERN", "")
+MONGO_WRITE_CONCERN = os.getenv("MONGO_WRITE_CONCERN", "")
+
+# Product read-through cache (see app/utils/cache.py)
+PRODUCT_CACHE_MAXSIZE = int(os.getenv("PRODUCT_CACHE_MAXSIZE", "10000"))
+PRODUCT_CACHE_TTL_SECONDS = float(os.getenv("PRODUCT_CACHE_TTL_SECONDS", "60"))
+
+# Authenticated-user cache for get_current_user, keyed by bearer token
+CURRENT_USER_CACHE_MAXSIZE = int(os.getenv("CURRENT_USER_CACHE_MAXSIZE", "10000"))
+CURRENT_USER_CACHE_TTL_SECONDS = float(os.getenv("CURRENT_USER_CACHE_TTL_SECONDS", "30"))
+
+# Password hashing (see app/utils/password_hasher.py)
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "600000"))
+# Most hashes that may run at once; further calls wait in the pool's queue
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+
+# Access tokens (see app/utils/security.py); without a configured key, tokens stop working on restart
+ACCESS_TOKEN_SECRET_KEY = os.getenv("ACCESS_TOKEN_SECRET_KEY") or secrets.token_urlsafe(32)
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+# OTP rate limiting (see app/utils/rate_limiter.py)
+# "memory" keeps per-worker token buckets, "mongo" shares fixed-window counters between workers
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+OTP_RATE_LIMIT = int(os.getenv("OTP_RATE_LIMIT", "3"))
+OTP_RATE_LIMIT_WINDOW_SECONDS = float(os.getenv("OTP_RATE_LIMIT_WINDOW_SECONDS", "300"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Log files
+LOG_DIR = os.getenv("LOG_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs"))
+
+# Product audit pipeline (see app/core/audit.py)
+AUDIT_EVENTS_PATH = os.getenv("AUDIT_EVENTS_PATH", os.path.join(LOG_DIR, "product_audit.jsonl"))
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL_SECONDS = float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "1.0"))
+# "drop_newest" rejects new events when the queue is full, "drop_oldest" discards the oldest queued one
+AUDIT_OVERFLOW_POLICY = os.getenv("AUDIT_OVERFLOW_POLICY", "drop_newest")
+
+# Product change feed (see app/core/events.py)
+# Events kept for clients resuming with Last-Event-ID
+PRODUCT_EVENTS_BUFFER_SIZE = int(os.getenv("PRODUCT_EVENTS_BUFFER_SIZE", "10000"))
+# Changes to one product within this window are sent as a single event
+PRODUCT_EVENTS_COALESCE_SECONDS = float(os.getenv("PRODUCT_EVENTS_COALESCE_SECONDS", "0.2"))
+# Events a subscriber may fall behind before it is disconnected
+PRODUCT_EVENTS_SUBSCRIBER_QUEUE_SIZE = int(os.getenv("PRODUCT_EVENTS_SUBSCRIBER_QUEUE_SIZE", "1000"))
+PRODUCT_EVENTS_HEARTBEAT_SECONDS = float(os.getenv("PRODUCT_EVENTS_HEARTBEAT_SECONDS", "15"))
+
+# Stock reservations not committed or released within this age are released again; 0 disables the sweep
+STOCK_RESERVATION_TTL_SECONDS = float(os.getenv("STOCK_RESERVATION_TTL_SECONDS", "1800"))
+# How often expired reservations are looked for
+STOCK_RESERVATION_SWEEP_SECONDS = float(os.getenv("STOCK_RESERVATION_SWEEP_SECONDS", "60"))
+
+# Category aggregates (see app/repositories/category_stats_repository.py)
+# How often they are recounted from the products; 0 disables the recount
+CATEGORY_STATS_RECONCILE_SECONDS = float(os.getenv("CATEGORY_STATS_RECONCILE_SECONDS", "300"))
@@ -1,35 +1,253 @@
+import asyncio
 import logging
+import threading
+import time
+from typing import Any, Dict, Optional
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from typing import Optional
-from fastapi import FastAPI
+from pymongo import MongoClient, monitoring
+from pymongo.database import Database
+from app.core.metrics import CommandTimingListener
+from app.storage.memory import MemoryClient, MemoryStorage
+from app.core.config import (
+    STORAGE_BACKEND,
+    MONGO_URI,
+    MONGO_DB_NAME,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    MONGO_COMPRESSORS,
+    MONGO_READ_PREFERENCE,
+    MONGO_READ_CONCERN,
+    MONGO_WRITE_CONCERN,
+)
 
 logger = logging.getLogger(__name__)
 
-MONGO_URI = "mongodb://localhost:27017"  # You may want to load this from environment variables
-MONGO_DB_NAME = "mydatabase"  # You may want to load this from environment variables
+def client_options() -> Dict[str, Any]:
+    """
+    Keyword arguments shared by the async and sync clients, built from config.
+    """
+    options: Dict[str, Any] = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "socketTimeoutMS": MONGO_SOCKET_TIMEOUT_MS or None,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS or None,
+        "readPreference": MONGO_READ_PREFERENCE,
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    if MONGO_READ_CONCERN:
+        options["readConcernLevel"] = MONGO_READ_CONCERN
+    if MONGO_WRITE_CONCERN:
+        options["w"] = int(MONGO_WRITE_CONCERN) if MONGO_WRITE_CONCERN.isdigit() else MONGO_WRITE_CONCERN
+    return options
+
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """
+    Counts connection pool events of every client it is registered with.
+    Events arrive on driver threads, hence the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checked_out = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+        self.in_use = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_closed += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        # Older drivers do not report how long the checkout waited
+        wait = getattr(event, "duration", None) or 0.0
+        with self._lock:
+            self.checked_out += 1
+            self.in_use += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use = max(self.in_use - 1, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "open": self.connections_created - self.connections_closed,
+                "in_use": self.in_use,
+                "created": self.connections_created,
+                "closed": self.connections_closed,
+                "checked_out": self.checked_out,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "avg_checkout_wait_ms": round(self.checkout_wait_total / self.checked_out * 1000, 3) if self.checked_out else 0.0,
+                "max_checkout_wait_ms": round(self.checkout_wait_max * 1000, 3),
+            }
+
+
+class MongoConnectionManager:
+    """
+    Owns the process's Mongo clients: one Motor client for request handlers and,
+    created on first use, one PyMongo client for synchronous code. Both use the
+    same pool settings and report to the same pool and command listeners.
+    With the "memory" backend both are embedded clients over one shared store.
+    """
+
+    def __init__(self, uri: str = MONGO_URI, db_name: str = MONGO_DB_NAME, backend: str = STORAGE_BACKEND, **options: Any):
+        if backend not in ("mongo", "memory"):
+            raise ValueError(f"Unknown storage backend: {backend}")
+        self.uri = uri
+        self.db_name = db_name
+        self.backend = backend
+        # Shared by the sync and async clients so both see the same data
+        self._memory_storage = MemoryStorage() if backend == "memory" else None
+        self.options = {**client_options(), **options}
+        self.pool_listener = PoolStatsListener()
+        self.command_listener = CommandTimingListener()
+        self._async_client: Optional[AsyncIOMotorClient] = None
+        self._sync_client: Optional[MongoClient] = None
+        self._sync_lock = threading.Lock()
+
+    @property
+    def event_listeners(self):
+        return [self.pool_listener, self.command_listener]
+
+    @property
+    def async_client(self) -> AsyncIOMotorClient:
+        if self._async_client is None and self._memory_storage is not None:
+            self._async_client = MemoryClient(self._memory_storage, asynchronous=True)
+        if self._async_client is None:
+            self._async_client = AsyncIOMotorClient(self.uri, event_listeners=self.event_listeners, **self.options)
+        return self._async_client
+
+    @property
+    def sync_client(self) -> MongoClient:
+        with self._sync_lock:
+            if self._sync_client is None and self._memory_storage is not None:
+                self._sync_client = MemoryClient(self._memory_storage, asynchronous=False)
+            if self._sync_client is None:
+                self._sync_client = MongoClient(self.uri, event_listeners=self.event_listeners, **self.options)
+            return self._sync_client
+
+    def get_database(self, name: Optional[str] = None) -> AsyncIOMotorDatabase:
+        return self.async_client[name or self.db_name]
+
+    def get_sync_database(self, name: Optional[str] = None) -> Database:
+        return self.sync_client[name or self.db_name]
+
+    async def warm(self, connections: Optional[int] = None) -> int:
+        """
+        Open up to `connections` pooled connections (default minPoolSize) with
+        concurrent pings, so the first requests do not pay for connection setup.
+        The driver only fills minPoolSize in the background. Returns how many pings succeeded.
+        """
+        count = self.options.get("minPoolSize", 0) if connections is None else connections
+        if count <= 0:
+            return 0
+        db = self.async_client["admin"]
+        results = await asyncio.gather(*(db.command("ping") for _ in range(count)), return_exceptions=True)
+        failures = [r for r in results if isinstance(r, Exception)]
+        if failures:
+            logger.warning(f"Mongo pool warm-up: {len(failures)} of {count} pings failed: {failures[0]}")
+        return count - len(failures)
+
+    async def ping(self) -> float:
+        """
+        Round trip to the server in milliseconds. Raises if it is unreachable.
+        """
+        started = time.perf_counter()
+        await self.async_client["admin"].command("ping")
+        return (time.perf_counter() - started) * 1000
+
+    def close(self) -> None:
+        if self._async_client is not None:
+            self._async_client.close()
+            self._async_client = None
+        with self._sync_lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "max_pool_size": self.options.get("maxPoolSize"),
+            "min_pool_size": self.options.get("minPoolSize"),
+            "async_client": self._async_client is not None,
+            "sync_client": self._sync_client is not None,
+            "pool": self.pool_listener.stats(),
+        }
+
+
+connection_manager = MongoConnectionManager()
 
 mongo_client: Optional[AsyncIOMotorClient] = None
 mongo_db: Optional[AsyncIOMotorDatabase] = None
 
 def get_mongo_db() -> AsyncIOMotorDatabase:
-    global mongo_db
-    if not mongo_db:
+    # Database objects refuse truth testing, so compare with None
+    if mongo_db is None:
         raise RuntimeError("MongoDB is not connected.")
     return mongo_db
 
+def get_sync_mongo_db() -> Database:
+    return connection_manager.get_sync_database()
+
 async def connect_to_mongo():
     global mongo_client, mongo_db
-    if not mongo_client:
-        logger.info("Connecting to MongoDB at %s", MONGO_URI)
-        mongo_client = AsyncIOMotorClient(MONGO_URI)
-        mongo_db = mongo_client[MONGO_DB_NAME]
-        logger.info("MongoDB connection established.")
+    if mongo_client is None:
+        logger.info("Connecting to MongoDB database %s", connection_manager.db_name)
+        mongo_client = connection_manager.async_client
+        mongo_db = connection_manager.get_database()
+        warmed = await connection_manager.warm()
+        logger.info("MongoDB connection established, %d pooled connections warmed.", warmed)
 
 async def close_mongo_connection():
     global mongo_client, mongo_db
-    if mongo_client:
+    if mongo_client is not None:
         logger.info("Closing MongoDB connection.")
-        mongo_client.close()
+        connection_manager.close()
         mongo_client = None
         mongo_db = None
         logger.info("MongoDB connection closed.")
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from app.core.config import (
+    PRODUCT_EVENTS_BUFFER_SIZE,
+    PRODUCT_EVENTS_COALESCE_SECONDS,
+    PRODUCT_EVENTS_SUBSCRIBER_QUEUE_SIZE,
+)
+from app.utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+EVENT_TYPES = ("add", "update", "stock")
+
+def merge_events(pending: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Coalesce two changes of the same product into one. `add` wins over `update`, which
+    wins over `stock`. A newer snapshot replaces an older one; a stock change after a
+    snapshot makes it stale, so it is dropped and subscribers re-read the product.
+    Stock deltas are summed while only stock changes were seen.
+    """
+    types = {pending["type"], event["type"]}
+    merged = {"type": next(t for t in EVENT_TYPES if t in types), "product_id": event["product_id"]}
+    if "product" in event:
+        merged["product"] = event["product"]
+    elif types == {"stock"}:
+        merged["in_stock_delta"] = pending["in_stock_delta"] + event["in_stock_delta"]
+    return merged
+
+def encode_sse(event: Dict[str, Any]) -> bytes:
+    """
+    Frame an event for a `text/event-stream` response.
+    """
+    return b"id: %s\nevent: product.%s\ndata: %s\n\n" % (
+        event["id"].encode(), event["type"].encode(), dumps(event)
+    )
+
+class ProductEventSubscription:
+    """
+    One subscriber's view of the feed: events replayed from the ring buffer first,
+    then live events from a bounded queue. A subscriber that falls `queue_size`
+    events behind is dropped from the bus instead of holding memory; it sees
+    `lagged` once its queue is drained and should reconnect with the last id it got.
+    """
+
+    def __init__(self, bus: "ProductEventBus", backlog: List[Dict[str, Any]], queue_size: int):
+        self.bus = bus
+        self.lagged = False
+        self._backlog: Deque[Dict[str, Any]] = deque(backlog)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    def offer(self, event: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+            self.bus.unsubscribe(self)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Next event, or None on timeout or when the subscriber lagged and has nothing left.
+        """
+        if self._backlog:
+            return self._backlog.popleft()
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        if self.lagged:
+            return None
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.bus.unsubscribe(self)
+
+class ProductEventBus:
+    """
+    In-process feed of product changes. Writers `publish` from the event loop and
+    never wait; changes to the same product within `coalesce_window` seconds go out
+    as one event. Every event gets an id `<epoch>-<seq>` and is kept in a ring
+    buffer of `buffer_size` events, so a subscriber can resume after a disconnect.
+    The epoch changes on every start, so ids from another process are detected.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = PRODUCT_EVENTS_BUFFER_SIZE,
+        coalesce_window: float = PRODUCT_EVENTS_COALESCE_SECONDS,
+        subscriber_queue_size: int = PRODUCT_EVENTS_SUBSCRIBER_QUEUE_SIZE,
+    ):
+        self.coalesce_window = coalesce_window
+        self.subscriber_queue_size = subscriber_queue_size
+        self.epoch = format(time.time_ns() // 1000, "x")
+        self._seq = 0
+        self._buffer: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=buffer_size)
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._subscribers: Set[ProductEventSubscription] = set()
+        self.published = 0
+        self.coalesced = 0
+        self.emitted = 0
+        self.lagged_subscribers = 0
+
+    def publish(
+        self,
+        event_type: str,
+        product_id: str,
+        product: Optional[Dict[str, Any]] = None,
+        in_stock_delta: Optional[int] = None,
+    ) -> None:
+        """
+        Queue a change for the next flush. Must be called from the event loop thread.
+        `add` and `update` carry the product snapshot, `stock` the change of `in_stock`.
+        """
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f"Unknown product event type: {event_type}")
+        event: Dict[str, Any] = {"type": event_type, "product_id": product_id}
+        if product is not None:
+            event["product"] = product
+        elif event_type == "stock":
+            event["in_stock_delta"] = in_stock_delta or 0
+        self.published += 1
+        pending = self._pending.get(product_id)
+        if pending is not None:
+            self.coalesced += 1
+            event = merge_events(pending, event)
+        self._pending[product_id] = event
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.coalesce_window, self.flush)
+
+    def flush(self) -> None:
+        """
+        Number the pending events, buffer them and hand them to every subscriber.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for event in pending.values():
+            self._seq += 1
+            event["id"] = f"{self.epoch}-{self._seq}"
+            self._buffer.append((self._seq, event))
+            self.emitted += 1
+            for subscriber in list(self._subscribers):
+                subscriber.offer(event)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> ProductEventSubscription:
+        """
+        Start receiving events. With the id of the last event a client saw, the
+        buffered events after it are replayed first. If that id is from another
+        epoch or already fell out of the buffer, the first event is a `reset`:
+        the client missed changes and should re-read what it needs.
+        """
+        backlog: List[Dict[str, Any]] = []
+        if last_event_id:
+            seq = self._resume_seq(last_event_id)
+            if seq is None:
+                backlog.append({"id": f"{self.epoch}-{self._seq}", "type": "reset"})
+            else:
+                backlog.extend(event for event_seq, event in self._buffer if event_seq > seq)
+        subscription = ProductEventSubscription(self, backlog, self.subscriber_queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: ProductEventSubscription) -> None:
+        if subscription in self._subscribers:
+            self._subscribers.discard(subscription)
+            if subscription.lagged:
+                self.lagged_subscribers += 1
+                logger.warning("Product event subscriber fell behind and was disconnected")
+
+    def _resume_seq(self, last_event_id: str) -> Optional[int]:
+        epoch, _, seq = last_event_id.rpartition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq_number = int(seq)
+        oldest = self._buffer[0][0] if self._buffer else self._seq + 1
+        # Resumable if nothing after it has been evicted yet
+        if seq_number > self._seq or seq_number < oldest - 1:
+            return None
+        return seq_number
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "published": self.published,
+            "coalesced": self.coalesced,
+            "emitted": self.emitted,
+            "pending": len(self._pending),
+            "buffered": len(self._buffer),
+            "subscribers": len(self._subscribers),
+            "lagged_subscribers": self.lagged_subscribers,
+        }
+
+# Process-wide product change feed, served at /products/changes/stream
+product_events = ProductEventBus()
@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import logging
+from typing import Any, Dict, List, Tuple
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Collection name -> indexes declared by the repositories and services that query it
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {}
+
+def declare_indexes(collection_name: str, *indexes: IndexModel) -> None:
+    """
+    Declare indexes a collection needs. Called at import time next to the code that
+    relies on them; declaring the same index name twice is a no-op.
+    """
+    declared = INDEX_REGISTRY.setdefault(collection_name, [])
+    names = {index.document["name"] for index in declared}
+    for index in indexes:
+        if index.document["name"] not in names:
+            declared.append(index)
+            names.add(index.document["name"])
+
+def index_key(key: Any) -> Tuple[Tuple[str, Any], ...]:
+    """
+    Comparable form of an index key pattern, from an IndexModel or `index_information`.
+    The server may report directions as floats, so numbers are normalized to int.
+    """
+    pairs = key.items() if hasattr(key, "items") else key or ()
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in pairs)
+
+def missing_indexes(indexes: List[IndexModel], existing: Dict[str, Dict[str, Any]]) -> List[IndexModel]:
+    """
+    Declared indexes the server does not have, by name or by key pattern. An index
+    whose keys already exist under another name counts as present; Mongo would
+    reject creating it anyway.
+    """
+    existing_keys = {index_key(info.get("key")): name for name, info in existing.items() if info.get("key")}
+    missing = []
+    for index in indexes:
+        name = index.document["name"]
+        if name in existing:
+            continue
+        other = existing_keys.get(index_key(index.document["key"]))
+        if other is not None:
+            logger.warning(f"Index {name} already exists as {other}; not creating it")
+            continue
+        missing.append(index)
+    return missing
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    Create every declared index that does not exist yet. Safe to run on every startup:
+    existing indexes are left alone. Indexes are created one at a time, so a
+    conflicting definition is logged and skipped without holding back the others.
+    """
+    created: Dict[str, List[str]] = {}
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        collection = db[collection_name]
+        for index in missing_indexes(indexes, await collection.index_information()):
+            try:
+                created.setdefault(collection_name, []).extend(await collection.create_indexes([index]))
+                logger.info(f"Created index {index.document['name']} on {collection_name}")
+            except OperationFailure as e:
+                logger.error(f"Could not create index {index.document['name']} on {collection_name}: {e}")
+    return created
+
+async def index_report(db) -> Dict[str, Dict[str, Any]]:
+    """
+    Compare declared indexes with the server: which are missing, which exist without
+    a declaration, and which have not been used since the server started.
+    """
+    report: Dict[str, Dict[str, Any]] = {}
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        declared = {index.document["name"] for index in indexes}
+        usage = {}
+        async for stats in collection.aggregate([{"$indexStats": {}}]):
+            usage[stats["name"]] = stats["accesses"]["ops"]
+        report[collection_name] = {
+            "missing": sorted(index.document["name"] for index in missing_indexes(indexes, existing)),
+            "undeclared": sorted(set(existing) - declared - {"_id_"}),
+            "unused": sorted(name for name, ops in usage.items() if ops == 0 and name != "_id_"),
+        }
+    return report
+
+async def _main(apply: bool) -> None:
+    # Importing the API pulls in every repository and service, which declare their indexes.
+    # Go through the package module: under `python -m` this file's own globals are a separate copy.
+    import app.api  # noqa: F401
+    from app.core import indexes
+    from app.core.db import connect_to_mongo, close_mongo_connection, get_mongo_db
+
+    await connect_to_mongo()
+    try:
+        db = get_mongo_db()
+        if apply:
+            await indexes.ensure_indexes(db)
+        for collection_name, result in (await indexes.index_report(db)).items():
+            print(f"{collection_name}:")
+            for key in ("missing", "undeclared", "unused"):
+                print(f"  {key}: {', '.join(result[key]) or '-'}")
+    finally:
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report missing or unused MongoDB indexes.")
+    parser.add_argument("--apply", action="store_true", help="create missing indexes before reporting")
+    asyncio.run(_main(parser.parse_args().apply))
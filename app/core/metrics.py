@@ -0,0 +1,201 @@
+import functools
+import inspect
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Seconds; finer at the low end than the Prometheus defaults since most lookups are sub-10ms
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with labels, rendered in the Prometheus text format.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in sorted(self._series.items())]
+        for key, counts, total in series:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds the histograms and the stats callbacks rendered by `/metrics`.
+    A stats callback returns a flat dict such as `TTLCache.stats()`; each numeric
+    entry is exposed as a gauge named `<prefix>_<key>`.
+    """
+
+    def __init__(self):
+        self._histograms: Dict[str, Histogram] = {}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, documentation, labelnames, buckets)
+            return self._histograms[name]
+
+    def register_stats(self, prefix: str, collect: Callable[[], Dict[str, Any]]) -> None:
+        """
+        Expose the numeric values of `collect()` as gauges. Registering a prefix again replaces it.
+        """
+        with self._lock:
+            self._collectors[prefix] = collect
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            histograms = list(self._histograms.values())
+            collectors = list(self._collectors.items())
+        for histogram in histograms:
+            lines.extend(histogram.render())
+        for prefix, collect in collectors:
+            try:
+                stats = collect()
+            except Exception as e:
+                logger.warning(f"Skipping metrics for {prefix}: {e}")
+                continue
+            for key, value in stats.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{key}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status")
+)
+operation_duration = registry.histogram(
+    "app_operation_duration_seconds", "Latency of repository and service methods.", ("operation", "outcome")
+)
+mongodb_command_duration = registry.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command round trips as seen by the driver.", ("command", "outcome")
+)
+
+def timed(name: Optional[str] = None):
+    """
+    Record each call of the decorated function in `app_operation_duration_seconds`,
+    labelled `operation` (default: the qualified name, e.g. `ProductService.update_product`)
+    and `outcome` (`ok` or `error`). Works for plain and async functions.
+    """
+    def decorator(fn):
+        operation = name or fn.__qualname__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                outcome = "error"
+                try:
+                    result = await fn(*args, **kwargs)
+                    outcome = "ok"
+                    return result
+                finally:
+                    operation_duration.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = "ok"
+                return result
+            finally:
+                operation_duration.observe(time.perf_counter() - started, operation=operation, outcome=outcome)
+        return wrapper
+
+    return decorator
+
+
+class CommandTimingListener(monitoring.CommandListener):
+    """
+    Feeds the driver's own timing of every MongoDB command into `mongodb_command_duration_seconds`.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        mongodb_command_duration.observe(event.duration_micros / 1e6, command=event.command_name, outcome="ok")
+
+    def failed(self, event):
+        mongodb_command_duration.observe(event.duration_micros / 1e6, command=event.command_name, outcome="error")
+
+
+async def record_request_latency(request, call_next):
+    """
+    HTTP middleware that observes `http_request_duration_seconds`. Requests are
+    labelled with the matched route template (`/products/{product_id}`), not the
+    raw path, to keep the number of series bounded. Streaming responses are timed
+    until their headers are ready.
+    """
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        http_request_duration.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status,
+        )
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class PeriodicTask:
+    """
+    Runs `job` in a background task every `interval` seconds, starting right away.
+    A failed run is logged and counted, and the next one happens on schedule.
+    An interval of 0 or less disables the task.
+    """
+
+    def __init__(self, name: str, job: Callable[[], Awaitable[object]], interval: float):
+        self.name = name
+        self.job = job
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self.runs = 0
+        self.failures = 0
+
+    async def start(self) -> None:
+        if self._task is None and self.interval > 0:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop after the current run, if one is in progress.
+        """
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.job()
+                self.runs += 1
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Periodic task {self.name} failed: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> Dict[str, int]:
+        return {"runs": self.runs, "failures": self.failures}
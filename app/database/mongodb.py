@@ -1,20 +1,27 @@
 import logging
+from datetime import datetime
 from typing import Optional, List, Dict, Any
-from pymongo import MongoClient
+from pymongo import ASCENDING, ReturnDocument
 from pymongo.collection import Collection
 from pymongo.errors import PyMongoError
 from bson import ObjectId
-from app.models.product import ProductModel, ProductCreateModel, ProductUpdateModel
+from app.core.db import MongoConnectionManager, connection_manager
+from app.models.product_model import ProductModel, ProductCreateModel, ProductUpdateModel, version_filter
+from app.utils.pagination import decode_cursor, keyset_filter
 
 logger = logging.getLogger(__name__)
 
 class MongoDBClient:
-    def __init__(self, uri: str, db_name: str, collection_name: str):
+    def __init__(
+        self, collection_name: str, db_name: Optional[str] = None, manager: Optional[MongoConnectionManager] = None
+    ):
         try:
-            self.client = MongoClient(uri)
-            self.db = self.client[db_name]
+            # Reuse the process-wide pooled client instead of opening one per instance
+            manager = manager or connection_manager
+            self.client = manager.sync_client
+            self.db = manager.get_sync_database(db_name)
             self.collection: Collection = self.db[collection_name]
-            logger.info(f"Connected to MongoDB database: {db_name}, collection: {collection_name}")
+            logger.info(f"Connected to MongoDB database: {self.db.name}, collection: {collection_name}")
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
@@ -30,9 +37,13 @@ class MongoDBClient:
             logger.error(f"Error fetching product {product_id}: {e}")
             return None
 
-    def get_products(self, skip: int = 0, limit: int = 100) -> List[ProductModel]:
+    def get_products(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[ProductModel]:
         try:
-            products = self.collection.find().skip(skip).limit(limit)
+            if cursor:
+                # Keyset pagination: resume after the last _id of the previous page
+                products = self.collection.find(keyset_filter(decode_cursor(cursor))).sort("_id", ASCENDING).limit(limit)
+            else:
+                products = self.collection.find().sort("_id", ASCENDING).skip(skip).limit(limit)
             return [ProductModel(**prod) for prod in products]
         except Exception as e:
             logger.error(f"Error fetching products: {e}")
@@ -41,6 +52,8 @@ class MongoDBClient:
     def add_product(self, product_data: ProductCreateModel) -> Optional[ProductModel]:
         try:
             product_dict = product_data.dict(exclude_unset=True)
+            product_dict["version"] = 1
+            product_dict["updated_at"] = datetime.utcnow()
             result = self.collection.insert_one(product_dict)
             product_dict["_id"] = result.inserted_id
             logger.info(f"Product added with id {result.inserted_id}")
@@ -52,18 +65,28 @@ class MongoDBClient:
             logger.error(f"Error adding product: {e}")
             return None
 
-    def update_product(self, product_id: str, update_data: ProductUpdateModel) -> Optional[ProductModel]:
+    def update_product(
+        self, product_id: str, update_data: ProductUpdateModel, expected_version: Optional[int] = None
+    ) -> Optional[ProductModel]:
         try:
             update_dict = {k: v for k, v in update_data.dict(exclude_unset=True).items() if v is not None}
             if not update_dict:
                 logger.warning(f"No update data provided for product {product_id}")
                 return None
-            result = self.collection.update_one({"_id": ObjectId(product_id)}, {"$set": update_dict})
-            if result.matched_count == 0:
-                logger.warning(f"Product with id {product_id} not found for update.")
+            query = {"_id": ObjectId(product_id)}
+            if expected_version is not None:
+                query["version"] = version_filter(expected_version)
+            changes = {**update_dict, "updated_at": datetime.utcnow()}
+            product = self.collection.find_one_and_update(
+                query,
+                {"$set": changes, "$inc": {"version": 1}},
+                return_document=ReturnDocument.AFTER
+            )
+            if not product:
+                logger.warning(f"Product with id {product_id} not found or version changed for update.")
                 return None
             logger.info(f"Product {product_id} updated.")
-            return self.get_product(product_id)
+            return ProductModel(**product)
         except PyMongoError as e:
             logger.error(f"Database error updating product: {e}")
             return None
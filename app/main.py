@@ -1,7 +1,21 @@
 import logging
 from fastapi import FastAPI
-from app.db import connect_to_mongo, close_mongo_connection
+from app.core.db import connect_to_mongo, close_mongo_connection, get_mongo_db
 from app.api import api_router
+from app.core.indexes import ensure_indexes
+from app.core.audit import audit_pipeline
+from app.core.config import (
+    CATEGORY_STATS_RECONCILE_SECONDS,
+    STOCK_RESERVATION_SWEEP_SECONDS,
+    STOCK_RESERVATION_TTL_SECONDS,
+)
+from app.controllers.product_controller import get_logging_service, get_product_collection, get_product_service
+from app.core.scheduler import PeriodicTask
+from app.core.metrics import record_request_latency
+from app.repositories.audit_repository import AuditRepository
+from app.repositories.category_stats_repository import CategoryStatsRepository
+from app.services.product_service import PRODUCTS_COLLECTION, drain_deferred_stats
+from app.utils.password_hasher import password_hasher
 
 # Logging setup
 logging.basicConfig(
@@ -12,6 +26,30 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="FastAPI MongoDB Microservice")
 
+async def reconcile_category_stats():
+    db = get_mongo_db()
+    await CategoryStatsRepository(db).reconcile(db[PRODUCTS_COLLECTION])
+
+# Recounts the category aggregates from the products, repairing any drift of the incremental updates
+category_stats_reconciler = PeriodicTask("category_stats_reconcile", reconcile_category_stats, CATEGORY_STATS_RECONCILE_SECONDS)
+
+async def release_expired_reservations():
+    released = await get_product_service(get_product_collection()).release_expired_reservations(STOCK_RESERVATION_TTL_SECONDS)
+    audit = get_logging_service()
+    for result in released:
+        for item in result.items:
+            audit.log_stock_release(item.product_id, "system", result.reservation_id, item.quantity)
+
+# Gives back the stock of reservations whose checkout was abandoned without a release
+reservation_sweeper = PeriodicTask(
+    "stock_reservation_sweep",
+    release_expired_reservations,
+    STOCK_RESERVATION_SWEEP_SECONDS if STOCK_RESERVATION_TTL_SECONDS > 0 else 0,
+)
+
+# Per-route latency histograms, served at /metrics
+app.middleware("http")(record_request_latency)
+
 # Include API routers
 app.include_router(api_router)
 
@@ -20,9 +58,20 @@ async def startup_event():
     logger.info("Starting up and connecting to MongoDB...")
     await connect_to_mongo()
     logger.info("Connected to MongoDB.")
+    await ensure_indexes(get_mongo_db())
+    # Persist audit events to Mongo as well as the JSON-lines file
+    audit_pipeline.add_sink(AuditRepository())
+    await audit_pipeline.start()
+    await category_stats_reconciler.start()
+    await reservation_sweeper.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down and closing MongoDB connection...")
+    await reservation_sweeper.stop()
+    await category_stats_reconciler.stop()
+    await drain_deferred_stats()
+    await audit_pipeline.stop()
     await close_mongo_connection()
+    password_hasher.shutdown()
     logger.info("MongoDB connection closed.")
@@ -1,5 +1,8 @@
-from typing import Optional
-from pydantic import BaseModel, Field, validator
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Type
+from bson import ObjectId
+from pydantic import BaseModel, Field, create_model, validator
 
 class ProductModel(BaseModel):
     id: Optional[str] = Field(None, alias="_id")
@@ -8,6 +11,8 @@ class ProductModel(BaseModel):
     price: float = Field(..., gt=0)
     in_stock: int = Field(..., ge=0)
     category: Optional[str] = Field(None, max_length=50)
+    version: int = Field(0, ge=0)
+    updated_at: Optional[datetime] = None
 
     class Config:
         allow_population_by_field_name = True
@@ -22,6 +27,70 @@ class ProductModel(BaseModel):
             }
         }
 
+    @validator('id', pre=True)
+    def object_id_to_str(cls, v):
+        return str(v) if isinstance(v, ObjectId) else v
+
+# Fields a client can ask for with `fields=`, and their types in a trimmed response.
+# Trimmed responses come from stored documents, so only types are checked, not constraints.
+PRODUCT_FIELD_TYPES: Dict[str, Any] = {
+    "id": Optional[str],
+    "name": Optional[str],
+    "description": Optional[str],
+    "price": Optional[float],
+    "in_stock": Optional[int],
+    "category": Optional[str],
+    "version": Optional[int],
+    "updated_at": Optional[datetime],
+}
+
+# Every field a product response can contain
+PUBLIC_PRODUCT_FIELDS: Tuple[str, ...] = tuple(PRODUCT_FIELD_TYPES)
+
+def parse_product_fields(fields: str) -> Tuple[str, ...]:
+    """
+    Parse a comma-separated `fields` parameter into a canonical tuple that always includes `id`.
+    Raises ValueError for unknown field names.
+    """
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(PRODUCT_FIELD_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown product fields: {', '.join(sorted(unknown))}")
+    requested.add("id")
+    return tuple(name for name in PRODUCT_FIELD_TYPES if name in requested)
+
+def product_projection(fields: Tuple[str, ...]) -> Dict[str, int]:
+    """
+    Mongo projection for a parsed fieldset; `_id` is always returned by the server.
+    """
+    return {name: 1 for name in fields if name != "id"}
+
+@lru_cache(maxsize=128)
+def product_fields_model(fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """
+    Response model holding only the requested fields, built once per fieldset.
+    """
+    definitions = {name: (PRODUCT_FIELD_TYPES[name], None) for name in fields}
+    # Serialize the id as `_id`, like ProductModel responses
+    definitions["id"] = (Optional[str], Field(None, alias="_id"))
+    return create_model("ProductFieldsModel", **definitions)
+
+def to_product_fields(doc: Dict[str, Any], fields: Tuple[str, ...]) -> BaseModel:
+    """
+    Build the trimmed response for a projected product document.
+    """
+    values = {name: doc.get(name) for name in fields if name != "id"}
+    return product_fields_model(fields)(_id=str(doc["_id"]), **values)
+
+def version_filter(expected_version: int):
+    """
+    Query condition matching a product at `expected_version`.
+    Products written before versioning have no `version` field and count as version 0.
+    """
+    if expected_version == 0:
+        return {"$in": [0, None]}
+    return expected_version
+
 class ProductCreateModel(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
     description: Optional[str] = Field(None, max_length=500)
@@ -47,3 +116,64 @@ class ProductUpdateModel(BaseModel):
         if v is not None and not v.strip():
             raise ValueError('Product name must not be empty')
         return v
+
+class ProductFilterModel(BaseModel):
+    category: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    in_stock_only: bool = False
+    sort: str = "_id"
+
+class ProductImportError(BaseModel):
+    row: int
+    error: str
+
+class ProductImportResult(BaseModel):
+    inserted: int = 0
+    failed: int = 0
+    errors: List[ProductImportError] = []
+
+class ProductAuditEventModel(BaseModel):
+    event: str
+    user: str
+    ts: datetime
+    product_id: Optional[str] = None
+    details: Optional[Dict[str, Any]] = None
+    changes: Optional[Dict[str, Any]] = None
+
+class StockReservationItem(BaseModel):
+    product_id: str
+    quantity: int = Field(..., gt=0)
+
+class StockReservationRequest(BaseModel):
+    items: List[StockReservationItem] = Field(..., min_items=1, max_items=100)
+    # Release everything that was reserved when any item cannot be
+    all_or_nothing: bool = False
+
+class StockReservationItemResult(BaseModel):
+    product_id: str
+    quantity: int
+    reserved: bool
+    # "invalid_id", "not_found", "insufficient_stock" or "rolled_back"
+    error: Optional[str] = None
+
+class StockReservationResult(BaseModel):
+    reservation_id: str
+    reserved: bool
+    items: List[StockReservationItemResult]
+
+class StockReleaseResult(BaseModel):
+    reservation_id: str
+    items: List[StockReservationItem]
+
+class StockCommitResult(BaseModel):
+    reservation_id: str
+    products: int
+
+class CategorySummaryModel(BaseModel):
+    category: Optional[str] = None
+    count: int
+    total_stock: int
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    updated_at: Optional[datetime] = None
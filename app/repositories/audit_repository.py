@@ -0,0 +1,53 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from app.core.db import get_mongo_db
+from app.core.indexes import declare_indexes
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_filter
+from app.core.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLLECTION = "product_audit"
+
+declare_indexes(
+    AUDIT_COLLECTION,
+    IndexModel([("product_id", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)], name="product_ts"),
+    IndexModel([("user", ASCENDING), ("ts", DESCENDING)], name="user_ts"),
+    IndexModel([("ts", DESCENDING)], name="ts"),
+)
+
+class AuditRepository:
+    """
+    Product audit events in Mongo. Also serves as an audit pipeline sink: `write`
+    receives whole batches and stores them with one unordered `insert_many`.
+    """
+
+    def __init__(self, db=None):
+        self.collection: AsyncIOMotorCollection = (db if db is not None else get_mongo_db())[AUDIT_COLLECTION]
+
+    @timed()
+    async def write(self, records: List[Dict[str, Any]]) -> None:
+        # insert_many adds _id to each document; keep the shared records untouched
+        await self.collection.insert_many([dict(record) for record in records], ordered=False)
+
+    @timed()
+    async def get_product_history(
+        self, product_id: str, limit: int = 50, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Return one page of a product's audit events, newest first, and the cursor for the next page.
+        Raises ValueError for a malformed cursor.
+        """
+        logger.info(f"Fetching audit history for product {product_id}")
+        query: Dict[str, Any] = {"product_id": product_id}
+        if cursor:
+            query = {"$and": [query, keyset_filter(decode_cursor(cursor), "ts", descending=True)]}
+        find = self.collection.find(query).sort([("ts", DESCENDING), ("_id", DESCENDING)])
+        events = await find.limit(limit + 1).to_list(length=limit + 1)
+        next_cursor = None
+        if len(events) > limit:
+            events = events[:limit]
+            next_cursor = encode_cursor(events[-1]["_id"], "ts", events[-1]["ts"])
+        return events, next_cursor
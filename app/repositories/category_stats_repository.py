@@ -0,0 +1,177 @@
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, DESCENDING, DeleteMany, ReturnDocument, UpdateOne
+from app.core.db import get_mongo_db
+from app.core.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_STATS_COLLECTION = "category_stats"
+
+# Full recount of the products collection, one row per category (null for uncategorized)
+CATEGORY_STATS_PIPELINE: List[Dict[str, Any]] = [
+    {"$group": {
+        "_id": "$category",
+        "count": {"$sum": 1},
+        "total_stock": {"$sum": "$in_stock"},
+        "min_price": {"$min": "$price"},
+        "max_price": {"$max": "$price"},
+    }},
+    {"$sort": {"_id": 1}},
+]
+
+class CategoryDeltas:
+    """
+    Changes to the per-category aggregates caused by one write, collected so they
+    can be applied together. Prices only ever widen the bounds with `$min`/`$max`.
+    A price that leaves a category, through a price change or a move, is kept in
+    `removed_prices`; the bounds are only re-read if it was one of them.
+    """
+
+    def __init__(self):
+        self.changes: Dict[Optional[str], Dict[str, Any]] = {}
+        self.removed_prices: Dict[Optional[str], Set[float]] = {}
+
+    def _entry(self, category: Optional[str]) -> Dict[str, Any]:
+        return self.changes.setdefault(category, {"count": 0, "total_stock": 0, "min_price": None, "max_price": None})
+
+    def _widen(self, category: Optional[str], price: Optional[float]) -> None:
+        entry = self._entry(category)
+        if price is not None:
+            entry["min_price"] = price if entry["min_price"] is None else min(entry["min_price"], price)
+            entry["max_price"] = price if entry["max_price"] is None else max(entry["max_price"], price)
+
+    def _drop_price(self, category: Optional[str], price: Optional[float]) -> None:
+        self._entry(category)
+        if price is not None:
+            self.removed_prices.setdefault(category, set()).add(price)
+
+    def add(self, product: Dict[str, Any]) -> None:
+        entry = self._entry(product.get("category"))
+        entry["count"] += 1
+        entry["total_stock"] += product.get("in_stock") or 0
+        self._widen(product.get("category"), product.get("price"))
+
+    def remove(self, product: Dict[str, Any]) -> None:
+        entry = self._entry(product.get("category"))
+        entry["count"] -= 1
+        entry["total_stock"] -= product.get("in_stock") or 0
+        self._drop_price(product.get("category"), product.get("price"))
+
+    def replace(self, before: Dict[str, Any], after: Dict[str, Any]) -> None:
+        """
+        Record an update. Within one category only the stock difference and, if the
+        price moved, the bounds change; the count stays the same.
+        """
+        category = before.get("category")
+        if after.get("category") != category:
+            self.remove(before)
+            self.add(after)
+            return
+        stock_change = (after.get("in_stock") or 0) - (before.get("in_stock") or 0)
+        if stock_change:
+            self.stock(category, stock_change)
+        if after.get("price") != before.get("price"):
+            self._widen(category, after.get("price"))
+            self._drop_price(category, before.get("price"))
+
+    def stock(self, category: Optional[str], delta: int) -> None:
+        self._entry(category)["total_stock"] += delta
+
+    def empty(self) -> bool:
+        return not self.changes
+
+class CategoryStatsRepository:
+    """
+    Per-category product count, stock total and price bounds, kept in their own
+    collection so the summary is read without touching the products. Writes apply
+    deltas as they happen; `reconcile` recounts everything with `$group` to repair
+    any drift, such as deltas lost to a failed write.
+    """
+
+    def __init__(self, db=None):
+        self.collection: AsyncIOMotorCollection = (db if db is not None else get_mongo_db())[CATEGORY_STATS_COLLECTION]
+
+    @timed()
+    async def apply(self, deltas: CategoryDeltas, products: AsyncIOMotorCollection) -> None:
+        """
+        Apply the deltas. Categories that only grew go out in one unordered upserting
+        `bulk_write`. A category a price left gets a `find_one_and_update` returning
+        its old bounds, and a bound is re-read from the products only if it was the
+        price that left.
+        """
+        now = datetime.utcnow()
+        requests = []
+        for category, entry in deltas.changes.items():
+            update: Dict[str, Any] = {
+                "$inc": {"count": entry["count"], "total_stock": entry["total_stock"]},
+                "$set": {"updated_at": now},
+            }
+            if entry["min_price"] is not None:
+                update["$min"] = {"min_price": entry["min_price"]}
+                update["$max"] = {"max_price": entry["max_price"]}
+            removed = deltas.removed_prices.get(category)
+            if not removed:
+                requests.append(UpdateOne({"_id": category}, update, upsert=True))
+                continue
+            before = await self.collection.find_one_and_update(
+                {"_id": category}, update, projection={"min_price": 1, "max_price": 1},
+                upsert=True, return_document=ReturnDocument.BEFORE,
+            )
+            stale = [name for name in ("min_price", "max_price") if before is None or before.get(name) in removed]
+            if stale:
+                await self.refresh_price_bounds(products, category, stale)
+        if requests:
+            await self.collection.bulk_write(requests, ordered=False)
+
+    @timed()
+    async def refresh_price_bounds(
+        self, products: AsyncIOMotorCollection, category: Optional[str], bounds: Sequence[str] = ("min_price", "max_price")
+    ) -> None:
+        """
+        Re-read a category's cheapest and/or dearest price. Each is a single-document
+        query on the `(category, price, _id)` index.
+        """
+        values = {}
+        for name in bounds:
+            direction = ASCENDING if name == "min_price" else DESCENDING
+            docs = await products.find({"category": category}, {"_id": 0, "price": 1}).sort(
+                [("price", direction)]
+            ).limit(1).to_list(length=1)
+            values[name] = docs[0].get("price") if docs else None
+        await self.collection.update_one({"_id": category}, {"$set": values})
+
+    @timed()
+    async def reconcile(self, products: AsyncIOMotorCollection) -> int:
+        """
+        Recount every category from the products with an aggregation and overwrite
+        the stored aggregates. Categories that no longer have products are removed.
+        Returns the number of categories.
+        """
+        rows = await products.aggregate(CATEGORY_STATS_PIPELINE).to_list(length=None)
+        now = datetime.utcnow()
+        requests: List[Any] = [
+            UpdateOne(
+                {"_id": row["_id"]},
+                {"$set": {
+                    "count": row["count"],
+                    "total_stock": row["total_stock"],
+                    "min_price": row["min_price"],
+                    "max_price": row["max_price"],
+                    "updated_at": now,
+                    "reconciled_at": now,
+                }},
+                upsert=True,
+            )
+            for row in rows
+        ]
+        requests.append(DeleteMany({"_id": {"$nin": [row["_id"] for row in rows]}}))
+        await self.collection.bulk_write(requests, ordered=False)
+        logger.info(f"Category aggregates reconciled for {len(rows)} categories")
+        return len(rows)
+
+    @timed()
+    async def get_summary(self) -> List[Dict[str, Any]]:
+        return await self.collection.find({"count": {"$gt": 0}}).sort("_id", ASCENDING).to_list(length=None)
@@ -1,15 +1,26 @@
 import logging
 from typing import Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorCollection
-from app.db import get_mongo_db
+from pymongo import ASCENDING, IndexModel
+from app.core.db import get_mongo_db
+from app.core.indexes import declare_indexes
+from app.core.metrics import timed
 
 logger = logging.getLogger(__name__)
 
+declare_indexes(
+    "otps",
+    IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+    # Mongo removes each OTP once its expires_at has passed
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+)
+
 class OTPRepository:
-    def __init__(self):
-        self.collection: AsyncIOMotorCollection = get_mongo_db()["otps"]
+    def __init__(self, db=None):
+        self.collection: AsyncIOMotorCollection = (db if db is not None else get_mongo_db())["otps"]
 
+    @timed()
     async def save_otp(self, email: str, otp: str, expires_at: datetime) -> None:
         logger.info(f"Saving OTP for {email}")
         await self.collection.update_one(
@@ -18,17 +29,32 @@ class OTPRepository:
             upsert=True
         )
 
+    @timed()
     async def get_otp(self, email: str) -> Optional[Dict[str, Any]]:
         logger.info(f"Fetching OTP for {email}")
-        otp_record = await self.collection.find_one({"email": email})
-        if otp_record:
-            otp_record["expires_at"] = otp_record["expires_at"] if isinstance(otp_record["expires_at"], datetime) else datetime.strptime(otp_record["expires_at"], "%Y-%m-%dT%H:%M:%S.%f")
-        return otp_record
+        return await self.collection.find_one({"email": email})
+
+    @timed()
+    async def consume_otp(self, email: str, otp: str) -> bool:
+        """
+        Atomically delete the OTP if it matches and has not expired, in one round trip.
+        Of several concurrent attempts with the right code, exactly one succeeds.
+        The TTL index removes expired OTPs, but it only runs about once a minute, so
+        expiry is also checked here.
+        """
+        logger.info(f"Consuming OTP for {email}")
+        record = await self.collection.find_one_and_delete(
+            {"email": email, "otp": otp, "expires_at": {"$gt": datetime.utcnow()}},
+            projection={"_id": 1}
+        )
+        return record is not None
 
+    @timed()
     async def delete_otp(self, email: str) -> None:
         logger.info(f"Deleting OTP for {email}")
         await self.collection.delete_one({"email": email})
 
+    @timed()
     async def count_recent_otps(self, email: str, window_seconds: int = 300) -> int:
         """
         Count OTPs generated for an email in the last `window_seconds` seconds (default 5 minutes).
@@ -1,24 +1,48 @@
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from motor.motor_asyncio import AsyncIOMotorCollection
 from bson import ObjectId
-from app.db import get_mongo_db
+from pymongo import ASCENDING, IndexModel
+from app.core.db import get_mongo_db
+from app.core.indexes import declare_indexes
+from app.utils.dataloader import DataLoader
+from app.core.metrics import timed
 
 logger = logging.getLogger(__name__)
 
+declare_indexes(
+    "users",
+    IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+)
+
+async def fetch_users_by_email(collection: AsyncIOMotorCollection, emails: List[str]) -> Dict[str, Dict[str, Any]]:
+    users = await collection.find({"email": {"$in": emails}}).to_list(length=len(emails))
+    return {user["email"]: user for user in users}
+
+# Shared across requests so concurrent lookups of the same users go out as one `$in` query
+user_loader = DataLoader(lambda emails: fetch_users_by_email(get_mongo_db()["users"], emails))
+
 class UserRepository:
-    def __init__(self):
-        self.collection: AsyncIOMotorCollection = get_mongo_db()["users"]
+    def __init__(self, db=None, loader: Optional[DataLoader] = None):
+        self.collection: AsyncIOMotorCollection = (db if db is not None else get_mongo_db())["users"]
+        if loader is None:
+            # The shared loader reads from get_mongo_db(); an explicit database gets its own
+            loader = user_loader if db is None else DataLoader(lambda emails: fetch_users_by_email(self.collection, emails))
+        self.loader = loader
 
+    @timed()
     async def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
-        user = await self.collection.find_one({"email": email})
+        user = await self.loader.load(email)
         if user:
-            user["id"] = str(user["_id"])
-            user.pop("_id", None)
+            # The loaded document is shared with other callers
+            user = dict(user)
+            user["id"] = str(user.pop("_id"))
         return user
 
+    @timed()
     async def create(self, user_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         result = await self.collection.insert_one(user_data)
+        self.loader.clear(user_data.get("email"))
         if result.inserted_id:
             user = await self.collection.find_one({"_id": result.inserted_id})
             user["id"] = str(user["_id"])
@@ -26,18 +50,22 @@ class UserRepository:
             return user
         return None
 
+    @timed()
     async def update_by_email(self, email: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         result = await self.collection.find_one_and_update(
             {"email": email},
             {"$set": update_data},
             return_document=True
         )
+        self.loader.clear(email)
         if result:
             result["id"] = str(result["_id"])
             result.pop("_id", None)
             return result
         return None
 
+    @timed()
     async def delete_by_email(self, email: str) -> bool:
         result = await self.collection.delete_one({"email": email})
+        self.loader.clear(email)
         return result.deleted_count > 0
@@ -0,0 +1,16 @@
+import logging
+from fastapi import APIRouter, HTTPException, status
+from app.core.db import connection_manager
+
+router = APIRouter(prefix="/health", tags=["health"])
+logger = logging.getLogger(__name__)
+
+@router.get("/db")
+async def database_health():
+    """Ping MongoDB and report connection pool statistics."""
+    try:
+        latency_ms = await connection_manager.ping()
+    except Exception as e:
+        logger.error(f"MongoDB health check failed: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database unavailable")
+    return {"status": "ok", "ping_ms": round(latency_ms, 3), **connection_manager.stats()}
@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.core.audit import audit_pipeline
+from app.core.db import connection_manager
+from app.core.events import product_events
+from app.core.metrics import registry
+from app.controllers.product_controller import product_loader
+from app.repositories.user_repository import user_loader
+from app.services.auth_service import current_user_cache
+from app.services.product_service import product_cache
+from app.utils.password_hasher import password_hasher
+
+router = APIRouter(tags=["metrics"])
+
+registry.register_stats("product_cache", product_cache.stats)
+registry.register_stats("current_user_cache", current_user_cache.stats)
+registry.register_stats("product_loader", product_loader.stats)
+registry.register_stats("user_loader", user_loader.stats)
+registry.register_stats("password_hasher", password_hasher.stats)
+registry.register_stats("audit_pipeline", audit_pipeline.stats)
+registry.register_stats("product_events", product_events.stats)
+registry.register_stats("mongodb_pool", connection_manager.pool_listener.stats)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Latency histograms and component statistics in the Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -14,3 +14,19 @@ class UserProfileUpdateRequest(BaseModel):
 
 class UserProfileResponse(UserProfile):
     id: str
+
+class UserBase(BaseModel):
+    email: EmailStr
+    full_name: Optional[str] = None
+    bio: Optional[str] = None
+    avatar_url: Optional[str] = None
+
+class UserCreate(UserBase):
+    password: constr(min_length=8)
+
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
+class UserResponse(UserBase):
+    id: str
@@ -1,50 +1,79 @@
 import logging
 import random
 import string
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
 from app.repositories.user_repository import UserRepository
 from app.repositories.otp_repository import OTPRepository
-from app.utils.security import hash_password, verify_password, create_access_token
+from app.utils.security import create_access_token
+from app.utils.password_hasher import password_hasher
 from app.utils.rate_limiter import RateLimiter
+from app.utils.cache import TTLCache
+from app.core.config import CURRENT_USER_CACHE_MAXSIZE, CURRENT_USER_CACHE_TTL_SECONDS
+from app.core.metrics import timed
 
 logger = logging.getLogger(__name__)
 
+# Users resolved from bearer tokens. Short-lived so profile changes made by other
+# workers show up quickly; this worker invalidates on its own updates and deletes.
+current_user_cache = TTLCache(maxsize=CURRENT_USER_CACHE_MAXSIZE, ttl=CURRENT_USER_CACHE_TTL_SECONDS)
+
+def invalidate_cached_user(email: str) -> None:
+    current_user_cache.invalidate_where(lambda user: user.get("email") == email)
+
 class AuthService:
     def __init__(self):
-        self.user_repo = UserRepository()
-        self.otp_repo = OTPRepository()
+        # Repositories are resolved on first use: the routes build this service at import,
+        # before the app connects to Mongo
+        self._user_repo: Optional[UserRepository] = None
+        self._otp_repo: Optional[OTPRepository] = None
         self.rate_limiter = RateLimiter()
 
+    @property
+    def user_repo(self) -> UserRepository:
+        if self._user_repo is None:
+            self._user_repo = UserRepository()
+        return self._user_repo
+
+    @property
+    def otp_repo(self) -> OTPRepository:
+        if self._otp_repo is None:
+            self._otp_repo = OTPRepository()
+        return self._otp_repo
+
+    @timed()
     async def register_user(self, user_create):
         logger.info(f"Attempting to register user: {user_create.email}")
         if await self.user_repo.get_by_email(user_create.email):
             logger.warning(f"Registration failed: User already exists: {user_create.email}")
             return None
-        hashed_pwd = hash_password(user_create.password)
+        hashed_pwd = await password_hasher.hash(user_create.password)
         user_data = user_create.dict()
         user_data['password'] = hashed_pwd
         user = await self.user_repo.create(user_data)
         logger.info(f"User registered successfully: {user_create.email}")
         return user
 
+    @timed()
     async def authenticate_user(self, email: str, password: str) -> Optional[str]:
         logger.info(f"Authenticating user: {email}")
         user = await self.user_repo.get_by_email(email)
-        if not user or not verify_password(password, user['password']):
+        if not user or not await password_hasher.verify(password, user['password']):
             logger.warning(f"Authentication failed for user: {email}")
             return None
         token = create_access_token({"sub": user['email']})
         logger.info(f"Authentication successful for user: {email}")
         return token
 
+    @timed()
     async def generate_otp(self, email: str) -> Optional[str]:
         logger.info(f"Generating OTP for: {email}")
         if not await self.user_repo.get_by_email(email):
             logger.warning(f"OTP generation failed: User not found: {email}")
             return None
-        if not self.rate_limiter.allow(email):
+        if not await self.rate_limiter.allow(email):
             logger.warning(f"OTP generation rate limit exceeded for: {email}")
             return None
         otp = ''.join(random.choices(string.digits, k=6))
@@ -53,23 +82,21 @@ class AuthService:
         logger.info(f"OTP generated for {email}: {otp}")
         return otp
 
+    @timed()
     async def verify_otp(self, email: str, otp: str) -> bool:
         logger.info(f"Verifying OTP for: {email}")
-        otp_record = await self.otp_repo.get_otp(email)
-        if not otp_record:
-            logger.warning(f"OTP verification failed: No OTP found for {email}")
-            return False
-        if otp_record['otp'] != otp:
-            logger.warning(f"OTP verification failed: Incorrect OTP for {email}")
-            return False
-        if datetime.utcnow() > otp_record['expires_at']:
-            logger.warning(f"OTP verification failed: OTP expired for {email}")
+        if not await self.otp_repo.consume_otp(email, otp):
+            logger.warning(f"OTP verification failed: No matching unexpired OTP for {email}")
             return False
-        await self.otp_repo.delete_otp(email)
         logger.info(f"OTP verified successfully for {email}")
         return True
 
+    @timed()
     async def get_user_from_token(self, token: str):
+        cached = current_user_cache.get(token)
+        if cached is not None:
+            # Callers may modify the user they get back
+            return dict(cached)
         # This function should decode the token and fetch the user
         from app.utils.security import decode_access_token
         payload = decode_access_token(token)
@@ -77,4 +104,11 @@ class AuthService:
             logger.warning("Token decoding failed or invalid payload.")
             return None
         user = await self.user_repo.get_by_email(payload['sub'])
+        if user:
+            ttl = CURRENT_USER_CACHE_TTL_SECONDS
+            if payload.get('exp'):
+                # Never serve a token from cache past its expiry
+                ttl = min(ttl, payload['exp'] - time.time())
+            if ttl > 0:
+                current_user_cache.set(token, dict(user), ttl=ttl)
         return user
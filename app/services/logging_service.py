@@ -1,15 +1,47 @@
-import logging
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from app.core.audit import AuditPipeline, audit_pipeline
+from app.repositories.audit_repository import AuditRepository
+from app.core.metrics import timed
 
 class LoggingService:
-    def __init__(self):
-        self.logger = logging.getLogger("product_audit")
+    """
+    Records product audit events as structured records. Events are queued on the
+    audit pipeline and written in batches in the background, off the request path.
+    """
+
+    def __init__(self, pipeline: Optional[AuditPipeline] = None, repository: Optional[AuditRepository] = None):
+        self.pipeline = pipeline or audit_pipeline
+        self.repository = repository
 
     def log_product_addition(self, product_id: str, user: str, details: dict):
-        timestamp = datetime.utcnow().isoformat()
-        self.logger.info(f"[ADD] ProductID: {product_id} | User: {user} | Time: {timestamp} | Details: {details}")
+        self._submit("add", user, product_id=product_id, details=details)
 
     def log_product_edit(self, product_id: str, user: str, changes: dict):
-        timestamp = datetime.utcnow().isoformat()
-        self.logger.info(f"[EDIT] ProductID: {product_id} | User: {user} | Time: {timestamp} | Changes: {changes}")
+        self._submit("edit", user, product_id=product_id, changes=changes)
+
+    def log_product_import(self, user: str, inserted: int, failed: int):
+        self._submit("import", user, inserted=inserted, failed=failed)
+
+    def log_stock_reservation(self, product_id: str, user: str, reservation_id: str, quantity: int):
+        self._submit("stock_reserve", user, product_id=product_id,
+                     changes={"in_stock": -quantity}, details={"reservation_id": reservation_id})
+
+    def log_stock_release(self, product_id: str, user: str, reservation_id: str, quantity: int):
+        self._submit("stock_release", user, product_id=product_id,
+                     changes={"in_stock": quantity}, details={"reservation_id": reservation_id})
+
+    def _submit(self, event: str, user: str, **fields: Any):
+        record: Dict[str, Any] = {"event": event, "user": user, "ts": datetime.utcnow(), **fields}
+        self.pipeline.submit(record)
+
+    @timed()
+    async def get_product_history(
+        self, product_id: str, limit: int = 50, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        repository = self.repository or AuditRepository()
+        try:
+            return await repository.get_product_history(product_id, limit=limit, cursor=cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
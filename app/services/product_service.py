@@ -1,43 +1,366 @@
+import asyncio
 import logging
-from typing import List, Optional
-from pymongo.collection import Collection
-from pymongo.errors import PyMongoError
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Set, Tuple, Union
+from pydantic import BaseModel
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pydantic import ValidationError
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 from bson import ObjectId
 from fastapi import HTTPException
-from app.models.product import ProductModel, ProductCreateModel, ProductUpdateModel
+from app.models.product_model import (
+    ProductModel,
+    ProductCreateModel,
+    ProductUpdateModel,
+    ProductImportError,
+    ProductImportResult,
+    ProductFilterModel,
+    CategorySummaryModel,
+    StockCommitResult,
+    StockReleaseResult,
+    StockReservationItem,
+    StockReservationItemResult,
+    StockReservationResult,
+    PUBLIC_PRODUCT_FIELDS,
+    product_projection,
+    to_product_fields,
+    version_filter,
+)
+from app.core.config import PRODUCT_CACHE_MAXSIZE, PRODUCT_CACHE_TTL_SECONDS
+from app.core.events import ProductEventBus
+from app.repositories.category_stats_repository import CATEGORY_STATS_PIPELINE, CategoryDeltas, CategoryStatsRepository
+from app.core.indexes import declare_indexes
+from app.utils.cache import TTLCache
+from app.utils.dataloader import DataLoader
+from app.utils.conditional import page_etag
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_filter
+from app.utils.product_io import ParsedRow, PRODUCT_FIELDS
+from app.core.metrics import timed
 
 logger = logging.getLogger(__name__)
 
+PRODUCTS_COLLECTION = "products"
+
+# Trailing _id keeps keyset pages on (sort_key, _id) inside the index
+declare_indexes(
+    PRODUCTS_COLLECTION,
+    IndexModel([("category", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)], name="category_price"),
+    IndexModel([("price", ASCENDING), ("_id", ASCENDING)], name="price"),
+    IndexModel([("name", ASCENDING), ("_id", ASCENDING)], name="name"),
+    # Finds the products holding a stock reservation on release and commit
+    IndexModel([("reservations.id", ASCENDING)], name="reservations_id", sparse=True),
+    # Finds the reservations old enough to expire
+    IndexModel([("reservations.ts", ASCENDING)], name="reservations_ts", sparse=True),
+)
+
+# Fields the listing can be sorted by; each has an index ending in _id for keyset paging
+SORTABLE_FIELDS = {"_id", "price", "name"}
+
+def check_page_limit(limit: int) -> None:
+    # A page needs at least one product: the next cursor is built from the last one
+    if limit < 1:
+        logger.warning(f"Rejected product page limit {limit}")
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+
+def parse_sort(sort: str) -> Tuple[str, bool]:
+    """
+    Split a sort parameter such as `price` or `-price` into (field, descending).
+    """
+    field = sort.lstrip("-")
+    if field not in SORTABLE_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort field: {field}")
+    return field, sort.startswith("-")
+
+def build_product_query(filters: ProductFilterModel) -> Dict[str, Any]:
+    """
+    Translate listing filters into a Mongo query. Equality on category comes first and
+    price is a range so `(category, price, _id)` can serve both.
+    """
+    query: Dict[str, Any] = {}
+    if filters.category is not None:
+        query["category"] = filters.category
+    price: Dict[str, float] = {}
+    if filters.min_price is not None:
+        price["$gte"] = filters.min_price
+    if filters.max_price is not None:
+        price["$lte"] = filters.max_price
+    if price:
+        query["price"] = price
+    if filters.in_stock_only:
+        query["in_stock"] = {"$gt": 0}
+    return query
+
+# Process-wide read-through cache for single product lookups
+product_cache = TTLCache(maxsize=PRODUCT_CACHE_MAXSIZE, ttl=PRODUCT_CACHE_TTL_SECONDS)
+
+# Category aggregate updates moved off the request path, referenced until they finish
+_deferred_stats: Set[asyncio.Task] = set()
+
+async def drain_deferred_stats() -> None:
+    """
+    Wait for the category aggregate updates still running in the background, e.g. on shutdown.
+    """
+    while _deferred_stats:
+        await asyncio.gather(*list(_deferred_stats), return_exceptions=True)
+
+async def fetch_products_by_id(collection: AsyncIOMotorCollection, ids: List[ObjectId]) -> Dict[ObjectId, Dict[str, Any]]:
+    """
+    Batch function for a product DataLoader: read the given products with one `$in` query.
+    """
+    docs = await collection.find({"_id": {"$in": ids}}).to_list(length=len(ids))
+    return {doc["_id"]: doc for doc in docs}
+
 class ProductService:
-    def __init__(self, collection: Collection):
+    def __init__(
+        self,
+        collection: AsyncIOMotorCollection,
+        cache: Optional[TTLCache] = None,
+        loader: Optional[DataLoader] = None,
+        events: Optional[ProductEventBus] = None,
+        stats: Optional[CategoryStatsRepository] = None
+    ):
         self.collection = collection
+        self.cache = cache
+        self.loader = loader
+        self.events = events
+        self.stats = stats
 
-    def get_product(self, product_id: str) -> Optional[ProductModel]:
+    @timed()
+    async def get_product(
+        self, product_id: str, fields: Optional[Tuple[str, ...]] = None, raw: bool = False
+    ) -> Optional[Union[ProductModel, BaseModel, Dict[str, Any]]]:
+        """
+        Fetch one product. With `fields` (see `parse_product_fields`) only those fields
+        are read from Mongo and a trimmed model is returned. With `raw` the result is a
+        plain dict and a stored document is not re-validated.
+        """
+        found = await self.get_product_with_validators(product_id, fields=fields, raw=raw)
+        return found[0] if found is not None else None
+
+    @timed()
+    async def get_product_with_validators(
+        self, product_id: str, fields: Optional[Tuple[str, ...]] = None, raw: bool = False
+    ) -> Optional[Tuple[Union[ProductModel, BaseModel, Dict[str, Any]], Tuple[int, Optional[datetime]]]]:
+        """
+        `get_product` plus the product's `(version, updated_at)` for `ETag` and
+        `Last-Modified`. They are read in the same query even when `fields` leaves
+        them out, and dropped from the trimmed result.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(product_id)
+            if cached is not None:
+                validators = (cached.version, cached.updated_at)
+                if raw:
+                    return cached.dict(by_alias=True, include=set(fields) if fields else None), validators
+                return (to_product_fields(cached.dict(by_alias=True), fields) if fields else cached), validators
+        projection = None
+        if fields or raw:
+            projection = {**product_projection(fields or PUBLIC_PRODUCT_FIELDS), "version": 1, "updated_at": 1}
         try:
-            product = self.collection.find_one({"_id": ObjectId(product_id)})
+            if projection:
+                # Projected reads keep their projection; the loader batches full documents only
+                product = await self.collection.find_one({"_id": ObjectId(product_id)}, projection)
+            elif self.loader is not None:
+                product = await self.loader.load(ObjectId(product_id))
+            else:
+                product = await self.collection.find_one({"_id": ObjectId(product_id)})
             if not product:
                 logger.warning(f"Product with id {product_id} not found.")
                 return None
-            return ProductModel(**product)
+            validators = (product.get("version") or 0, product.get("updated_at"))
+            if raw:
+                if fields:
+                    product = {name: value for name, value in product.items() if name == "_id" or name in fields}
+                return product, validators
+            if fields:
+                return to_product_fields(product, fields), validators
+            model = ProductModel(**product)
+            if self.cache is not None:
+                self.cache.set(product_id, model)
+            return model, validators
         except Exception as e:
             logger.error(f"Error fetching product {product_id}: {e}")
             raise HTTPException(status_code=500, detail="Internal server error")
 
-    def get_products(self, skip: int = 0, limit: int = 100) -> List[ProductModel]:
+    @timed()
+    async def get_product_validators(self, product_id: str) -> Optional[Tuple[int, Optional[datetime]]]:
+        """
+        `(version, updated_at)` of a product for conditional requests, from the cache
+        or from a query that only reads those two fields. None if it does not exist.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(product_id)
+            if cached is not None:
+                return cached.version, cached.updated_at
+        try:
+            doc = await self.collection.find_one({"_id": ObjectId(product_id)}, {"version": 1, "updated_at": 1})
+        except Exception as e:
+            logger.error(f"Error fetching version of product {product_id}: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error")
+        if not doc:
+            return None
+        return doc.get("version") or 0, doc.get("updated_at")
+
+    @timed()
+    async def get_products(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        filters: Optional[ProductFilterModel] = None,
+        fields: Optional[Tuple[str, ...]] = None
+    ) -> List[Union[ProductModel, BaseModel]]:
+        products, _ = await self.get_products_page(skip=skip, limit=limit, cursor=cursor, filters=filters, fields=fields)
+        return products
+
+    @timed()
+    async def get_products_page(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        filters: Optional[ProductFilterModel] = None,
+        fields: Optional[Tuple[str, ...]] = None,
+        raw: bool = False
+    ) -> Tuple[List[Union[ProductModel, BaseModel, Dict[str, Any]]], Optional[str]]:
+        """
+        Return one page of matching products plus the cursor for the next page.
+        Pages are ordered by `(sort field, _id)`. When a cursor is given the page is
+        selected by keyset and `skip` is ignored; `skip` remains only for clients that
+        have not moved to cursors yet. With `fields`, trimmed models are returned.
+        With `raw`, stored documents are returned as dicts without re-validation;
+        they were validated on write.
+        """
+        products, next_cursor, _ = await self.get_products_page_with_etag(
+            skip=skip, limit=limit, cursor=cursor, filters=filters, fields=fields, raw=raw
+        )
+        return products, next_cursor
+
+    @timed()
+    async def get_products_page_with_etag(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        filters: Optional[ProductFilterModel] = None,
+        fields: Optional[Tuple[str, ...]] = None,
+        raw: bool = False
+    ) -> Tuple[List[Union[ProductModel, BaseModel, Dict[str, Any]]], Optional[str], str]:
+        """
+        `get_products_page` plus the page's ETag, the same one `get_products_page_etag`
+        gives, computed from the documents just read; `version` is always projected
+        for it and left out of trimmed products that did not ask for it.
+        """
+        check_page_limit(limit)
+        query, sort_spec = self._page_query(cursor, filters)
+        sort_field = sort_spec[0][0]
+        projection = None
+        if fields:
+            # The sort key is needed to build the next cursor even if it was not requested
+            projection = {**product_projection(fields), sort_field: 1, "version": 1}
+        elif raw:
+            # Keep internal fields out of responses that skip the model
+            projection = product_projection(PUBLIC_PRODUCT_FIELDS)
         try:
-            products = self.collection.find().skip(skip).limit(limit)
-            return [ProductModel(**prod) for prod in products]
+            find = self.collection.find(query, projection).sort(sort_spec)
+            if skip and not cursor:
+                find = find.skip(skip)
+            # Fetch one extra document to know whether another page exists
+            docs = await find.limit(limit + 1).to_list(length=limit + 1)
+            etag = page_etag((doc["_id"], doc.get("version")) for doc in docs)
+            next_cursor = None
+            if len(docs) > limit:
+                docs = docs[:limit]
+                next_cursor = encode_cursor(docs[-1]["_id"], sort_field, docs[-1].get(sort_field))
+            if raw:
+                if fields:
+                    docs = [{"_id": prod["_id"], **{name: prod.get(name) for name in fields if name != "id"}} for prod in docs]
+                return docs, next_cursor, etag
+            if fields:
+                return [to_product_fields(prod, fields) for prod in docs], next_cursor, etag
+            return [ProductModel(**prod) for prod in docs], next_cursor, etag
         except Exception as e:
             logger.error(f"Error fetching products: {e}")
             raise HTTPException(status_code=500, detail="Internal server error")
 
-    def add_product(self, product_data: ProductCreateModel) -> ProductModel:
+    @timed()
+    async def get_products_page_etag(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        filters: Optional[ProductFilterModel] = None
+    ) -> str:
+        """
+        ETag of the page `get_products_page` would return, from the `(_id, version)`
+        pairs of its products. Only those two fields are read, so revalidating an
+        unchanged page costs no document transfer. The extra product past the page is included too,
+        so the ETag also changes when a next page appears or goes away.
+        """
+        check_page_limit(limit)
+        query, sort_spec = self._page_query(cursor, filters)
+        try:
+            find = self.collection.find(query, {"_id": 1, "version": 1}).sort(sort_spec)
+            if skip and not cursor:
+                find = find.skip(skip)
+            docs = await find.limit(limit + 1).to_list(length=limit + 1)
+        except Exception as e:
+            logger.error(f"Error fetching product versions: {e}")
+            raise HTTPException(status_code=500, detail="Internal server error")
+        return page_etag((doc["_id"], doc.get("version")) for doc in docs)
+
+    def _page_query(
+        self, cursor: Optional[str], filters: Optional[ProductFilterModel]
+    ) -> Tuple[Dict[str, Any], List[Tuple[str, int]]]:
+        filters = filters or ProductFilterModel()
+        sort_field, descending = parse_sort(filters.sort)
+        query = build_product_query(filters)
+        if cursor:
+            try:
+                after = keyset_filter(decode_cursor(cursor), sort_field, descending)
+            except ValueError as e:
+                logger.warning(f"Rejected product cursor: {e}")
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            query = {"$and": [query, after]} if query else after
+        direction = DESCENDING if descending else ASCENDING
+        sort_spec = [(sort_field, direction)] if sort_field == "_id" else [(sort_field, direction), ("_id", direction)]
+        return query, sort_spec
+
+    async def iter_product_documents(self, batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield raw product documents in `_id` order from a server-side cursor,
+        holding at most one batch in memory.
+        """
+        projection = {field: 1 for field in PRODUCT_FIELDS}
+        cursor = self.collection.find({}, projection).sort("_id", ASCENDING).batch_size(batch_size)
+        try:
+            async for doc in cursor:
+                yield doc
+        except PyMongoError as e:
+            # Headers are already sent at this point; the client sees a truncated body
+            logger.error(f"Database error during product export: {e}")
+            raise
+        finally:
+            await cursor.close()
+
+    @timed()
+    async def add_product(self, product_data: ProductCreateModel) -> ProductModel:
         try:
             product_dict = product_data.dict(exclude_unset=True)
-            result = self.collection.insert_one(product_dict)
+            product_dict["version"] = 1
+            product_dict["updated_at"] = datetime.utcnow()
+            result = await self.collection.insert_one(product_dict)
             product_dict["_id"] = result.inserted_id
             logger.info(f"Product added with id {result.inserted_id}")
-            return ProductModel(**product_dict)
+            model = ProductModel(**product_dict)
+            if self.cache is not None:
+                self.cache.set(str(result.inserted_id), model)
+            self._publish("add", str(result.inserted_id), product=model)
+            deltas = CategoryDeltas()
+            deltas.add(product_dict)
+            self._record_stats_later(deltas)
+            return model
         except PyMongoError as e:
             logger.error(f"Database error adding product: {e}")
             raise HTTPException(status_code=500, detail="Database error")
@@ -45,18 +368,112 @@ class ProductService:
             logger.error(f"Error adding product: {e}")
             raise HTTPException(status_code=500, detail="Internal server error")
 
-    def update_product(self, product_id: str, update_data: ProductUpdateModel) -> Optional[ProductModel]:
+    @timed()
+    async def bulk_add_products(
+        self, rows: AsyncIterator[ParsedRow], chunk_size: int = 1000, max_errors: int = 1000
+    ) -> ProductImportResult:
+        """
+        Validate parsed rows with ProductCreateModel and insert them in unordered
+        `insert_many` chunks. Rows that fail validation or insertion are reported
+        by row number; at most `max_errors` of them are listed in the result.
+        """
+        result = ProductImportResult()
+
+        def record_error(row: int, error: str):
+            result.failed += 1
+            if len(result.errors) < max_errors:
+                result.errors.append(ProductImportError(row=row, error=error))
+
+        chunk: List[Tuple[int, Dict[str, Any]]] = []
+        async for row, parsed in rows:
+            if isinstance(parsed, Exception):
+                record_error(row, str(parsed))
+                continue
+            try:
+                product = ProductCreateModel(**parsed)
+            except ValidationError as e:
+                record_error(row, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+                continue
+            chunk.append((row, {**product.dict(exclude_unset=True), "version": 1, "updated_at": datetime.utcnow()}))
+            if len(chunk) >= chunk_size:
+                await self._insert_chunk(chunk, result, record_error)
+                chunk = []
+        if chunk:
+            await self._insert_chunk(chunk, result, record_error)
+        logger.info(f"Bulk import finished: {result.inserted} inserted, {result.failed} failed")
+        return result
+
+    async def _insert_chunk(self, chunk: List[Tuple[int, Dict[str, Any]]], result: ProductImportResult, record_error):
+        try:
+            inserted = await self.collection.insert_many([doc for _, doc in chunk], ordered=False)
+            result.inserted += len(inserted.inserted_ids)
+            failed = set()
+        except BulkWriteError as e:
+            # Unordered writes keep going past failures; map each failure back to its row
+            write_errors = e.details.get("writeErrors", [])
+            result.inserted += e.details.get("nInserted", len(chunk) - len(write_errors))
+            for err in write_errors:
+                record_error(chunk[err["index"]][0], err.get("errmsg", "Write failed"))
+            failed = {err["index"] for err in write_errors}
+        except PyMongoError as e:
+            logger.error(f"Database error during bulk import: {e}")
+            raise HTTPException(status_code=500, detail="Database error")
+        deltas = CategoryDeltas()
+        for index, (_, doc) in enumerate(chunk):
+            if index in failed:
+                continue
+            deltas.add(doc)
+            if self.events is not None:
+                # insert_many sets the generated _id on each document
+                self._publish("add", str(doc["_id"]), product=ProductModel(**doc))
+        await self._record_stats(deltas)
+
+    @timed()
+    async def update_product(
+        self, product_id: str, update_data: ProductUpdateModel, expected_version: Optional[int] = None
+    ) -> Optional[ProductModel]:
+        """
+        Apply the update in a single `find_one_and_update`. It returns the pre-image,
+        which gives the category aggregates their deltas; the post-image is derived
+        from it, since `$set` and `$inc` are deterministic.
+        With `expected_version`, the write only succeeds if the stored version still
+        matches; a mismatch raises 409 so the caller can re-read and retry.
+        """
         try:
             update_dict = {k: v for k, v in update_data.dict(exclude_unset=True).items() if v is not None}
             if not update_dict:
                 logger.warning(f"No update data provided for product {product_id}")
                 raise HTTPException(status_code=400, detail="No update data provided")
-            result = self.collection.update_one({"_id": ObjectId(product_id)}, {"$set": update_dict})
-            if result.matched_count == 0:
+            query = {"_id": ObjectId(product_id)}
+            if expected_version is not None:
+                query["version"] = version_filter(expected_version)
+            changes = {**update_dict, "updated_at": datetime.utcnow()}
+            before = await self.collection.find_one_and_update(
+                query,
+                {"$set": changes, "$inc": {"version": 1}},
+                return_document=ReturnDocument.BEFORE
+            )
+            if not before:
+                # Only the failure path pays for a second lookup to tell a conflict from a miss
+                if expected_version is not None and await self.collection.count_documents({"_id": query["_id"]}, limit=1):
+                    logger.warning(f"Version conflict updating product {product_id}: expected {expected_version}")
+                    raise HTTPException(status_code=409, detail="Product was modified by another request")
                 logger.warning(f"Product with id {product_id} not found for update.")
                 return None
             logger.info(f"Product {product_id} updated.")
-            return self.get_product(product_id)
+            product = {**before, **changes, "version": (before.get("version") or 0) + 1}
+            if self.loader is not None:
+                self.loader.clear(query["_id"])
+            deltas = CategoryDeltas()
+            deltas.replace(before, product)
+            self._record_stats_later(deltas)
+            model = ProductModel(**product)
+            if self.cache is not None:
+                self.cache.set(product_id, model)
+            self._publish("update", product_id, product=model)
+            return model
+        except HTTPException:
+            raise
         except PyMongoError as e:
             logger.error(f"Database error updating product: {e}")
             raise HTTPException(status_code=500, detail="Database error")
@@ -64,11 +481,269 @@ class ProductService:
             logger.error(f"Error updating product {product_id}: {e}")
             raise HTTPException(status_code=500, detail="Internal server error")
 
-    def propagate_product_update(self, product_id: str):
-        # Placeholder for propagation logic (e.g., notify other services, send events, etc.)
+    @timed()
+    async def reserve_stock(
+        self, items: List[StockReservationItem], all_or_nothing: bool = False
+    ) -> StockReservationResult:
+        """
+        Reserve stock for several products in one unordered `bulk_write`. Each item is
+        a conditional `$inc` that only matches while `in_stock >= quantity`, so
+        concurrent carts can never oversell. The write also pushes
+        `{id, qty, ts}` onto the product's `reservations`. When every item matched
+        that is the only round trip on the request path. Otherwise the reservation id
+        embedded in the products shows which items went through. The category
+        aggregates need the products' categories, which the write does not return,
+        so they are updated in the background. Duplicate products are merged.
+        """
+        reservation_id = str(ObjectId())
+        quantities: Dict[str, int] = {}
+        for item in items:
+            quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+        results = {
+            product_id: StockReservationItemResult(product_id=product_id, quantity=quantity, reserved=False)
+            for product_id, quantity in quantities.items()
+        }
+        ids: Dict[str, ObjectId] = {}
+        for product_id in quantities:
+            if ObjectId.is_valid(product_id):
+                ids[product_id] = ObjectId(product_id)
+            else:
+                results[product_id].error = "invalid_id"
+        reserved: set = set()
+        existing: set = set()
+        if ids:
+            now = datetime.utcnow()
+            requests = [
+                UpdateOne(
+                    {"_id": oid, "in_stock": {"$gte": quantities[product_id]}},
+                    {
+                        "$inc": {"in_stock": -quantities[product_id], "version": 1},
+                        "$set": {"updated_at": now},
+                        "$push": {"reservations": {"id": reservation_id, "qty": quantities[product_id], "ts": now}},
+                    },
+                )
+                for product_id, oid in ids.items()
+            ]
+            try:
+                try:
+                    matched = (await self.collection.bulk_write(requests, ordered=False)).matched_count
+                except BulkWriteError as e:
+                    # Some items failed to write; the lookup below tells which ones went through
+                    logger.warning(f"Stock reservation {reservation_id} had write errors: {e.details.get('writeErrors')}")
+                    matched = -1
+                if matched == len(ids):
+                    reserved = set(ids.values())
+                else:
+                    reserved = await self._ids_matching({"_id": {"$in": list(ids.values())}, "reservations.id": reservation_id})
+                    missing = [oid for oid in ids.values() if oid not in reserved]
+                    existing = await self._ids_matching({"_id": {"$in": missing}})
+            except PyMongoError as e:
+                logger.error(f"Database error reserving stock: {e}")
+                raise HTTPException(status_code=500, detail="Database error")
+            for product_id, oid in ids.items():
+                if oid in reserved:
+                    results[product_id].reserved = True
+                    self._forget(product_id)
+                    self._publish("stock", product_id, in_stock_delta=-quantities[product_id])
+                else:
+                    results[product_id].error = "insufficient_stock" if oid in existing else "not_found"
+        outcome = list(results.values())
+        held = {ids[item.product_id]: -item.quantity for item in outcome if item.reserved}
+        if all_or_nothing and not all(item.reserved for item in outcome) and any(item.reserved for item in outcome):
+            try:
+                rollback = await self._release_reservation(reservation_id, record_stats=False)
+            except HTTPException:
+                # The stock is still taken; report it as reserved so the client can release it
+                rollback = None
+            restored = {ObjectId(item.product_id) for item in rollback.items} if rollback else set()
+            held = {oid: change for oid, change in held.items() if oid not in restored}
+            for item in outcome:
+                if item.reserved and ids[item.product_id] in restored:
+                    item.reserved, item.error = False, "rolled_back"
+            if held:
+                logger.warning(f"Stock reservation {reservation_id}: rollback left {len(held)} items reserved")
+        # Only the final outcome reaches the aggregates, so a rollback costs no stats writes
+        if held and self.stats is not None:
+            self._defer_stats(self._record_stock_stats(held))
+        logger.info(f"Stock reservation {reservation_id}: {sum(item.reserved for item in outcome)} of {len(outcome)} items reserved")
+        return StockReservationResult(
+            reservation_id=reservation_id, reserved=all(item.reserved for item in outcome), items=outcome
+        )
+
+    @timed()
+    async def release_stock(self, reservation_id: str) -> Optional[StockReleaseResult]:
+        """
+        Compensate a reservation: give each product its reserved quantity back and drop
+        the reservation entry. Each product gets its own `find_one_and_update`, sent
+        concurrently and conditional on the entry still being there, so releasing twice,
+        or racing a commit, never restores stock twice; only the updates that applied
+        are reported, published and counted. Returns None when no product holds the
+        reservation any more.
+        """
+        return await self._release_reservation(reservation_id)
+
+    async def _release_reservation(self, reservation_id: str, record_stats: bool = True) -> Optional[StockReleaseResult]:
+        try:
+            docs = await self.collection.find(
+                {"reservations.id": reservation_id}, {"_id": 1, "category": 1, "reservations": 1}
+            ).to_list(length=None)
+        except PyMongoError as e:
+            logger.error(f"Database error releasing stock reservation {reservation_id}: {e}")
+            raise HTTPException(status_code=500, detail="Database error")
+        now = datetime.utcnow()
+
+        async def release(doc: Dict[str, Any]) -> Optional[StockReservationItem]:
+            quantity = sum(entry["qty"] for entry in doc["reservations"] if entry.get("id") == reservation_id)
+            applied = await self.collection.find_one_and_update(
+                {"_id": doc["_id"], "reservations.id": reservation_id},
+                {
+                    "$inc": {"in_stock": quantity, "version": 1},
+                    "$set": {"updated_at": now},
+                    "$pull": {"reservations": {"id": reservation_id}},
+                },
+                projection={"_id": 1},
+            )
+            return StockReservationItem(product_id=str(doc["_id"]), quantity=quantity) if applied else None
+
+        outcomes = await asyncio.gather(*(release(doc) for doc in docs), return_exceptions=True)
+        released: List[StockReservationItem] = []
+        deltas = CategoryDeltas()
+        failed = 0
+        for doc, outcome in zip(docs, outcomes):
+            if isinstance(outcome, BaseException):
+                failed += 1
+                logger.error(f"Database error releasing stock reservation {reservation_id} for product {doc['_id']}: {outcome}")
+            elif outcome is not None:
+                released.append(outcome)
+                deltas.stock(doc.get("category"), outcome.quantity)
+        if record_stats:
+            await self._record_stats(deltas)
+        for item in released:
+            self._forget(item.product_id)
+            self._publish("stock", item.product_id, in_stock_delta=item.quantity)
+        if failed and not released:
+            raise HTTPException(status_code=500, detail="Database error")
+        if not released:
+            logger.warning(f"Stock reservation {reservation_id} not found for release.")
+            return None
+        logger.info(f"Stock reservation {reservation_id} released for {len(released)} products")
+        return StockReleaseResult(reservation_id=reservation_id, items=released)
+
+    @timed()
+    async def release_expired_reservations(self, max_age: float, limit: int = 1000) -> List[StockReleaseResult]:
+        """
+        Release every reservation made more than `max_age` seconds ago and neither
+        committed nor released since, e.g. by a checkout that was abandoned without
+        calling release. Looks at up to `limit` products per run.
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        try:
+            docs = await self.collection.find(
+                {"reservations.ts": {"$lt": cutoff}}, {"_id": 0, "reservations": 1}
+            ).limit(limit).to_list(length=None)
+        except PyMongoError as e:
+            logger.error(f"Database error finding expired stock reservations: {e}")
+            raise HTTPException(status_code=500, detail="Database error")
+        expired = {entry["id"] for doc in docs for entry in doc["reservations"] if entry["ts"] < cutoff}
+        results = []
+        for reservation_id in expired:
+            result = await self.release_stock(reservation_id)
+            if result is not None:
+                results.append(result)
+        if results:
+            logger.info(f"Released {len(results)} expired stock reservations")
+        return results
+
+    @timed()
+    async def commit_stock(self, reservation_id: str) -> Optional[StockCommitResult]:
+        """
+        Finalize a reservation after checkout: the stock stays decremented and the
+        reservation entries are dropped in one `update_many`. Returns None when no
+        product holds the reservation.
+        """
         try:
-            logger.info(f"Propagating update for product {product_id}")
-            # Implement actual propagation logic here
+            result = await self.collection.update_many(
+                {"reservations.id": reservation_id}, {"$pull": {"reservations": {"id": reservation_id}}}
+            )
+        except PyMongoError as e:
+            logger.error(f"Database error committing stock reservation {reservation_id}: {e}")
+            raise HTTPException(status_code=500, detail="Database error")
+        if not result.modified_count:
+            logger.warning(f"Stock reservation {reservation_id} not found for commit.")
+            return None
+        logger.info(f"Stock reservation {reservation_id} committed for {result.modified_count} products")
+        return StockCommitResult(reservation_id=reservation_id, products=result.modified_count)
+
+    @timed()
+    async def get_category_summary(self) -> List[CategorySummaryModel]:
+        """
+        Per-category count, stock total and price bounds. Served from the maintained
+        aggregates; without them, computed from the products with `$group`.
+        """
+        try:
+            if self.stats is not None:
+                rows = await self.stats.get_summary()
+            else:
+                rows = await self.collection.aggregate(CATEGORY_STATS_PIPELINE).to_list(length=None)
+        except PyMongoError as e:
+            logger.error(f"Database error fetching category summary: {e}")
+            raise HTTPException(status_code=500, detail="Database error")
+        return [CategorySummaryModel(category=row.pop("_id"), **row) for row in rows]
+
+    async def _record_stats(self, deltas: CategoryDeltas) -> None:
+        # Best effort: the product write already happened, and reconciliation repairs missed deltas
+        if self.stats is None or deltas.empty():
+            return
+        try:
+            await self.stats.apply(deltas, self.collection)
         except Exception as e:
-            logger.error(f"Error propagating product update for {product_id}: {e}")
-            raise HTTPException(status_code=500, detail="Internal server error")
+            logger.error(f"Failed to update category aggregates: {e}")
+
+    def _record_stats_later(self, deltas: CategoryDeltas) -> None:
+        # Keeps the aggregate round trips off the write's request path
+        if self.stats is not None and not deltas.empty():
+            self._defer_stats(self._record_stats(deltas))
+
+    def _defer_stats(self, job: Awaitable[None]) -> None:
+        task = asyncio.create_task(job)
+        _deferred_stats.add(task)
+        task.add_done_callback(_deferred_stats.discard)
+
+    async def _record_stock_stats(self, stock_changes: Dict[ObjectId, int]) -> None:
+        try:
+            docs = await self.collection.find({"_id": {"$in": list(stock_changes)}}, {"category": 1}).to_list(length=None)
+        except PyMongoError as e:
+            logger.error(f"Failed to read categories for aggregate update: {e}")
+            return
+        deltas = CategoryDeltas()
+        for doc in docs:
+            deltas.stock(doc.get("category"), stock_changes[doc["_id"]])
+        await self._record_stats(deltas)
+
+    async def _ids_matching(self, query: Dict[str, Any]) -> set:
+        docs = await self.collection.find(query, {"_id": 1}).to_list(length=None)
+        return {doc["_id"] for doc in docs}
+
+    def _forget(self, product_id: str) -> None:
+        # Drop cached copies of a product whose stock changed outside update_product
+        if self.cache is not None:
+            self.cache.invalidate(product_id)
+        if self.loader is not None and ObjectId.is_valid(product_id):
+            self.loader.clear(ObjectId(product_id))
+
+    def _publish(
+        self, event_type: str, product_id: str, product: Optional[ProductModel] = None, in_stock_delta: Optional[int] = None
+    ) -> None:
+        if self.events is not None:
+            snapshot = product.dict(by_alias=True) if product is not None else None
+            self.events.publish(event_type, product_id, product=snapshot, in_stock_delta=in_stock_delta)
+
+    async def propagate_product_update(self, product_id: str):
+        """
+        Announce a change made outside this service, e.g. by a script writing to Mongo
+        directly. Cached copies are dropped and subscribers of the change feed get an
+        `update` event without a snapshot, so they re-read the product.
+        """
+        logger.info(f"Propagating update for product {product_id}")
+        self._forget(product_id)
+        self._publish("update", product_id)
@@ -3,13 +3,24 @@ from typing import Optional
 from app.repositories.user_repository import UserRepository
 from app.schemas.user import UserBase, UserCreate
 from app.utils.validation import validate_user_update
+from app.services.auth_service import invalidate_cached_user
+from app.core.metrics import timed
 
 logger = logging.getLogger(__name__)
 
 class UserService:
     def __init__(self):
-        self.user_repo = UserRepository()
+        # Repositories are resolved on first use: the routes build this service at import,
+        # before the app connects to Mongo
+        self._user_repo: Optional[UserRepository] = None
 
+    @property
+    def user_repo(self) -> UserRepository:
+        if self._user_repo is None:
+            self._user_repo = UserRepository()
+        return self._user_repo
+
+    @timed()
     async def get_user_by_email(self, email: str) -> Optional[dict]:
         logger.info(f"Retrieving user by email: {email}")
         user = await self.user_repo.get_by_email(email)
@@ -18,6 +29,7 @@ class UserService:
             return None
         return user
 
+    @timed()
     async def create_user(self, user_create: UserCreate) -> Optional[dict]:
         logger.info(f"Creating user: {user_create.email}")
         if await self.user_repo.get_by_email(user_create.email):
@@ -28,6 +40,7 @@ class UserService:
         logger.info(f"User created: {user_create.email}")
         return user
 
+    @timed()
     async def update_user_profile(self, email: str, user_update: UserBase) -> Optional[dict]:
         logger.info(f"Updating user profile for: {email}")
         # Validate update fields
@@ -36,8 +49,20 @@ class UserService:
             logger.warning(f"Validation failed for user update: {validation_result['error']}")
             return None
         updated_user = await self.user_repo.update_by_email(email, user_update.dict(exclude_unset=True))
+        invalidate_cached_user(email)
         if not updated_user:
             logger.warning(f"User not found or update failed: {email}")
             return None
         logger.info(f"User profile updated: {email}")
         return updated_user
+
+    @timed()
+    async def delete_user(self, email: str) -> bool:
+        logger.info(f"Deleting user: {email}")
+        deleted = await self.user_repo.delete_by_email(email)
+        invalidate_cached_user(email)
+        if not deleted:
+            logger.warning(f"User not found for deletion: {email}")
+            return False
+        logger.info(f"User deleted: {email}")
+        return True
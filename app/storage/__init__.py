@@ -0,0 +1,28 @@
+"""
+Storage backends behind `get_mongo_db()`.
+
+Services and repositories talk to the Motor collection API. With
+`STORAGE_BACKEND=mongo` (the default) that is Motor itself. With
+`STORAGE_BACKEND=memory` it is the embedded implementation in `memory.py`,
+which needs no mongod. It supports the filters, update operators, upserts,
+cursors, bulk writes and aggregation stages the app uses.
+"""
+from app.storage.memory import (
+    AsyncMemoryCollection,
+    AsyncMemoryCursor,
+    MemoryClient,
+    MemoryCollection,
+    MemoryCursor,
+    MemoryDatabase,
+    MemoryStorage,
+)
+
+__all__ = [
+    "AsyncMemoryCollection",
+    "AsyncMemoryCursor",
+    "MemoryClient",
+    "MemoryCollection",
+    "MemoryCursor",
+    "MemoryDatabase",
+    "MemoryStorage",
+]
@@ -0,0 +1,578 @@
+"""
+Embedded in-memory implementation of the slice of the PyMongo/Motor API the app uses.
+Collections keep documents in insertion order and enforce unique indexes. Results
+are deep copies, as if they had come over the wire. TTL indexes are recorded but
+documents are not expired; queries that care about expiry filter on it themselves,
+as the app already does.
+"""
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Union
+from bson import ObjectId
+from pymongo import IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+from app.storage.query import (
+    MISSING,
+    apply_update,
+    freeze,
+    get_path,
+    matches,
+    normalize_sort,
+    project,
+    run_pipeline,
+    sort_documents,
+    upsert_seed,
+)
+
+Fetch = Callable[[Optional[List], int, int], List[Dict[str, Any]]]
+
+
+class MemoryCursor:
+    """
+    Lazily evaluated cursor supporting `sort`, `skip`, `limit` and `batch_size` chaining.
+    """
+
+    def __init__(self, fetch: Fetch):
+        self._fetch = fetch
+        self._sort: Optional[List] = None
+        self._skip = 0
+        self._limit = 0
+        self._results: Optional[Iterator[Dict[str, Any]]] = None
+
+    def sort(self, key_or_list: Any, direction: Optional[int] = None) -> "MemoryCursor":
+        self._sort = normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> "MemoryCursor":
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "MemoryCursor":
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "MemoryCursor":
+        return self
+
+    def _iterator(self) -> Iterator[Dict[str, Any]]:
+        if self._results is None:
+            self._results = iter(self._fetch(self._sort, self._skip, self._limit))
+        return self._results
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> Dict[str, Any]:
+        return next(self._iterator())
+
+    def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        iterator = self._iterator()
+        if length is None:
+            return list(iterator)
+        return [doc for _, doc in zip(range(length), iterator)]
+
+    def close(self) -> None:
+        self._results = iter(())
+
+
+class AsyncMemoryCursor(MemoryCursor):
+    """
+    Motor-style cursor: `to_list` and `close` are coroutines and it supports `async for`.
+    """
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        try:
+            return next(self._iterator())
+        except StopIteration:
+            raise StopAsyncIteration
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return MemoryCursor.to_list(self, length)
+
+    async def close(self) -> None:
+        MemoryCursor.close(self)
+
+
+class MemoryCollection:
+    """
+    One collection with PyMongo's synchronous API.
+    """
+
+    def __init__(self, database_name: str, name: str, lock: threading.RLock):
+        self.name = name
+        self.full_name = f"{database_name}.{name}"
+        self._lock = lock
+        self._docs: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        self._indexes: Dict[str, Dict[str, Any]] = {"_id_": {"key": [("_id", 1)], "v": 2}}
+        # unique index name -> frozen key -> frozen _id of the document holding it
+        self._unique: Dict[str, Dict[Any, Any]] = {}
+
+    # Indexes
+
+    def create_indexes(self, indexes: Sequence[IndexModel], **kwargs: Any) -> List[str]:
+        return [self._create_index(index.document) for index in indexes]
+
+    def create_index(self, keys: Any, **kwargs: Any) -> str:
+        return self.create_indexes([IndexModel(keys, **kwargs)])[0]
+
+    def _create_index(self, spec: Dict[str, Any]) -> str:
+        name = spec["name"]
+        info = {key: value for key, value in spec.items() if key != "name"}
+        info["key"] = list(spec["key"].items())
+        with self._lock:
+            if info.get("unique"):
+                entries: Dict[Any, Any] = {}
+                for doc in self._docs.values():
+                    key = self._index_key(info, doc)
+                    if key is None:
+                        continue
+                    if key in entries:
+                        raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} index: {name}", 11000)
+                    entries[key] = freeze(doc["_id"])
+                self._unique[name] = entries
+            self._indexes[name] = info
+        return name
+
+    def index_information(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return copy.deepcopy(self._indexes)
+
+    def drop_index(self, name: str) -> None:
+        with self._lock:
+            self._indexes.pop(name, None)
+            self._unique.pop(name, None)
+
+    def _index_key(self, info: Dict[str, Any], doc: Dict[str, Any]) -> Optional[Any]:
+        partial = info.get("partialFilterExpression")
+        if partial and not matches(doc, partial):
+            return None
+        values = [get_path(doc, field) for field, _ in info["key"]]
+        if info.get("sparse") and all(value is MISSING for value in values):
+            return None
+        # Like MongoDB, a missing field indexes as null
+        return tuple(freeze(None if value is MISSING else value) for value in values)
+
+    def _check_unique(self, doc: Dict[str, Any], replacing: Optional[Dict[str, Any]] = None) -> None:
+        own_id = freeze(replacing["_id"]) if replacing is not None else None
+        if replacing is None and freeze(doc["_id"]) in self._docs:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.full_name} index: _id_ dup key: {{ _id: {doc['_id']!r} }}", 11000
+            )
+        for name, entries in self._unique.items():
+            key = self._index_key(self._indexes[name], doc)
+            holder = entries.get(key) if key is not None else None
+            if holder is not None and holder != own_id:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.full_name} index: {name}", 11000)
+
+    def _store(self, doc: Dict[str, Any], replacing: Optional[Dict[str, Any]] = None) -> None:
+        self._check_unique(doc, replacing)
+        if replacing is not None:
+            self._unindex(replacing)
+        doc_id = freeze(doc["_id"])
+        for name, entries in self._unique.items():
+            key = self._index_key(self._indexes[name], doc)
+            if key is not None:
+                entries[key] = doc_id
+        self._docs[doc_id] = doc
+
+    def _unindex(self, doc: Dict[str, Any]) -> None:
+        for name, entries in self._unique.items():
+            key = self._index_key(self._indexes[name], doc)
+            if key is not None and entries.get(key) == freeze(doc["_id"]):
+                del entries[key]
+
+    def _remove(self, doc: Dict[str, Any]) -> None:
+        self._unindex(doc)
+        del self._docs[freeze(doc["_id"])]
+
+    # Reads
+
+    def _select(self, filter: Optional[Dict[str, Any]], sort: Optional[List] = None) -> List[Dict[str, Any]]:
+        filter = filter or {}
+        if set(filter) == {"_id"} and not isinstance(filter["_id"], dict):
+            # Point lookup by _id skips the scan
+            doc = self._docs.get(freeze(filter["_id"]))
+            return [doc] if doc is not None else []
+        docs = [doc for doc in self._docs.values() if matches(doc, filter)]
+        return sort_documents(docs, sort) if sort else docs
+
+    def find(
+        self,
+        filter: Optional[Dict[str, Any]] = None,
+        projection: Optional[Union[Dict[str, Any], Sequence[str]]] = None,
+        cursor_class: type = MemoryCursor,
+        **kwargs: Any,
+    ) -> MemoryCursor:
+        def fetch(sort: Optional[List], skip: int, limit: int) -> List[Dict[str, Any]]:
+            with self._lock:
+                docs = self._select(filter, sort)[skip:]
+                if limit:
+                    docs = docs[:limit]
+                return [project(copy.deepcopy(doc), projection) for doc in docs]
+
+        cursor = cursor_class(fetch)
+        if kwargs.get("sort"):
+            cursor.sort(kwargs["sort"])
+        return cursor.skip(kwargs.get("skip", 0)).limit(kwargs.get("limit", 0))
+
+    def find_one(self, filter: Optional[Dict[str, Any]] = None, projection: Any = None, **kwargs: Any) -> Optional[Dict[str, Any]]:
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        return next(iter(self.find(filter, projection, **kwargs).limit(1)), None)
+
+    def count_documents(self, filter: Dict[str, Any], skip: int = 0, limit: int = 0, **kwargs: Any) -> int:
+        with self._lock:
+            count = max(len(self._select(filter)) - skip, 0)
+        return min(count, limit) if limit else count
+
+    def estimated_document_count(self, **kwargs: Any) -> int:
+        return len(self._docs)
+
+    def distinct(self, key: str, filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Any]:
+        with self._lock:
+            values = [get_path(doc, key) for doc in self._select(filter)]
+        unique: Dict[Any, Any] = {}
+        for value in values:
+            for item in value if isinstance(value, list) else [value]:
+                if item is not MISSING:
+                    unique.setdefault(freeze(item), item)
+        return list(unique.values())
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], cursor_class: type = MemoryCursor, **kwargs: Any) -> MemoryCursor:
+        def fetch(sort: Optional[List], skip: int, limit: int) -> List[Dict[str, Any]]:
+            if pipeline and "$indexStats" in pipeline[0]:
+                # Usage is not tracked in memory; report every index as unused
+                with self._lock:
+                    docs = [{"name": name, "key": dict(info["key"]), "accesses": {"ops": 0}} for name, info in self._indexes.items()]
+                return run_pipeline(docs, pipeline[1:])
+            with self._lock:
+                docs = [copy.deepcopy(doc) for doc in self._docs.values()]
+            return run_pipeline(docs, pipeline)
+
+        return cursor_class(fetch)
+
+    # Writes
+
+    def insert_one(self, document: Dict[str, Any], **kwargs: Any) -> InsertOneResult:
+        # Like PyMongo, an _id is added to the caller's document
+        document.setdefault("_id", ObjectId())
+        with self._lock:
+            self._store(copy.deepcopy(document))
+        return InsertOneResult(document["_id"], True)
+
+    def insert_many(self, documents: Sequence[Dict[str, Any]], ordered: bool = True, **kwargs: Any) -> InsertManyResult:
+        inserted_ids: List[Any] = []
+        errors: List[Dict[str, Any]] = []
+        with self._lock:
+            for index, document in enumerate(documents):
+                document.setdefault("_id", ObjectId())
+                try:
+                    self._store(copy.deepcopy(document))
+                    inserted_ids.append(document["_id"])
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": 11000, "errmsg": str(e), "op": document})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError(self._bulk_details(errors, n_inserted=len(inserted_ids)))
+        return InsertManyResult(inserted_ids, True)
+
+    def _update(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool, multi: bool, sort: Optional[List] = None) -> Dict[str, Any]:
+        """
+        Shared by the update methods. Returns the raw result plus the documents before and after.
+        """
+        with self._lock:
+            targets = self._select(filter, sort)
+            if not multi:
+                targets = targets[:1]
+            if not targets:
+                if not upsert:
+                    return {"n": 0, "nModified": 0, "before": None, "after": None}
+                doc = upsert_seed(filter)
+                apply_update(doc, update, inserting=True)
+                doc.setdefault("_id", ObjectId())
+                self._store(doc)
+                return {"n": 1, "nModified": 0, "upserted": doc["_id"], "before": None, "after": doc}
+            modified = 0
+            before = after = None
+            for current in targets:
+                updated = copy.deepcopy(current)
+                apply_update(updated, update)
+                if freeze(updated.get("_id")) != freeze(current["_id"]):
+                    raise WriteError("Performing an update on the path '_id' would modify the immutable field '_id'", 66)
+                if updated != current:
+                    self._store(updated, replacing=current)
+                    modified += 1
+                before, after = current, updated
+            return {"n": len(targets), "nModified": modified, "before": before, "after": after}
+
+    @staticmethod
+    def _update_result(raw: Dict[str, Any]) -> UpdateResult:
+        result = {"n": raw["n"], "nModified": raw["nModified"], "ok": 1.0, "updatedExisting": "upserted" not in raw and raw["n"] > 0}
+        if "upserted" in raw:
+            result["upserted"] = raw["upserted"]
+        return UpdateResult(result, True)
+
+    def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False, **kwargs: Any) -> UpdateResult:
+        return self._update_result(self._update(filter, update, upsert, multi=False))
+
+    def update_many(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False, **kwargs: Any) -> UpdateResult:
+        return self._update_result(self._update(filter, update, upsert, multi=True))
+
+    def find_one_and_update(
+        self,
+        filter: Dict[str, Any],
+        update: Dict[str, Any],
+        projection: Any = None,
+        sort: Any = None,
+        upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE,
+        **kwargs: Any,
+    ) -> Optional[Dict[str, Any]]:
+        raw = self._update(filter, update, upsert, multi=False, sort=normalize_sort(sort) if sort else None)
+        doc = raw["after"] if return_document else raw["before"]
+        return project(copy.deepcopy(doc), projection) if doc is not None else None
+
+    def find_one_and_delete(self, filter: Dict[str, Any], projection: Any = None, sort: Any = None, **kwargs: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            targets = self._select(filter, normalize_sort(sort) if sort else None)[:1]
+            if not targets:
+                return None
+            self._remove(targets[0])
+        return project(targets[0], projection)
+
+    def _delete(self, filter: Dict[str, Any], multi: bool) -> int:
+        with self._lock:
+            targets = self._select(filter)
+            if not multi:
+                targets = targets[:1]
+            for doc in targets:
+                self._remove(doc)
+        return len(targets)
+
+    def delete_one(self, filter: Dict[str, Any], **kwargs: Any) -> DeleteResult:
+        return DeleteResult({"n": self._delete(filter, multi=False), "ok": 1.0}, True)
+
+    def delete_many(self, filter: Dict[str, Any], **kwargs: Any) -> DeleteResult:
+        return DeleteResult({"n": self._delete(filter, multi=True), "ok": 1.0}, True)
+
+    def bulk_write(self, requests: Sequence[Any], ordered: bool = True, **kwargs: Any) -> BulkWriteResult:
+        counts = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "nUpserted": 0}
+        upserted: List[Dict[str, Any]] = []
+        errors: List[Dict[str, Any]] = []
+        with self._lock:
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self.insert_one(request._doc)
+                        counts["nInserted"] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany)):
+                        raw = self._update(request._filter, request._doc, bool(request._upsert), multi=isinstance(request, UpdateMany))
+                        if "upserted" in raw:
+                            counts["nUpserted"] += 1
+                            upserted.append({"index": index, "_id": raw["upserted"]})
+                        else:
+                            counts["nMatched"] += raw["n"]
+                            counts["nModified"] += raw["nModified"]
+                    elif isinstance(request, ReplaceOne):
+                        raise ValueError("ReplaceOne is not supported by the in-memory backend")
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        counts["nRemoved"] += self._delete(request._filter, multi=isinstance(request, DeleteMany))
+                    else:
+                        raise TypeError(f"Unsupported bulk write request: {request!r}")
+                except (DuplicateKeyError, WriteError) as e:
+                    errors.append({"index": index, "code": e.code, "errmsg": str(e), "op": request})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({**self._bulk_details(errors, counts["nInserted"]), **counts, "upserted": upserted})
+        return BulkWriteResult({**counts, "upserted": upserted, "writeErrors": [], "writeConcernErrors": []}, True)
+
+    @staticmethod
+    def _bulk_details(errors: List[Dict[str, Any]], n_inserted: int) -> Dict[str, Any]:
+        return {
+            "writeErrors": errors,
+            "writeConcernErrors": [],
+            "nInserted": n_inserted,
+            "nUpserted": 0,
+            "nMatched": 0,
+            "nModified": 0,
+            "nRemoved": 0,
+            "upserted": [],
+        }
+
+    def drop(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._docs.clear()
+            for entries in self._unique.values():
+                entries.clear()
+
+
+class AsyncMemoryCollection:
+    """
+    Motor-style view of a MemoryCollection: operations are coroutines, while `find`
+    and `aggregate` return cursors right away.
+    """
+
+    def __init__(self, collection: MemoryCollection):
+        self._collection = collection
+        self.name = collection.name
+        self.full_name = collection.full_name
+
+    def find(self, *args: Any, **kwargs: Any) -> AsyncMemoryCursor:
+        return self._collection.find(*args, cursor_class=AsyncMemoryCursor, **kwargs)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs: Any) -> AsyncMemoryCursor:
+        return self._collection.aggregate(pipeline, cursor_class=AsyncMemoryCursor, **kwargs)
+
+    async def find_one(self, *args: Any, **kwargs: Any):
+        return self._collection.find_one(*args, **kwargs)
+
+    async def count_documents(self, *args: Any, **kwargs: Any):
+        return self._collection.count_documents(*args, **kwargs)
+
+    async def estimated_document_count(self, **kwargs: Any):
+        return self._collection.estimated_document_count(**kwargs)
+
+    async def distinct(self, *args: Any, **kwargs: Any):
+        return self._collection.distinct(*args, **kwargs)
+
+    async def insert_one(self, *args: Any, **kwargs: Any):
+        return self._collection.insert_one(*args, **kwargs)
+
+    async def insert_many(self, *args: Any, **kwargs: Any):
+        return self._collection.insert_many(*args, **kwargs)
+
+    async def update_one(self, *args: Any, **kwargs: Any):
+        return self._collection.update_one(*args, **kwargs)
+
+    async def update_many(self, *args: Any, **kwargs: Any):
+        return self._collection.update_many(*args, **kwargs)
+
+    async def find_one_and_update(self, *args: Any, **kwargs: Any):
+        return self._collection.find_one_and_update(*args, **kwargs)
+
+    async def find_one_and_delete(self, *args: Any, **kwargs: Any):
+        return self._collection.find_one_and_delete(*args, **kwargs)
+
+    async def delete_one(self, *args: Any, **kwargs: Any):
+        return self._collection.delete_one(*args, **kwargs)
+
+    async def delete_many(self, *args: Any, **kwargs: Any):
+        return self._collection.delete_many(*args, **kwargs)
+
+    async def bulk_write(self, *args: Any, **kwargs: Any):
+        return self._collection.bulk_write(*args, **kwargs)
+
+    async def create_indexes(self, *args: Any, **kwargs: Any):
+        return self._collection.create_indexes(*args, **kwargs)
+
+    async def create_index(self, *args: Any, **kwargs: Any):
+        return self._collection.create_index(*args, **kwargs)
+
+    async def index_information(self):
+        return self._collection.index_information()
+
+    async def drop_index(self, name: str):
+        return self._collection.drop_index(name)
+
+    async def drop(self, **kwargs: Any):
+        return self._collection.drop(**kwargs)
+
+
+class MemoryStorage:
+    """
+    Every database of one embedded instance. Sync and async clients over the same
+    storage see the same data.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._databases: Dict[str, Dict[str, MemoryCollection]] = {}
+
+    def collection(self, database_name: str, name: str) -> MemoryCollection:
+        with self.lock:
+            collections = self._databases.setdefault(database_name, {})
+            if name not in collections:
+                collections[name] = MemoryCollection(database_name, name, self.lock)
+            return collections[name]
+
+    def collection_names(self, database_name: str) -> List[str]:
+        with self.lock:
+            return list(self._databases.get(database_name, {}))
+
+    def drop_collection(self, database_name: str, name: str) -> None:
+        with self.lock:
+            self._databases.get(database_name, {}).pop(name, None)
+
+    def drop_database(self, database_name: str) -> None:
+        with self.lock:
+            self._databases.pop(database_name, None)
+
+
+async def _resolved(value: Any) -> Any:
+    return value
+
+
+class MemoryDatabase:
+    def __init__(self, storage: MemoryStorage, name: str, asynchronous: bool):
+        self._storage = storage
+        self.name = name
+        self.asynchronous = asynchronous
+
+    def _result(self, value: Any) -> Any:
+        return _resolved(value) if self.asynchronous else value
+
+    def __getitem__(self, name: str) -> Union[MemoryCollection, AsyncMemoryCollection]:
+        collection = self._storage.collection(self.name, name)
+        return AsyncMemoryCollection(collection) if self.asynchronous else collection
+
+    def __getattr__(self, name: str) -> Union[MemoryCollection, AsyncMemoryCollection]:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name: str, **kwargs: Any) -> Union[MemoryCollection, AsyncMemoryCollection]:
+        return self[name]
+
+    def command(self, command: Union[str, Dict[str, Any]], *args: Any, **kwargs: Any) -> Any:
+        name = command if isinstance(command, str) else next(iter(command))
+        if name != "ping":
+            raise ValueError(f"Unsupported command for the in-memory backend: {name}")
+        return self._result({"ok": 1.0})
+
+    def list_collection_names(self, **kwargs: Any) -> Any:
+        return self._result(self._storage.collection_names(self.name))
+
+    def drop_collection(self, name: str, **kwargs: Any) -> Any:
+        return self._result(self._storage.drop_collection(self.name, name))
+
+
+class MemoryClient:
+    """
+    Stand-in for `MongoClient` (`asynchronous=False`) or `AsyncIOMotorClient`.
+    """
+
+    def __init__(self, storage: Optional[MemoryStorage] = None, asynchronous: bool = True):
+        self.storage = storage if storage is not None else MemoryStorage()
+        self.asynchronous = asynchronous
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        return MemoryDatabase(self.storage, name, self.asynchronous)
+
+    def get_database(self, name: str, **kwargs: Any) -> MemoryDatabase:
+        return self[name]
+
+    def drop_database(self, name_or_database: Union[str, MemoryDatabase]) -> Any:
+        name = name_or_database if isinstance(name_or_database, str) else name_or_database.name
+        self.storage.drop_database(name)
+        return _resolved(None) if self.asynchronous else None
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,386 @@
+"""
+Query, update, projection, sort and aggregation semantics for the in-memory backend.
+Follows MongoDB for the subset the app uses, including type brackets: a range
+operator only matches values of the same BSON type class, so `{"price": {"$gt": 1}}`
+never matches a string.
+"""
+import copy
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from bson import ObjectId
+
+MISSING = object()
+
+SortSpec = List[Tuple[str, int]]
+
+def type_rank(value: Any) -> int:
+    # Ordering of BSON type classes used by MongoDB when comparing and sorting
+    if value is None or value is MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, (list, tuple)):
+        return 5
+    if isinstance(value, bytes):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+def sort_key(value: Any) -> Tuple:
+    rank = type_rank(value)
+    if rank == 1:
+        return (1,)
+    if rank == 4:
+        return (4, tuple((key, sort_key(item)) for key, item in value.items()))
+    if rank == 5:
+        return (5, tuple(sort_key(item) for item in value))
+    if rank == 10:
+        return (10, repr(value))
+    return (rank, value)
+
+def freeze(value: Any) -> Any:
+    """
+    Hashable stand-in for a value, so dicts and lists can key indexes and groups.
+    """
+    if isinstance(value, dict):
+        return ("__dict__", tuple((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return ("__list__", tuple(freeze(item) for item in value))
+    return (type_rank(value), value)
+
+def lookup(value: Any, path: Union[str, Sequence[str]]) -> List[Any]:
+    """
+    Every value a dotted path reaches. Arrays fan out: `items.sku` reaches the `sku`
+    of each element of `items`. Returns `[MISSING]` when nothing is reached.
+    """
+    parts = path.split(".") if isinstance(path, str) else list(path)
+    if not parts:
+        return [value]
+    head, rest = parts[0], parts[1:]
+    if isinstance(value, dict):
+        return lookup(value[head], rest) if head in value else [MISSING]
+    if isinstance(value, list):
+        if head.isdigit():
+            index = int(head)
+            return lookup(value[index], rest) if index < len(value) else [MISSING]
+        found = [v for item in value if isinstance(item, (dict, list)) for v in lookup(item, parts) if v is not MISSING]
+        return found or [MISSING]
+    return [MISSING]
+
+def get_path(doc: Dict[str, Any], path: str, default: Any = MISSING) -> Any:
+    current: Any = doc
+    for part in path.split("."):
+        if isinstance(current, dict) and part in current:
+            current = current[part]
+        elif isinstance(current, list) and part.isdigit() and int(part) < len(current):
+            current = current[int(part)]
+        else:
+            return default
+    return current
+
+def set_path(doc: Dict[str, Any], path: str, value: Any) -> None:
+    parts = path.split(".")
+    current: Any = doc
+    for part in parts[:-1]:
+        if isinstance(current, list) and part.isdigit():
+            current = current[int(part)]
+            continue
+        if part not in current or not isinstance(current[part], (dict, list)):
+            current[part] = {}
+        current = current[part]
+    if isinstance(current, list) and parts[-1].isdigit():
+        current[int(parts[-1])] = value
+    else:
+        current[parts[-1]] = value
+
+def unset_path(doc: Dict[str, Any], path: str) -> None:
+    parts = path.split(".")
+    parent = get_path(doc, ".".join(parts[:-1])) if len(parts) > 1 else doc
+    if isinstance(parent, dict):
+        parent.pop(parts[-1], None)
+
+def _expand(values: Iterable[Any]) -> Iterable[Any]:
+    # A condition on an array field matches the array itself or any of its elements
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+def _equal(a: Any, b: Any) -> bool:
+    return type_rank(a) == type_rank(b) and a == b
+
+def _equals_any(values: List[Any], target: Any) -> bool:
+    if target is None:
+        return any(value is MISSING or value is None for value in _expand(values))
+    return any(value is not MISSING and _equal(value, target) for value in _expand(values))
+
+def _compare(values: List[Any], target: Any, accept: Callable[[Tuple, Tuple], bool]) -> bool:
+    rank = type_rank(target)
+    return any(
+        value is not MISSING and type_rank(value) == rank and accept(sort_key(value), sort_key(target))
+        for value in _expand(values)
+    )
+
+def _is_operator_dict(condition: Any) -> bool:
+    return isinstance(condition, dict) and bool(condition) and all(key.startswith("$") for key in condition)
+
+def _apply_operators(values: List[Any], condition: Dict[str, Any]) -> bool:
+    for op, arg in condition.items():
+        if op == "$eq":
+            ok = _equals_any(values, arg)
+        elif op == "$ne":
+            ok = not _equals_any(values, arg)
+        elif op == "$gt":
+            ok = _compare(values, arg, lambda a, b: a > b)
+        elif op == "$gte":
+            ok = _compare(values, arg, lambda a, b: a >= b)
+        elif op == "$lt":
+            ok = _compare(values, arg, lambda a, b: a < b)
+        elif op == "$lte":
+            ok = _compare(values, arg, lambda a, b: a <= b)
+        elif op == "$in":
+            ok = any(_equals_any(values, item) for item in arg)
+        elif op == "$nin":
+            ok = not any(_equals_any(values, item) for item in arg)
+        elif op == "$exists":
+            ok = any(value is not MISSING for value in values) == bool(arg)
+        elif op == "$not":
+            ok = not _apply_operators(values, arg)
+        elif op == "$size":
+            ok = any(isinstance(value, list) and len(value) == arg for value in values)
+        elif op == "$elemMatch":
+            ok = any(
+                isinstance(value, list) and any(_element_matches(item, arg) for item in value)
+                for value in values
+            )
+        else:
+            raise ValueError(f"Unsupported query operator: {op}")
+        if not ok:
+            return False
+    return True
+
+def _element_matches(item: Any, condition: Any) -> bool:
+    if _is_operator_dict(condition):
+        return _apply_operators([item], condition)
+    if isinstance(condition, dict):
+        return isinstance(item, dict) and matches(item, condition)
+    return _equal(item, condition)
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """
+    Whether `doc` satisfies a MongoDB filter.
+    """
+    for key, condition in (query or {}).items():
+        if key == "$and":
+            ok = all(matches(doc, part) for part in condition)
+        elif key == "$or":
+            ok = any(matches(doc, part) for part in condition)
+        elif key == "$nor":
+            ok = not any(matches(doc, part) for part in condition)
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported query operator: {key}")
+        elif _is_operator_dict(condition):
+            ok = _apply_operators(lookup(doc, key), condition)
+        else:
+            ok = _equals_any(lookup(doc, key), condition)
+        if not ok:
+            return False
+    return True
+
+def upsert_seed(query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The document an upsert starts from: the equality conditions of its filter.
+    """
+    doc: Dict[str, Any] = {}
+    for key, condition in query.items():
+        if key == "$and":
+            for part in condition:
+                for path, value in upsert_seed(part).items():
+                    set_path(doc, path, value)
+        elif key.startswith("$"):
+            continue
+        elif _is_operator_dict(condition):
+            if "$eq" in condition:
+                set_path(doc, key, copy.deepcopy(condition["$eq"]))
+        else:
+            set_path(doc, key, copy.deepcopy(condition))
+    return doc
+
+def apply_update(doc: Dict[str, Any], update: Dict[str, Any], inserting: bool = False) -> None:
+    """
+    Apply update operators to `doc` in place. `$setOnInsert` only applies when `inserting`.
+    """
+    if not _is_operator_dict(update):
+        raise ValueError("Update documents must only contain update operators")
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            if op in ("$set", "$setOnInsert"):
+                set_path(doc, path, copy.deepcopy(value))
+            elif op == "$unset":
+                unset_path(doc, path)
+            elif op == "$inc":
+                current = get_path(doc, path, 0)
+                if type_rank(current) != 2 or type_rank(value) != 2:
+                    raise ValueError(f"Cannot apply $inc to non-numeric field {path}")
+                set_path(doc, path, current + value)
+            elif op in ("$min", "$max"):
+                current = get_path(doc, path)
+                if current is MISSING or (sort_key(value) < sort_key(current) if op == "$min" else sort_key(value) > sort_key(current)):
+                    set_path(doc, path, copy.deepcopy(value))
+            elif op in ("$push", "$addToSet"):
+                current = get_path(doc, path)
+                if current is MISSING:
+                    current = []
+                    set_path(doc, path, current)
+                if not isinstance(current, list):
+                    raise ValueError(f"Cannot apply {op} to non-array field {path}")
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                for item in items:
+                    if op == "$push" or not any(_equal(existing, item) for existing in current):
+                        current.append(copy.deepcopy(item))
+            elif op == "$pull":
+                current = get_path(doc, path)
+                if isinstance(current, list):
+                    current[:] = [item for item in current if not _element_matches(item, value)]
+            else:
+                raise ValueError(f"Unsupported update operator: {op}")
+
+def project(doc: Dict[str, Any], projection: Optional[Union[Dict[str, Any], Sequence[str]]]) -> Dict[str, Any]:
+    if not projection:
+        return doc
+    if not isinstance(projection, dict):
+        projection = {field: 1 for field in projection}
+    included = [field for field, flag in projection.items() if flag and field != "_id"]
+    if included:
+        result: Dict[str, Any] = {}
+        if projection.get("_id", 1) and "_id" in doc:
+            result["_id"] = doc["_id"]
+        for field in included:
+            value = get_path(doc, field)
+            if value is not MISSING:
+                set_path(result, field, value)
+        return result
+    result = dict(doc)
+    for field, flag in projection.items():
+        if not flag:
+            unset_path(result, field)
+    return result
+
+def normalize_sort(key_or_list: Any, direction: Optional[int] = None) -> SortSpec:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [(field, order) for field, order in key_or_list]
+
+def sort_documents(docs: List[Dict[str, Any]], spec: SortSpec) -> List[Dict[str, Any]]:
+    def value_key(doc: Dict[str, Any], field: str, descending: bool) -> Tuple:
+        value = get_path(doc, field)
+        if isinstance(value, list) and value:
+            # Arrays sort by their smallest element ascending and their largest descending
+            return (max if descending else min)(sort_key(item) for item in value)
+        return sort_key(None if value is MISSING else value)
+
+    # Stable sorts applied from the last key to the first give a multi-key order
+    for field, direction in reversed(spec):
+        docs.sort(key=lambda doc: value_key(doc, field, direction < 0), reverse=direction < 0)
+    return docs
+
+def evaluate(doc: Dict[str, Any], expression: Any) -> Any:
+    """
+    Aggregation expressions: `"$path"` field references, objects of expressions and literals.
+    """
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = get_path(doc, expression[1:])
+        return None if value is MISSING else value
+    if isinstance(expression, dict):
+        return {key: evaluate(doc, item) for key, item in expression.items()}
+    return expression
+
+def _accumulate(op: str, values: List[Any]) -> Any:
+    present = [value for value in values if value is not None]
+    if op == "$sum":
+        return sum(value for value in present if type_rank(value) == 2)
+    if op == "$avg":
+        numbers = [value for value in present if type_rank(value) == 2]
+        return sum(numbers) / len(numbers) if numbers else None
+    if op == "$min":
+        return min(present, key=sort_key) if present else None
+    if op == "$max":
+        return max(present, key=sort_key) if present else None
+    if op == "$first":
+        return values[0] if values else None
+    if op == "$last":
+        return values[-1] if values else None
+    if op == "$push":
+        return list(values)
+    if op == "$addToSet":
+        unique: Dict[Any, Any] = {}
+        for value in values:
+            unique.setdefault(freeze(value), value)
+        return list(unique.values())
+    raise ValueError(f"Unsupported accumulator: {op}")
+
+def _group(docs: List[Dict[str, Any]], spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    groups: Dict[Any, Tuple[Any, List[Dict[str, Any]]]] = {}
+    for doc in docs:
+        group_id = evaluate(doc, spec["_id"])
+        groups.setdefault(freeze(group_id), (group_id, []))[1].append(doc)
+    results = []
+    for group_id, members in groups.values():
+        result = {"_id": group_id}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            [(op, expression)] = accumulator.items()
+            result[field] = _accumulate(op, [evaluate(doc, expression) for doc in members])
+        results.append(result)
+    return results
+
+def run_pipeline(docs: List[Dict[str, Any]], pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Run the aggregation stages the app uses: $match, $sort, $skip, $limit, $project,
+    $unwind, $group and $count.
+    """
+    for stage in pipeline:
+        [(name, arg)] = stage.items()
+        if name == "$match":
+            docs = [doc for doc in docs if matches(doc, arg)]
+        elif name == "$sort":
+            docs = sort_documents(docs, normalize_sort(arg))
+        elif name == "$skip":
+            docs = docs[arg:]
+        elif name == "$limit":
+            docs = docs[:arg]
+        elif name == "$project":
+            fields = {key: value for key, value in arg.items() if not (isinstance(value, str) and value.startswith("$"))}
+            computed = {key: value for key, value in arg.items() if key not in fields}
+            docs = [{**project(doc, fields or {"_id": 1}), **{key: evaluate(doc, value) for key, value in computed.items()}} for doc in docs]
+        elif name == "$unwind":
+            path = (arg["path"] if isinstance(arg, dict) else arg)[1:]
+            unwound = []
+            for doc in docs:
+                values = get_path(doc, path)
+                for value in values if isinstance(values, list) else []:
+                    item = copy.deepcopy(doc)
+                    set_path(item, path, value)
+                    unwound.append(item)
+            docs = unwound
+        elif name == "$group":
+            docs = _group(docs, arg)
+        elif name == "$count":
+            docs = [{arg: len(docs)}]
+        else:
+            raise ValueError(f"Unsupported aggregation stage: {name}")
+    return docs
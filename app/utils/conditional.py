@@ -0,0 +1,73 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Iterable, Optional, Tuple
+
+def version_etag(version: Optional[int]) -> str:
+    """
+    Weak ETag of one product: its version changes with every write. Weak, because
+    the same version can be sent trimmed to `fields` or re-encoded by the fast path.
+    """
+    return f'W/"{version or 0}"'
+
+def page_etag(pairs: Iterable[Tuple[Any, Optional[int]]]) -> str:
+    """
+    Weak ETag of a listing page, over the `(id, version)` pairs of its products in order.
+    """
+    digest = hashlib.sha1()
+    for product_id, version in pairs:
+        digest.update(f"{product_id}:{version or 0};".encode())
+    return f'W/"{digest.hexdigest()[:20]}"'
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an `If-None-Match` or `If-Match` header against an ETag.
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+def etag_version(header: Optional[str]) -> Optional[int]:
+    """
+    Product version named by an `If-Match` header holding a single product ETag, else None.
+    """
+    if not header:
+        return None
+    value = header.strip()
+    value = value[2:] if value.startswith("W/") else value
+    if len(value) < 3 or value[0] != '"' or value[-1] != '"' or not value[1:-1].isdigit():
+        return None
+    return int(value[1:-1])
+
+def http_date(value: datetime) -> str:
+    """
+    Format a stored (naive UTC) datetime for `Last-Modified`.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+def modified_since(header: Optional[str], last_modified: Optional[datetime]) -> bool:
+    """
+    Whether a resource last modified at `last_modified` changed after an
+    `If-Modified-Since` date. HTTP dates have whole seconds, so sub-second
+    differences count as unchanged. Unknown or unparsable values count as modified.
+    """
+    if not header or last_modified is None:
+        return True
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return True
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) > since
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BatchFunction = Callable[[List[Any]], Awaitable[Dict[Hashable, Any]]]
+
+
+class DataLoader:
+    """
+    Coalesces concurrent lookups by key.
+    Keys requested in the same event loop tick are fetched together with one
+    `batch_fn(keys)` call. A key that is already queued or in flight joins that
+    lookup and does not start another one. `batch_fn` returns a dict of the keys
+    it found; a missing key resolves to None.
+    Results are shared between the callers of one lookup, so callers that mutate
+    them must copy first. Nothing is kept once a lookup completes; caching stays
+    with the callers.
+    """
+
+    def __init__(self, batch_fn: BatchFunction, max_batch_size: int = 1000):
+        if max_batch_size <= 0:
+            raise ValueError("max_batch_size must be positive")
+        self._batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self._queued: Dict[Hashable, asyncio.Future] = {}
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._dispatch_scheduled = False
+        self._tasks: set = set()
+        self.loads = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.keys_fetched = 0
+
+    async def load(self, key: Hashable) -> Optional[Any]:
+        loop = asyncio.get_running_loop()
+        self.loads += 1
+        future = self._queued.get(key) or self._in_flight.get(key)
+        if future is not None and future.get_loop() is loop:
+            self.coalesced += 1
+        else:
+            future = loop.create_future()
+            self._queued[key] = future
+            if not self._dispatch_scheduled:
+                self._dispatch_scheduled = True
+                loop.call_soon(self._dispatch)
+        # Shield the shared future so one cancelled caller does not cancel the others
+        return await asyncio.shield(future)
+
+    def clear(self, key: Hashable) -> None:
+        """
+        Stop new loads from joining a lookup of `key` that is already in flight.
+        Call this after writing `key` so later reads do not get the value from before the write.
+        A queued lookup has not reached the database yet and can still be joined.
+        """
+        self._in_flight.pop(key, None)
+
+    def _dispatch(self) -> None:
+        self._dispatch_scheduled = False
+        queued, self._queued = self._queued, {}
+        keys = list(queued)
+        for start in range(0, len(keys), self.max_batch_size):
+            batch = {key: queued[key] for key in keys[start:start + self.max_batch_size]}
+            self._in_flight.update(batch)
+            task = asyncio.ensure_future(self._run(batch))
+            # The loop only keeps weak references to tasks
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[Hashable, asyncio.Future]) -> None:
+        self.batches += 1
+        self.keys_fetched += len(batch)
+        try:
+            results = await self._batch_fn(list(batch))
+        except Exception as e:
+            logger.error(f"Batch lookup of {len(batch)} keys failed: {e}")
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+                    # Mark it retrieved; callers that were cancelled will never await it
+                    future.add_done_callback(lambda f: f.exception())
+        else:
+            for key, future in batch.items():
+                if not future.done():
+                    future.set_result(results.get(key))
+        finally:
+            for key, future in batch.items():
+                if self._in_flight.get(key) is future:
+                    del self._in_flight[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "keys_fetched": self.keys_fetched,
+            "in_flight": len(self._in_flight),
+        }
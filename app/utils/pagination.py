@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+def encode_cursor(last_id: Any, sort_field: Optional[str] = None, sort_value: Any = None) -> str:
+    """
+    Build an opaque keyset cursor pointing just after the given document.
+    """
+    payload: Dict[str, Any] = {"id": str(last_id)}
+    if sort_field and sort_field != "_id":
+        payload["s"] = sort_field
+        payload["v"] = {"$date": sort_value.isoformat()} if isinstance(sort_value, datetime) else sort_value
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Dict[str, Any]:
+    """
+    Decode a cursor produced by `encode_cursor`. Raises ValueError on malformed tokens.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        payload["id"] = ObjectId(payload["id"])
+        if isinstance(payload.get("v"), dict):
+            payload["v"] = datetime.fromisoformat(payload["v"]["$date"])
+    except (ValueError, TypeError, KeyError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    return payload
+
+
+def keyset_filter(cursor: Dict[str, Any], sort_field: str = "_id", descending: bool = False) -> Dict[str, Any]:
+    """
+    Translate a decoded cursor into a Mongo filter selecting the documents after it
+    in `(sort_field, _id)` order. Served by an index ending in `_id`.
+    """
+    op = "$lt" if descending else "$gt"
+    if cursor.get("s", "_id") != sort_field:
+        raise ValueError("Cursor does not match the requested sort order")
+    if sort_field == "_id":
+        return {"_id": {op: cursor["id"]}}
+    return {
+        "$or": [
+            {sort_field: {op: cursor["v"]}},
+            {sort_field: cursor["v"], "_id": {op: cursor["id"]}},
+        ]
+    }
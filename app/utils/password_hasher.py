@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from app.core.config import PASSWORD_HASH_WORKERS
+from app.utils.security import hash_password, verify_password
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification on a bounded thread pool so the slow KDF
+    never blocks the event loop. hashlib's PBKDF2 releases the GIL, so threads run in
+    parallel; `max_workers` caps how many hashes run at once and the rest queue up.
+    Tracks how long calls wait in that queue before a worker picks them up.
+    """
+
+    def __init__(self, max_workers: int = PASSWORD_HASH_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.calls = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(verify_password, password, hashed)
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        submitted = time.perf_counter()
+        with self._lock:
+            self.pending += 1
+
+        def timed():
+            waited = time.perf_counter() - submitted
+            with self._lock:
+                self.pending -= 1
+                self.calls += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            return fn(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "pending": self.pending,
+                "calls": self.calls,
+                "avg_queue_wait_seconds": self.total_wait / self.calls if self.calls else 0.0,
+                "max_queue_wait_seconds": self.max_wait,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+password_hasher = PasswordHasher()
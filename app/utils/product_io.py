@@ -0,0 +1,136 @@
+import codecs
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+# Columns accepted on import, in the order used for CSV files
+PRODUCT_FIELDS: List[str] = ["name", "description", "price", "in_stock", "category"]
+
+# Columns written on export
+EXPORT_FIELDS: List[str] = ["id"] + PRODUCT_FIELDS
+
+# Flush export output once this many bytes are buffered
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+ParsedRow = Tuple[int, Union[Dict[str, Any], Exception]]
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], encoding: str = "utf-8") -> AsyncIterator[str]:
+    """
+    Split a stream of byte chunks into text lines without buffering the whole body.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def parse_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[ParsedRow]:
+    """
+    Yield (row number, document or parse error) for each non-empty NDJSON line.
+    """
+    row = 0
+    async for line in iter_lines(chunks):
+        row += 1
+        if not line.strip():
+            continue
+        try:
+            doc = json.loads(line)
+            if not isinstance(doc, dict):
+                raise ValueError("Row is not a JSON object")
+            yield row, doc
+        except ValueError as e:
+            yield row, e
+
+
+def read_csv_record(text: str) -> Optional[List[str]]:
+    """
+    Parse one CSV record, or return None if it ends inside a quoted field and
+    needs the next line. Quotes inside unquoted fields are kept as text.
+    """
+    try:
+        return next(csv.reader([text], strict=True), [])
+    except csv.Error as e:
+        if "unexpected end of data" in str(e):
+            return None
+    # Malformed quoting that is not an open field; parse it leniently like before
+    return next(csv.reader([text]), [])
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[ParsedRow]:
+    """
+    Yield (row number, document or parse error) for each CSV record after the header.
+    Empty cells are dropped so optional fields fall back to their defaults.
+    A UTF-8 byte order mark before the header is ignored.
+    """
+    header: List[str] = []
+    pending = ""
+    row = 0
+    async for line in iter_lines(chunks, encoding="utf-8-sig"):
+        # A quoted field may span several physical lines; wait until the csv module can close it
+        pending = f"{pending}\n{line}" if pending else line
+        values = read_csv_record(pending)
+        if values is None:
+            continue
+        record, pending = pending, ""
+        if not header:
+            header = [name.strip() for name in values]
+            continue
+        row += 1
+        if not record.strip():
+            continue
+        if len(values) > len(header):
+            yield row, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            continue
+        yield row, {name: value for name, value in zip(header, values) if value != ""}
+    if pending:
+        yield row + 1, ValueError("Unterminated quoted field")
+
+
+def export_record(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map a raw product document onto the export columns.
+    """
+    record = {field: doc.get(field) for field in PRODUCT_FIELDS}
+    return {"id": str(doc["_id"]), **record}
+
+
+async def encode_ndjson(docs: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Encode product documents as NDJSON, yielding output in chunks of about EXPORT_CHUNK_SIZE.
+    """
+    buffer: List[str] = []
+    size = 0
+    async for doc in docs:
+        line = json.dumps(export_record(doc), default=str) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+async def encode_csv(docs: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    Encode product documents as CSV with a header row, yielding output in chunks of about EXPORT_CHUNK_SIZE.
+    """
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS, lineterminator="\n")
+    writer.writeheader()
+    async for doc in docs:
+        writer.writerow(export_record(doc))
+        if out.tell() >= EXPORT_CHUNK_SIZE:
+            yield out.getvalue().encode("utf-8")
+            out.seek(0)
+            out.truncate()
+    if out.tell():
+        yield out.getvalue().encode("utf-8")
@@ -0,0 +1,146 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Optional
+from pymongo import ASCENDING, IndexModel, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from app.core.config import (
+    RATE_LIMIT_BACKEND,
+    OTP_RATE_LIMIT,
+    OTP_RATE_LIMIT_WINDOW_SECONDS,
+    RATE_LIMIT_MAX_KEYS,
+)
+from app.core.indexes import declare_indexes
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITS_COLLECTION = "rate_limits"
+
+declare_indexes(
+    RATE_LIMITS_COLLECTION,
+    # Window counters remove themselves once their window has closed
+    IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+)
+
+
+class InMemoryRateLimitBackend:
+    """
+    Token bucket per key: `limit` tokens, refilled continuously over `window_seconds`.
+    Each check is O(1). Buckets are kept in least-recently-used order, so idle ones,
+    which would be full again anyway, are dropped from the front. At most `max_keys`
+    buckets are kept.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        window_seconds: float,
+        max_keys: int = RATE_LIMIT_MAX_KEYS,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self.rate = limit / window_seconds
+        self.max_keys = max_keys
+        self._timer = timer
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def hit(self, key: str) -> bool:
+        now = self._timer()
+        with self._lock:
+            self._expire(now)
+            tokens, updated = self._buckets.pop(key, (float(self.limit), now))
+            tokens = min(float(self.limit), tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def _expire(self, now: float) -> None:
+        while self._buckets:
+            _, (_, updated) = next(iter(self._buckets.items()))
+            if now - updated < self.window_seconds:
+                break
+            self._buckets.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class MongoRateLimitBackend:
+    """
+    Fixed-window counters shared by every worker. Each check is one atomic upsert
+    with `$inc` on the document for the key's current window; a TTL index removes
+    the document once the window has closed.
+    """
+
+    def __init__(self, limit: int, window_seconds: float, collection=None):
+        self.limit = limit
+        self.window_seconds = window_seconds
+        self._collection = collection
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            # Resolved on first use: limiters are built before the app connects to Mongo
+            from app.core.db import get_mongo_db
+            self._collection = get_mongo_db()[RATE_LIMITS_COLLECTION]
+        return self._collection
+
+    async def hit(self, key: str) -> bool:
+        # Epoch seconds straight from the clock: a naive utcnow().timestamp() is read as
+        # local time and would shift the windows by the host's UTC offset
+        now = time.time()
+        window_start = math.floor(now / self.window_seconds) * self.window_seconds
+        window_end = datetime.utcfromtimestamp(window_start + self.window_seconds)
+        try:
+            counter = await self._increment(f"{key}:{int(window_start)}", key, window_end)
+        except PyMongoError as e:
+            # Fail open: a rate limiter outage should not lock users out
+            logger.error(f"Rate limit check failed for {key}: {e}")
+            return True
+        return counter["count"] <= self.limit
+
+    async def _increment(self, counter_id: str, key: str, expires_at: datetime) -> dict:
+        update = {"$inc": {"count": 1}, "$setOnInsert": {"key": key, "expires_at": expires_at}}
+        try:
+            return await self.collection.find_one_and_update(
+                {"_id": counter_id}, update, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # Two first hits raced to create the window document; the loser just increments it
+            return await self.collection.find_one_and_update(
+                {"_id": counter_id}, update, return_document=ReturnDocument.AFTER
+            )
+
+
+def create_backend(
+    backend: str = RATE_LIMIT_BACKEND,
+    limit: int = OTP_RATE_LIMIT,
+    window_seconds: float = OTP_RATE_LIMIT_WINDOW_SECONDS,
+):
+    if backend == "mongo":
+        return MongoRateLimitBackend(limit, window_seconds)
+    if backend == "memory":
+        return InMemoryRateLimitBackend(limit, window_seconds)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+class RateLimiter:
+    """
+    Allows at most `limit` actions per key per `window_seconds` (defaults: the OTP limit).
+    The backend is picked by RATE_LIMIT_BACKEND unless one is given.
+    """
+
+    def __init__(self, backend: Optional[object] = None):
+        self.backend = backend if backend is not None else create_backend()
+
+    async def allow(self, key: str) -> bool:
+        return await self.backend.hit(key)
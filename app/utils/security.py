@@ -1,6 +1,13 @@
+import base64
 import hashlib
 import hmac
-from typing import Any
+import json
+import os
+import time
+from typing import Any, Dict, Optional
+from app.core.config import ACCESS_TOKEN_EXPIRE_MINUTES, ACCESS_TOKEN_SECRET_KEY, PASSWORD_HASH_ITERATIONS
+
+PASSWORD_HASH_SCHEME = "pbkdf2_sha256"
 
 
 def hash_value(value: str, salt: str = "") -> str:
@@ -27,3 +34,71 @@ def secure_compare(val1: Any, val2: Any) -> bool:
     if isinstance(val2, str):
         val2 = val2.encode("utf-8")
     return hmac.compare_digest(val1, val2)
+
+
+def hash_password(password: str, iterations: int = PASSWORD_HASH_ITERATIONS) -> str:
+    """
+    Hash a password with PBKDF2-SHA256 and a random salt.
+    Deliberately slow; call through `password_hasher` from async code.
+    """
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return "$".join([
+        PASSWORD_HASH_SCHEME,
+        str(iterations),
+        base64.b64encode(salt).decode("ascii"),
+        base64.b64encode(digest).decode("ascii"),
+    ])
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    """
+    Verify a password against a hash from `hash_password`, or a legacy unsalted SHA-256 hash.
+    """
+    parts = hashed.split("$")
+    if len(parts) != 4 or parts[0] != PASSWORD_HASH_SCHEME:
+        return secure_compare(hash_value(password), hashed)
+    iterations, salt, expected = int(parts[1]), base64.b64decode(parts[2]), base64.b64decode(parts[3])
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return secure_compare(digest, expected)
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(message: str) -> str:
+    return _b64url(hmac.new(ACCESS_TOKEN_SECRET_KEY.encode("utf-8"), message.encode("ascii"), hashlib.sha256).digest())
+
+
+def create_access_token(claims: Dict[str, Any], expires_minutes: int = ACCESS_TOKEN_EXPIRE_MINUTES) -> str:
+    """
+    Issue an HS256 JWT holding `claims` and an `exp` of `expires_minutes` from now.
+    """
+    header = _b64url(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode("utf-8"))
+    payload = {**claims, "exp": int(time.time()) + expires_minutes * 60}
+    body = _b64url(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    return f"{header}.{body}.{_sign(f'{header}.{body}')}"
+
+
+def decode_access_token(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Claims of a token from `create_access_token`, or None if it is malformed,
+    not signed with our key, or expired.
+    """
+    try:
+        header, body, signature = token.split(".")
+        if not secure_compare(_sign(f"{header}.{body}"), signature):
+            return None
+        if json.loads(_b64url_decode(header)).get("alg") != "HS256":
+            return None
+        payload = json.loads(_b64url_decode(body))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, dict) or payload.get("exp", 0) <= time.time():
+        return None
+    return payload
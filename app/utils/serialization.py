@@ -0,0 +1,36 @@
+import json
+from datetime import date, datetime
+from typing import Any
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library encoder
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Encode content to JSON bytes. Datetimes become ISO 8601 strings; other types JSON
+    does not know, such as ObjectId, are encoded with str().
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response that encodes stored documents directly, without jsonable_encoder
+    or a response_model pass. Uses orjson when it is installed.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,16 +1,16 @@
 import re
 from typing import Dict, Any
-from pydantic import EmailStr, ValidationError
+from email_validator import EmailNotValidError, validate_email as validate_email_address
 
 
 def validate_email(email: str) -> bool:
     """
-    Validate email using Pydantic's EmailStr.
+    Validate email with email-validator, the library behind Pydantic's EmailStr.
     """
     try:
-        EmailStr.validate(email)
+        validate_email_address(email, check_deliverability=False)
         return True
-    except ValidationError:
+    except EmailNotValidError:
         return False
 
 
@@ -35,3 +35,10 @@ def validate_profile_fields(fields: Dict[str, Any]) -> Dict[str, Any]:
         if key == "phone" and not validate_phone(fields[key]):
             return {"valid": False, "error": "Invalid phone number format."}
     return {"valid": True}
+
+
+def validate_user_update(user_update: Any) -> Dict[str, Any]:
+    """
+    Validate the fields set on a profile update model.
+    """
+    return validate_profile_fields(user_update.dict(exclude_unset=True))
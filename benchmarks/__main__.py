@@ -0,0 +1,108 @@
+"""
+Benchmark the product and auth flows against the real FastAPI app, in-process.
+
+    python -m benchmarks run --iterations 500 --concurrency 16 --output before.json
+    python -m benchmarks compare before.json after.json
+
+`run` drops and re-seeds a dedicated database (`--db-name`, default `grocery_benchmark`)
+on the mongod at MONGO_URI, so results from different commits start from the same data.
+`--backend memory` uses the embedded storage backend instead, with no mongod needed.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import uuid
+from typing import Any, Dict, List
+from benchmarks.harness import compare, format_comparison, format_results, run_metadata, run_operation
+from benchmarks.scenarios import SCENARIOS, BenchContext, seed_products, seed_user
+
+logger = logging.getLogger("benchmarks")
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    # Settings are read when the app is imported, so point it at the benchmark database first
+    os.environ["MONGO_DB_NAME"] = args.db_name
+    os.environ["STORAGE_BACKEND"] = args.backend
+    import httpx
+    from app.core.db import connection_manager
+    from app.main import app, startup_event, shutdown_event
+
+    # Keep per-request app logging out of the measurements unless asked for
+    logging.getLogger().setLevel(args.log_level)
+    logger.setLevel(logging.INFO)
+    await connection_manager.async_client.drop_database(args.db_name)
+    await startup_event()
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            ctx = BenchContext(client, run_id=uuid.uuid4().hex[:8], seed=args.seed)
+            logger.info(f"Seeding {args.products} products")
+            await seed_products(ctx, args.products)
+            await seed_user(ctx)
+            for name in args.scenario or list(SCENARIOS):
+                scenario = SCENARIOS[name]
+                if scenario.setup is not None:
+                    await scenario.setup(ctx, args.warmup + args.iterations)
+                logger.info(f"Running {name}")
+                results[name] = await run_operation(
+                    lambda i, scenario=scenario: scenario.op(ctx, i), args.iterations, args.concurrency, args.warmup
+                )
+    finally:
+        await shutdown_event()
+    config = {
+        "backend": args.backend,
+        "iterations": args.iterations,
+        "concurrency": args.concurrency,
+        "warmup": args.warmup,
+        "products": args.products,
+        "seed": args.seed,
+    }
+    return {**run_metadata(config), "results": results}
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the scenarios and report ops/sec and latency percentiles")
+    run_parser.add_argument("--backend", choices=["mongo", "memory"], default="mongo", help="memory runs without a mongod")
+    run_parser.add_argument("--db-name", default="grocery_benchmark", help="Database to drop and seed; never the application database")
+    run_parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Run only these scenarios (repeatable)")
+    run_parser.add_argument("--iterations", type=int, default=200)
+    run_parser.add_argument("--concurrency", type=int, default=10)
+    run_parser.add_argument("--warmup", type=int, default=20)
+    run_parser.add_argument("--products", type=int, default=500, help="Products seeded before the run")
+    run_parser.add_argument("--seed", type=int, default=0, help="Random seed for generated data and lookups")
+    run_parser.add_argument("--output", help="Write the results as JSON to this file")
+    run_parser.add_argument("--compare", help="Results file of an earlier run to compare against")
+    run_parser.add_argument("--log-level", default="WARNING")
+
+    compare_parser = commands.add_parser("compare", help="Compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    if args.command == "compare":
+        print(format_comparison(compare(load(args.baseline), load(args.current))))
+        return 0
+
+    report = asyncio.run(run(args))
+    print(format_results(report["results"]))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        print()
+        print(format_comparison(compare(load(args.compare), report)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
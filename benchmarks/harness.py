@@ -0,0 +1,137 @@
+import asyncio
+import itertools
+import logging
+import math
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+Operation = Callable[[int], Awaitable[Any]]
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted sequence; 0.0 when it is empty.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct * len(sorted_values) / 100) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def summarize(latencies: List[float], errors: int, elapsed: float, concurrency: int) -> Dict[str, Any]:
+    """
+    Throughput and latency percentiles (milliseconds) of one scenario run.
+    Failed operations count as errors and are left out of the latencies.
+    """
+    ordered = sorted(latencies)
+    to_ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        "operations": len(ordered),
+        "errors": errors,
+        "concurrency": concurrency,
+        "elapsed_seconds": round(elapsed, 3),
+        "ops_per_sec": round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+        "mean_ms": to_ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "p50_ms": to_ms(percentile(ordered, 50)),
+        "p95_ms": to_ms(percentile(ordered, 95)),
+        "p99_ms": to_ms(percentile(ordered, 99)),
+        "max_ms": to_ms(ordered[-1]) if ordered else 0.0,
+    }
+
+async def run_operation(op: Operation, iterations: int, concurrency: int, warmup: int = 0) -> Dict[str, Any]:
+    """
+    Call `op(i)` `iterations` times from `concurrency` concurrent workers after
+    `warmup` sequential calls that are not measured. `i` is unique per call, so
+    operations that create data can derive unique keys from it.
+    """
+    for i in range(warmup):
+        await op(i)
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count(warmup)
+    last = warmup + iterations
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            if i >= last:
+                return
+            started = time.perf_counter()
+            try:
+                await op(i)
+            except Exception as e:
+                errors += 1
+                if errors == 1:
+                    logger.warning(f"Benchmark operation failed: {e}")
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    return summarize(latencies, errors, time.perf_counter() - started, concurrency)
+
+def git_revision() -> Dict[str, Any]:
+    """
+    Commit the benchmark ran against, so results can be lined up across commits.
+    """
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+
+    try:
+        return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+def run_metadata(config: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Per-scenario throughput and tail latency change between two result files.
+    Positive `ops_change_pct` is faster; positive `p95_change_pct` is slower.
+    """
+    def change(before: float, after: float) -> Optional[float]:
+        return round((after - before) / before * 100, 1) if before else None
+
+    rows = []
+    for name, after in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        rows.append({
+            "scenario": name,
+            "ops_before": before["ops_per_sec"],
+            "ops_after": after["ops_per_sec"],
+            "ops_change_pct": change(before["ops_per_sec"], after["ops_per_sec"]),
+            "p95_before_ms": before["p95_ms"],
+            "p95_after_ms": after["p95_ms"],
+            "p95_change_pct": change(before["p95_ms"], after["p95_ms"]),
+        })
+    return rows
+
+def format_results(results: Dict[str, Dict[str, Any]]) -> str:
+    header = f"{'scenario':<24}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}"
+    lines = [header, "-" * len(header)]
+    for name, r in results.items():
+        lines.append(f"{name:<24}{r['ops_per_sec']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}")
+    return "\n".join(lines)
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    pct = lambda value: "n/a" if value is None else f"{value:+.1f}%"
+    header = f"{'scenario':<24}{'ops/s before':>14}{'after':>10}{'change':>9}{'p95 before':>12}{'after':>10}{'change':>9}"
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        lines.append(
+            f"{r['scenario']:<24}{r['ops_before']:>14}{r['ops_after']:>10}{pct(r['ops_change_pct']):>9}"
+            f"{r['p95_before_ms']:>12}{r['p95_after_ms']:>10}{pct(r['p95_change_pct']):>9}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,127 @@
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import httpx
+
+BENCH_PASSWORD = "bench-password-123"
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def expect(response: httpx.Response, status_code: int) -> httpx.Response:
+    if response.status_code != status_code:
+        raise BenchmarkError(f"{response.request.method} {response.request.url.path}: expected {status_code}, got {response.status_code}")
+    return response
+
+
+class BenchContext:
+    """
+    State shared by the scenarios of one run: the in-process client and the data seeded for it.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, run_id: str, seed: int = 0):
+        self.client = client
+        self.run_id = run_id
+        self.random = random.Random(seed)
+        self.product_ids: List[str] = []
+        self.email = f"bench-{run_id}@example.com"
+        self.token: Optional[str] = None
+
+    def unique_email(self, prefix: str, i: int) -> str:
+        return f"{prefix}-{self.run_id}-{i}@example.com"
+
+    def product_body(self, i: int) -> Dict[str, Any]:
+        return {
+            "name": f"Bench product {i}",
+            "description": "Benchmark fixture",
+            "price": round(self.random.uniform(0.5, 50), 2),
+            "in_stock": self.random.randint(0, 500),
+            "category": self.random.choice(["dairy", "bakery", "produce", "pantry", "frozen"]),
+        }
+
+
+class Scenario:
+    """
+    One measured operation. `setup(ctx, count)` runs unmeasured before the run and
+    receives the total number of calls (warm-up included) the run will make.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        op: Callable[[BenchContext, int], Awaitable[Any]],
+        setup: Optional[Callable[[BenchContext, int], Awaitable[None]]] = None,
+    ):
+        self.name = name
+        self.op = op
+        self.setup = setup
+
+
+async def seed_products(ctx: BenchContext, count: int) -> None:
+    for i in range(count):
+        response = expect(await ctx.client.post("/products/", json=ctx.product_body(i)), 201)
+        ctx.product_ids.append(response.json()["_id"])
+
+async def seed_user(ctx: BenchContext) -> None:
+    # Registered through the service so the password is hashed and login can verify it
+    from app.schemas.auth import RegistrationRequest
+    from app.services.auth_service import AuthService
+    await AuthService().register_user(RegistrationRequest(email=ctx.email, full_name="Bench User", password=BENCH_PASSWORD))
+    response = expect(await ctx.client.post("/auth/login", json={"email": ctx.email, "password": BENCH_PASSWORD}), 200)
+    ctx.token = response.json()["access_token"]
+
+
+async def list_products(ctx: BenchContext, i: int) -> None:
+    expect(await ctx.client.get("/products/", params={"limit": 20}), 200)
+
+async def get_product(ctx: BenchContext, i: int) -> None:
+    expect(await ctx.client.get(f"/products/{ctx.random.choice(ctx.product_ids)}"), 200)
+
+async def add_product(ctx: BenchContext, i: int) -> None:
+    expect(await ctx.client.post("/products/", json=ctx.product_body(i)), 201)
+
+async def update_product(ctx: BenchContext, i: int) -> None:
+    product_id = ctx.random.choice(ctx.product_ids)
+    expect(await ctx.client.put(f"/products/{product_id}", json={"price": round(ctx.random.uniform(0.5, 50), 2)}), 200)
+
+async def register(ctx: BenchContext, i: int) -> None:
+    body = {"email": ctx.unique_email("register", i), "full_name": "Bench User", "password": BENCH_PASSWORD}
+    expect(await ctx.client.post("/auth/register", json=body), 201)
+
+async def login(ctx: BenchContext, i: int) -> None:
+    expect(await ctx.client.post("/auth/login", json={"email": ctx.email, "password": BENCH_PASSWORD}), 200)
+
+async def users_me(ctx: BenchContext, i: int) -> None:
+    expect(await ctx.client.get("/users/me", headers={"Authorization": f"Bearer {ctx.token}"}), 200)
+
+async def seed_otp_users(ctx: BenchContext, count: int) -> None:
+    # One user per call: OTP generation is rate limited per email
+    from app.repositories.user_repository import UserRepository
+    repository = UserRepository()
+    for i in range(count):
+        await repository.create({"email": ctx.unique_email("otp", i), "full_name": "Bench User"})
+
+async def otp_generate_verify(ctx: BenchContext, i: int) -> None:
+    # There are no OTP routes yet, so this drives AuthService directly
+    from app.services.auth_service import AuthService
+    service = AuthService()
+    email = ctx.unique_email("otp", i)
+    otp = await service.generate_otp(email)
+    if not otp or not await service.verify_otp(email, otp):
+        raise BenchmarkError(f"OTP round trip failed for {email}")
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    scenario.name: scenario
+    for scenario in [
+        Scenario("products.list", list_products),
+        Scenario("products.get", get_product),
+        Scenario("products.add", add_product),
+        Scenario("products.update", update_product),
+        Scenario("auth.register", register),
+        Scenario("auth.login", login),
+        Scenario("users.me", users_me),
+        Scenario("otp.generate_verify", otp_generate_verify, setup=seed_otp_users),
+    ]
+}
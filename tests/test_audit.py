@@ -0,0 +1,124 @@
+import asyncio
+import json
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+from app.core.audit import AuditPipeline, JsonLinesFileSink
+from app.repositories.audit_repository import AuditRepository
+
+class RecordingSink:
+    def __init__(self):
+        self.batches = []
+
+    async def write(self, records):
+        self.batches.append(list(records))
+
+class FailingSink:
+    async def write(self, records):
+        raise IOError("disk full")
+
+def test_pipeline_batches_by_size():
+    sink = RecordingSink()
+
+    async def scenario():
+        pipeline = AuditPipeline([sink], batch_size=2, flush_interval=5)
+        await pipeline.start()
+        for i in range(5):
+            pipeline.submit({"n": i})
+        await asyncio.sleep(0.05)
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(scenario())
+    assert [len(batch) for batch in sink.batches] == [2, 2, 1]
+    assert pipeline.stats()["written"] == 5
+
+def test_pipeline_flushes_on_interval():
+    sink = RecordingSink()
+
+    async def scenario():
+        pipeline = AuditPipeline([sink], batch_size=100, flush_interval=0.01)
+        await pipeline.start()
+        pipeline.submit({"n": 1})
+        await asyncio.sleep(0.1)
+        written = list(sink.batches)
+        await pipeline.stop()
+        return written
+
+    assert asyncio.run(scenario()) == [[{"n": 1}]]
+
+def test_pipeline_overflow_policies():
+    async def scenario(policy):
+        pipeline = AuditPipeline([], max_queue_size=2, overflow=policy)
+        results = [pipeline.submit({"n": i}) for i in range(3)]
+        return results, pipeline._drain(10), pipeline.stats()
+
+    results, queued, stats = asyncio.run(scenario("drop_newest"))
+    assert results == [True, True, False]
+    assert [r["n"] for r in queued] == [0, 1]
+    assert stats["dropped"] == 1
+    _, queued, _ = asyncio.run(scenario("drop_oldest"))
+    assert [r["n"] for r in queued] == [1, 2]
+
+def test_pipeline_survives_failing_sink():
+    sink = RecordingSink()
+
+    async def scenario():
+        pipeline = AuditPipeline([FailingSink(), sink], batch_size=10, flush_interval=0.01)
+        await pipeline.start()
+        pipeline.submit({"n": 1})
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(scenario())
+    assert sink.batches == [[{"n": 1}]]
+    assert pipeline.stats()["failed_batches"] == 1
+
+def test_json_lines_file_sink(tmp_path):
+    path = tmp_path / "audit" / "events.jsonl"
+    sink = JsonLinesFileSink(str(path))
+    asyncio.run(sink.write([{"event": "add", "product_id": "1"}, {"event": "edit", "product_id": "1"}]))
+    lines = path.read_text().splitlines()
+    assert [json.loads(line)["event"] for line in lines] == ["add", "edit"]
+
+def make_audit_repository(collection):
+    db = MagicMock()
+    db.__getitem__.return_value = collection
+    with patch("app.repositories.audit_repository.get_mongo_db", return_value=db):
+        return AuditRepository()
+
+def test_audit_repository_writes_batches_unordered():
+    collection = MagicMock()
+    collection.insert_many = AsyncMock()
+    repository = make_audit_repository(collection)
+    records = [{"event": "add", "product_id": "1"}, {"event": "edit", "product_id": "1"}]
+    asyncio.run(repository.write(records))
+    docs = collection.insert_many.await_args.args[0]
+    assert docs == records and docs[0] is not records[0]
+    assert collection.insert_many.await_args.kwargs["ordered"] is False
+
+def test_audit_repository_history_pages_by_timestamp():
+    events = [
+        {"_id": ObjectId("507f1f77bcf86cd799439012"), "event": "edit", "user": "a", "ts": datetime(2024, 1, 2), "product_id": "1"},
+        {"_id": ObjectId("507f1f77bcf86cd799439011"), "event": "add", "user": "a", "ts": datetime(2024, 1, 1), "product_id": "1"},
+    ]
+    collection = MagicMock()
+    collection.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=events)
+    repository = make_audit_repository(collection)
+    page, next_cursor = asyncio.run(repository.get_product_history("1", limit=1))
+    assert page == events[:1]
+    asyncio.run(repository.get_product_history("1", limit=1, cursor=next_cursor))
+    collection.find.assert_called_with({"$and": [
+        {"product_id": "1"},
+        {"$or": [
+            {"ts": {"$lt": datetime(2024, 1, 2)}},
+            {"ts": datetime(2024, 1, 2), "_id": {"$lt": events[0]["_id"]}},
+        ]},
+    ]})
+
+def test_add_sink_replaces_a_sink_of_the_same_type():
+    first, second, failing = RecordingSink(), RecordingSink(), FailingSink()
+    pipeline = AuditPipeline([failing])
+    pipeline.add_sink(first)
+    pipeline.add_sink(second)
+    assert pipeline.sinks == [failing, second]
@@ -69,3 +69,12 @@ def test_login_user_invalid_credentials(mock_services):
     response = client.post('/auth/login', json=payload)
     assert response.status_code == 401
     assert response.json()['detail'] == 'Invalid credentials.'
+
+def test_access_token_round_trip_and_rejections():
+    from app.utils.security import create_access_token, decode_access_token
+    token = create_access_token({"sub": "test@example.com"})
+    assert decode_access_token(token)["sub"] == "test@example.com"
+    header, body, signature = token.split(".")
+    assert decode_access_token(f"{header}.{body}.{signature[::-1]}") is None
+    assert decode_access_token(create_access_token({"sub": "test@example.com"}, expires_minutes=-1)) is None
+    assert decode_access_token("not-a-token") is None
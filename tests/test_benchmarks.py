@@ -0,0 +1,55 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from benchmarks.harness import compare, percentile, run_operation, summarize
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 21))
+    assert percentile(values, 50) == 10
+    assert percentile(values, 95) == 19
+    assert percentile(values, 99) == 20
+    assert percentile([], 50) == 0.0
+
+def test_run_operation_counts_calls_and_errors():
+    seen = []
+
+    async def op(i):
+        seen.append(i)
+        if i == 7:
+            raise RuntimeError("boom")
+
+    result = asyncio.run(run_operation(op, iterations=20, concurrency=4, warmup=5))
+    assert sorted(seen) == list(range(25))
+    assert result["operations"] == 19
+    assert result["errors"] == 1
+    assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"] <= result["max_ms"]
+
+def test_compare_reports_relative_change():
+    def report(ops, p95):
+        return {"results": {"products.get": summarize([p95 / 1000] * 10, 0, 10 / ops, 1)}}
+
+    [row] = compare(report(100, 20), report(150, 10))
+    assert row["scenario"] == "products.get"
+    assert row["ops_change_pct"] == 50.0
+    assert row["p95_change_pct"] == -50.0
+
+def test_run_drives_the_app_on_the_memory_backend(tmp_path):
+    # A fresh interpreter, since the app reads its settings at import
+    output = tmp_path / "results.json"
+    env = {**os.environ, "PASSWORD_HASH_ITERATIONS": "1000"}
+    completed = subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks", "run", "--backend", "memory",
+            "--scenario", "products.list", "--scenario", "products.update", "--scenario", "users.me",
+            "--iterations", "5", "--warmup", "1", "--concurrency", "2", "--products", "10",
+            "--output", str(output),
+        ],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert completed.returncode == 0, completed.stderr
+    results = json.loads(output.read_text())["results"]
+    assert sorted(results) == ["products.list", "products.update", "users.me"]
+    assert all(r["operations"] == 5 and r["errors"] == 0 for r in results.values())
@@ -0,0 +1,55 @@
+from app.utils.cache import TTLCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_get_set_and_counters():
+    cache = TTLCache(maxsize=2, ttl=10)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["size"] == 1
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = TTLCache(maxsize=10, ttl=5, timer=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    clock.now = 6
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats()["expirations"] == 1
+
+def test_invalidate():
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.get("a") is None
+
+def test_invalidate_where():
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("token-1", {"email": "a@example.com"})
+    cache.set("token-2", {"email": "a@example.com"})
+    cache.set("token-3", {"email": "b@example.com"})
+    assert cache.invalidate_where(lambda user: user["email"] == "a@example.com") == 2
+    assert cache.get("token-1") is None
+    assert cache.get("token-3") == {"email": "b@example.com"}
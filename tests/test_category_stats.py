@@ -0,0 +1,127 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+from app.core.scheduler import PeriodicTask
+from app.models.product_model import ProductCreateModel, ProductUpdateModel, StockReservationItem
+from app.repositories.category_stats_repository import CategoryDeltas, CategoryStatsRepository
+from app.services.product_service import ProductService, drain_deferred_stats
+from app.storage import MemoryClient
+
+def make_service():
+    db = MemoryClient()["testdb"]
+    return ProductService(db["products"], stats=CategoryStatsRepository(db)), db
+
+def settled(write):
+    """Run a write and wait for the aggregate updates it deferred."""
+    async def run():
+        result = await write
+        await drain_deferred_stats()
+        return result
+    return asyncio.run(run())
+
+def summary(service):
+    rows = asyncio.run(service.get_category_summary())
+    return {row.category: (row.count, row.total_stock, row.min_price, row.max_price) for row in rows}
+
+def add(service, name, price, in_stock, category):
+    return settled(service.add_product(ProductCreateModel(name=name, price=price, in_stock=in_stock, category=category)))
+
+def test_category_deltas_replace_within_category_only_touches_stock_and_bounds():
+    deltas = CategoryDeltas()
+    deltas.replace({"category": "dairy", "price": 1.0, "in_stock": 5}, {"category": "dairy", "price": 1.0, "in_stock": 5, "name": "x"})
+    assert deltas.empty()
+    deltas.replace({"category": "dairy", "price": 1.0, "in_stock": 5}, {"category": "dairy", "price": 2.0, "in_stock": 3})
+    assert deltas.changes["dairy"] == {"count": 0, "total_stock": -2, "min_price": 2.0, "max_price": 2.0}
+    assert deltas.removed_prices == {"dairy": {1.0}}
+
+def test_add_and_update_maintain_aggregates():
+    service, db = make_service()
+    milk = add(service, "Milk", 1.5, 10, "dairy")
+    add(service, "Cheese", 4.0, 2, "dairy")
+    add(service, "Bread", 2.0, 7, None)
+    assert summary(service) == {None: (1, 7, 2.0, 2.0), "dairy": (2, 12, 1.5, 4.0)}
+
+    # Raising the cheapest price re-reads the lower bound
+    settled(service.update_product(milk.id, ProductUpdateModel(price=3.0, in_stock=4)))
+    assert summary(service)["dairy"] == (2, 6, 3.0, 4.0)
+
+    # Moving a price that is not a bound needs no re-read of the products
+    butter = add(service, "Butter", 3.5, 1, "dairy")
+    with patch.object(service.stats, "refresh_price_bounds", AsyncMock()) as refresh:
+        settled(service.update_product(butter.id, ProductUpdateModel(price=3.8)))
+    refresh.assert_not_awaited()
+    assert summary(service)["dairy"] == (3, 7, 3.0, 4.0)
+    settled(service.update_product(butter.id, ProductUpdateModel(category="other")))
+
+    # Moving a product out of a category updates both sides
+    settled(service.update_product(milk.id, ProductUpdateModel(category="bakery")))
+    assert summary(service) == {
+        None: (1, 7, 2.0, 2.0), "bakery": (1, 4, 3.0, 3.0), "dairy": (1, 2, 4.0, 4.0), "other": (1, 1, 3.8, 3.8)
+    }
+
+def test_bulk_import_and_reservations_maintain_aggregates():
+    service, db = make_service()
+
+    async def rows():
+        yield 1, {"name": "Apple", "price": 0.5, "in_stock": 100, "category": "produce"}
+        yield 2, {"name": "Pear", "price": 0.8, "in_stock": 50, "category": "produce"}
+        yield 3, {"name": "", "price": 1.0, "in_stock": 1, "category": "produce"}
+
+    asyncio.run(service.bulk_add_products(rows()))
+    assert summary(service) == {"produce": (2, 150, 0.5, 0.8)}
+    apple = asyncio.run(db["products"].find_one({"name": "Apple"}))
+
+    async def reserve(items, all_or_nothing=False):
+        # Reservations update the aggregates in the background
+        result = await service.reserve_stock(items, all_or_nothing=all_or_nothing)
+        await drain_deferred_stats()
+        return result
+
+    reservation = asyncio.run(reserve([StockReservationItem(product_id=str(apple["_id"]), quantity=30)]))
+    assert summary(service)["produce"][1] == 120
+    asyncio.run(service.release_stock(reservation.reservation_id))
+    assert summary(service)["produce"][1] == 150
+
+    # A rolled back reservation leaves the aggregates alone
+    pear = asyncio.run(db["products"].find_one({"name": "Pear"}))
+    with patch.object(service.stats, "apply", AsyncMock()) as apply:
+        result = asyncio.run(reserve([
+            StockReservationItem(product_id=str(apple["_id"]), quantity=10),
+            StockReservationItem(product_id=str(pear["_id"]), quantity=500),
+        ], all_or_nothing=True))
+    assert not result.reserved
+    apply.assert_not_awaited()
+    assert summary(service)["produce"][1] == 150
+
+def test_reconcile_repairs_drift_and_drops_empty_categories():
+    service, db = make_service()
+    add(service, "Milk", 1.5, 10, "dairy")
+    stats = db["category_stats"]
+    asyncio.run(stats.update_one({"_id": "dairy"}, {"$set": {"count": 9, "total_stock": 0}}))
+    asyncio.run(stats.insert_one({"_id": "gone", "count": 1, "total_stock": 1}))
+    assert asyncio.run(service.stats.reconcile(db["products"])) == 1
+    assert summary(service) == {"dairy": (1, 10, 1.5, 1.5)}
+    assert asyncio.run(stats.count_documents({})) == 1
+
+def test_summary_without_stats_is_computed_from_products():
+    service, db = make_service()
+    add(service, "Milk", 1.5, 10, "dairy")
+    plain = ProductService(db["products"])
+    assert summary(plain) == summary(service) == {"dairy": (1, 10, 1.5, 1.5)}
+
+def test_periodic_task_keeps_running_after_a_failure():
+    calls = []
+
+    async def job():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    async def run():
+        task = PeriodicTask("test", job, interval=0.01)
+        await task.start()
+        await asyncio.sleep(0.05)
+        await task.stop()
+        return task.stats()
+
+    stats = asyncio.run(run())
+    assert stats["failures"] == 1 and stats["runs"] >= 1
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+from app.models.product_model import ProductCreateModel, ProductFilterModel, ProductUpdateModel
+from app.services.product_service import ProductService
+from app.storage import MemoryClient
+from app.utils.cache import TTLCache
+from app.utils.conditional import etag_matches, etag_version, http_date, modified_since, page_etag, version_etag
+
+def test_etag_matches_uses_weak_comparison():
+    assert etag_matches('W/"3"', version_etag(3))
+    assert etag_matches('"1", "3"', version_etag(3))
+    assert etag_matches("*", version_etag(3))
+    assert not etag_matches('W/"2"', version_etag(3))
+    assert not etag_matches(None, version_etag(3))
+
+def test_etag_version_reads_single_product_etag():
+    assert etag_version('W/"7"') == 7
+    assert etag_version('"7"') == 7
+    assert etag_version('W/"abc"') is None
+    assert etag_version('"1", "2"') is None
+
+def test_modified_since_compares_whole_seconds():
+    updated_at = datetime(2024, 5, 1, 12, 0, 0, 500000)
+    header = http_date(updated_at)
+    assert header == "Wed, 01 May 2024 12:00:00 GMT"
+    assert not modified_since(header, updated_at)
+    assert modified_since(header, datetime(2024, 5, 1, 12, 0, 1))
+    assert modified_since("not a date", updated_at)
+
+def test_page_etag_depends_on_ids_versions_and_order():
+    a, b = ObjectId(), ObjectId()
+    assert page_etag([(a, 1), (b, 1)]) == page_etag([(a, 1), (b, 1)])
+    assert page_etag([(a, 1), (b, 2)]) != page_etag([(a, 1), (b, 1)])
+    assert page_etag([(b, 1), (a, 1)]) != page_etag([(a, 1), (b, 1)])
+
+def test_get_product_validators_reads_only_version_fields():
+    collection = MagicMock()
+    updated_at = datetime(2024, 5, 1)
+    collection.find_one = AsyncMock(return_value={"_id": ObjectId(), "version": 4, "updated_at": updated_at})
+    service = ProductService(collection)
+    assert asyncio.run(service.get_product_validators("507f1f77bcf86cd799439011")) == (4, updated_at)
+    assert collection.find_one.await_args.args[1] == {"version": 1, "updated_at": 1}
+
+def test_get_product_validators_prefers_cache():
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value={
+        "_id": ObjectId("507f1f77bcf86cd799439011"), "name": "Milk", "price": 1.0, "in_stock": 1, "version": 2
+    })
+    service = ProductService(collection, cache=TTLCache(maxsize=10, ttl=60))
+    asyncio.run(service.get_product("507f1f77bcf86cd799439011"))
+    assert asyncio.run(service.get_product_validators("507f1f77bcf86cd799439011")) == (2, None)
+    collection.find_one.assert_awaited_once()
+
+def test_writes_maintain_version_and_updated_at_and_page_etag():
+    async def run():
+        service = ProductService(MemoryClient()["testdb"]["products"])
+        product = await service.add_product(ProductCreateModel(name="Milk", price=1.0, in_stock=1))
+        before = await service.get_products_page_etag(limit=10, filters=ProductFilterModel())
+        unchanged = await service.get_products_page_etag(limit=10)
+        updated = await service.update_product(product.id, ProductUpdateModel(price=2.0))
+        after = await service.get_products_page_etag(limit=10)
+        return product, updated, before, unchanged, after
+
+    product, updated, before, unchanged, after = asyncio.run(run())
+    assert product.version == 1 and product.updated_at is not None
+    assert updated.version == 2 and updated.updated_at >= product.updated_at
+    assert before == unchanged != after
+
+def test_page_read_gives_the_same_etag_as_the_revalidation_query():
+    async def run():
+        service = ProductService(MemoryClient()["testdb"]["products"])
+        for name in ("Milk", "Bread", "Eggs"):
+            await service.add_product(ProductCreateModel(name=name, price=1.0, in_stock=1))
+        filters = ProductFilterModel(sort="name")
+        expected = await service.get_products_page_etag(limit=2, filters=filters)
+        pages = [
+            await service.get_products_page_with_etag(limit=2, filters=filters, fields=fields, raw=raw)
+            for fields in (None, ("id", "name")) for raw in (False, True)
+        ]
+        return expected, pages
+
+    expected, pages = asyncio.run(run())
+    assert {etag for _, _, etag in pages} == {expected}
+    assert all("version" not in product for product in pages[3][0])
@@ -0,0 +1,126 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+from app.utils.dataloader import DataLoader
+from app.services.product_service import ProductService, fetch_products_by_id
+
+def make_batch_fn(values):
+    calls = []
+
+    async def batch_fn(keys):
+        calls.append(list(keys))
+        await asyncio.sleep(0)
+        return {key: values[key] for key in keys if key in values}
+
+    return batch_fn, calls
+
+def test_identical_concurrent_loads_share_one_lookup():
+    batch_fn, calls = make_batch_fn({"a": 1})
+    loader = DataLoader(batch_fn)
+
+    async def run():
+        return await asyncio.gather(*(loader.load("a") for _ in range(50)))
+
+    assert asyncio.run(run()) == [1] * 50
+    assert calls == [["a"]]
+    assert loader.stats()["coalesced"] == 49
+
+def test_distinct_keys_in_one_tick_are_batched():
+    batch_fn, calls = make_batch_fn({"a": 1, "b": 2})
+    loader = DataLoader(batch_fn)
+
+    async def run():
+        return await asyncio.gather(loader.load("a"), loader.load("b"), loader.load("missing"))
+
+    assert asyncio.run(run()) == [1, 2, None]
+    assert calls == [["a", "b", "missing"]]
+
+def test_batches_are_split_by_max_batch_size():
+    batch_fn, calls = make_batch_fn({i: i for i in range(5)})
+    loader = DataLoader(batch_fn, max_batch_size=2)
+
+    async def run():
+        return await asyncio.gather(*(loader.load(i) for i in range(5)))
+
+    assert asyncio.run(run()) == [0, 1, 2, 3, 4]
+    assert [len(keys) for keys in calls] == [2, 2, 1]
+
+def test_failure_reaches_every_waiter_and_is_not_remembered():
+    attempts = []
+
+    async def batch_fn(keys):
+        attempts.append(keys)
+        if len(attempts) == 1:
+            raise RuntimeError("db down")
+        return {key: "ok" for key in keys}
+
+    loader = DataLoader(batch_fn)
+
+    async def run():
+        results = await asyncio.gather(loader.load("a"), loader.load("a"), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        return await loader.load("a")
+
+    assert asyncio.run(run()) == "ok"
+
+def test_clear_makes_later_loads_start_a_new_lookup():
+    batch_fn, calls = make_batch_fn({"a": 1})
+    loader = DataLoader(batch_fn)
+
+    async def run():
+        first = asyncio.ensure_future(loader.load("a"))
+        # One tick to queue the key and one to dispatch it
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        loader.clear("a")
+        second = asyncio.ensure_future(loader.load("a"))
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(run()) == [1, 1]
+    assert calls == [["a"], ["a"]]
+
+def test_cancelled_caller_does_not_cancel_others():
+    batch_fn, _ = make_batch_fn({"a": 1})
+    loader = DataLoader(batch_fn)
+
+    async def run():
+        first = asyncio.ensure_future(loader.load("a"))
+        second = asyncio.ensure_future(loader.load("a"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == 1
+
+def test_get_product_coalesces_full_reads_through_loader():
+    product_id = ObjectId()
+    doc = {"_id": product_id, "name": "Milk", "description": "1L", "price": 1.5, "in_stock": 3, "category": "dairy", "version": 1}
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=[doc])
+    collection = MagicMock()
+    collection.find.return_value = cursor
+    loader = DataLoader(lambda ids: fetch_products_by_id(collection, ids))
+    service = ProductService(collection, loader=loader)
+
+    async def run():
+        return await asyncio.gather(service.get_product(str(product_id)), service.get_product(str(product_id)))
+
+    first, second = asyncio.run(run())
+    collection.find.assert_called_once_with({"_id": {"$in": [product_id]}})
+    collection.find_one.assert_not_called()
+    assert first.name == second.name == "Milk"
+
+def test_get_product_sends_projection_even_with_loader():
+    product_id = ObjectId()
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value={"_id": product_id, "price": 1.5, "version": 2})
+    loader = DataLoader(lambda ids: fetch_products_by_id(collection, ids))
+    service = ProductService(collection, loader=loader)
+    trimmed = asyncio.run(service.get_product(str(product_id), fields=("id", "price")))
+    raw = asyncio.run(service.get_product(str(product_id), raw=True))
+    assert trimmed.dict(by_alias=True) == {"_id": str(product_id), "price": 1.5}
+    assert raw["price"] == 1.5
+    projections = [call.args[1] for call in collection.find_one.await_args_list]
+    assert projections[0] == {"price": 1, "version": 1, "updated_at": 1}
+    assert "name" in projections[1] and "reservations" not in projections[1]
+    collection.find.assert_not_called()
@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+import pytest
+from app.core import db
+from app.core.db import MongoConnectionManager, PoolStatsListener
+from app.database.mongodb import MongoDBClient
+from app.models.product_model import ProductCreateModel, ProductUpdateModel
+
+def test_manager_applies_pool_settings_to_both_clients():
+    manager = MongoConnectionManager("mongodb://localhost:27017", "testdb", maxPoolSize=7, minPoolSize=2)
+    try:
+        assert manager.async_client.options.pool_options.max_pool_size == 7
+        assert manager.sync_client.options.pool_options.min_pool_size == 2
+        assert manager.get_database().name == "testdb"
+        assert manager.get_sync_database("other").name == "other"
+    finally:
+        manager.close()
+
+def test_sync_clients_share_one_pool():
+    manager = MongoConnectionManager("mongodb://localhost:27017", "testdb")
+    try:
+        first = MongoDBClient("products", manager=manager)
+        second = MongoDBClient("products", manager=manager)
+        assert first.client is second.client is manager.sync_client
+        assert first.collection.full_name == "testdb.products"
+    finally:
+        manager.close()
+
+def test_pool_listener_tracks_checkouts():
+    listener = PoolStatsListener()
+    listener.connection_created(None)
+    listener.connection_created(None)
+    listener.connection_checked_out(SimpleNamespace(duration=0.004))
+    listener.connection_checked_out(SimpleNamespace(duration=0.002))
+    listener.connection_checked_in(None)
+    listener.connection_closed(None)
+    stats = listener.stats()
+    assert stats["open"] == 1
+    assert stats["in_use"] == 1
+    assert stats["checked_out"] == 2
+    assert stats["avg_checkout_wait_ms"] == 3.0
+    assert stats["max_checkout_wait_ms"] == 4.0
+
+def test_warm_pings_min_pool_size_times():
+    manager = MongoConnectionManager("mongodb://localhost:27017", "testdb", minPoolSize=3)
+    admin = SimpleNamespace(command=AsyncMock(side_effect=[{"ok": 1}, {"ok": 1}, Exception("timeout")]))
+    with patch.object(MongoConnectionManager, "async_client", {"admin": admin}):
+        assert asyncio.run(manager.warm()) == 2
+    assert admin.command.await_count == 3
+
+def test_get_mongo_db_requires_connection():
+    with patch.object(db, "mongo_db", None):
+        with pytest.raises(RuntimeError):
+            db.get_mongo_db()
+
+def test_sync_client_writes_set_updated_at():
+    manager = MongoConnectionManager("mongodb://localhost:27017", "testdb")
+    try:
+        client = MongoDBClient("products", manager=manager)
+    finally:
+        manager.close()
+    client.collection = MagicMock()
+    client.collection.insert_one.return_value = SimpleNamespace(inserted_id="64b7f0c2a1b2c3d4e5f60718")
+    added = client.add_product(ProductCreateModel(name="Tea", price=2.0, in_stock=3))
+    inserted = client.collection.insert_one.call_args.args[0]
+    assert inserted["version"] == 1 and inserted["updated_at"] == added.updated_at
+    client.collection.find_one_and_update.return_value = {**inserted, "price": 3.0, "version": 2}
+    client.update_product("64b7f0c2a1b2c3d4e5f60718", ProductUpdateModel(price=3.0))
+    _, update = client.collection.find_one_and_update.call_args.args
+    assert update["$set"]["price"] == 3.0 and update["$set"]["updated_at"] >= inserted["updated_at"]
+    assert update["$inc"] == {"version": 1}
@@ -0,0 +1,90 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+from pymongo import ASCENDING, IndexModel
+from app.core import indexes
+
+class FakeAggregate:
+    def __init__(self, docs):
+        self.docs = list(docs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+def make_db(existing, stats=()):
+    collection = MagicMock()
+    collection.index_information = AsyncMock(return_value={name: {} for name in existing})
+    collection.create_indexes = AsyncMock(side_effect=lambda models: [m.document["name"] for m in models])
+    collection.aggregate.side_effect = lambda pipeline: FakeAggregate(stats)
+    db = MagicMock()
+    db.__getitem__.return_value = collection
+    return db, collection
+
+def test_declare_indexes_is_idempotent():
+    with patch.dict(indexes.INDEX_REGISTRY, clear=True):
+        index = IndexModel([("email", ASCENDING)], unique=True, name="email_unique")
+        indexes.declare_indexes("users", index)
+        indexes.declare_indexes("users", index)
+        assert len(indexes.INDEX_REGISTRY["users"]) == 1
+
+def test_ensure_indexes_creates_only_missing():
+    with patch.dict(indexes.INDEX_REGISTRY, clear=True):
+        indexes.declare_indexes(
+            "users",
+            IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+            IndexModel([("name", ASCENDING)], name="name"),
+        )
+        db, collection = make_db(["_id_", "email_unique"])
+        created = asyncio.run(indexes.ensure_indexes(db))
+        assert created == {"users": ["name"]}
+
+def test_ensure_indexes_noop_when_present():
+    with patch.dict(indexes.INDEX_REGISTRY, clear=True):
+        indexes.declare_indexes("users", IndexModel([("email", ASCENDING)], name="email_unique"))
+        db, collection = make_db(["_id_", "email_unique"])
+        assert asyncio.run(indexes.ensure_indexes(db)) == {}
+        collection.create_indexes.assert_not_called()
+
+def test_index_report():
+    with patch.dict(indexes.INDEX_REGISTRY, clear=True):
+        indexes.declare_indexes(
+            "products",
+            IndexModel([("price", ASCENDING)], name="price"),
+            IndexModel([("category", ASCENDING)], name="category"),
+        )
+        stats = [
+            {"name": "_id_", "accesses": {"ops": 0}},
+            {"name": "price", "accesses": {"ops": 0}},
+            {"name": "legacy", "accesses": {"ops": 12}},
+        ]
+        db, _ = make_db(["_id_", "price", "legacy"], stats)
+        report = asyncio.run(indexes.index_report(db))
+        assert report["products"] == {"missing": ["category"], "undeclared": ["legacy"], "unused": ["price"]}
+
+def test_ensure_indexes_skips_same_keys_under_another_name_and_continues_after_conflict():
+    from pymongo.errors import OperationFailure
+    with patch.dict(indexes.INDEX_REGISTRY, clear=True):
+        indexes.declare_indexes(
+            "users",
+            IndexModel([("email", ASCENDING)], unique=True, name="email_unique"),
+            IndexModel([("name", ASCENDING)], name="name"),
+            IndexModel([("age", ASCENDING)], name="age"),
+        )
+        db, collection = make_db([])
+        collection.index_information = AsyncMock(return_value={
+            "_id_": {"key": [("_id", 1)]},
+            "email_1": {"key": [("email", 1.0)]},
+        })
+
+        def create(models):
+            if models[0].document["name"] == "name":
+                raise OperationFailure("conflict")
+            return [models[0].document["name"]]
+
+        collection.create_indexes = AsyncMock(side_effect=create)
+        assert asyncio.run(indexes.ensure_indexes(db)) == {"users": ["age"]}
+        assert [call.args[0][0].document["name"] for call in collection.create_indexes.await_args_list] == ["name", "age"]
@@ -0,0 +1,170 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.core.db import MongoConnectionManager
+from app.core.indexes import ensure_indexes
+from app.models.product_model import ProductCreateModel, ProductFilterModel, ProductUpdateModel
+from app.repositories.otp_repository import OTPRepository
+from app.repositories.user_repository import UserRepository
+from app.services.product_service import ProductService, fetch_products_by_id
+from app.storage import MemoryClient
+from app.utils.dataloader import DataLoader
+from app.utils.rate_limiter import MongoRateLimitBackend
+
+def memory_db(asynchronous=True):
+    return MemoryClient(asynchronous=asynchronous)["testdb"]
+
+def names(docs):
+    return [doc["name"] for doc in docs]
+
+def test_filters_follow_mongo_semantics():
+    products = memory_db(asynchronous=False)["products"]
+    products.insert_many([
+        {"name": "milk", "price": 1.5, "category": "dairy", "tags": ["fresh", "cold"]},
+        {"name": "bread", "price": 2, "category": "bakery", "tags": ["fresh"]},
+        {"name": "jam", "price": "n/a"},
+    ])
+    find = lambda query: names(products.find(query))
+    assert find({"price": {"$gt": 1}}) == ["milk", "bread"]
+    assert find({"price": {"$gte": 2, "$lte": 2}}) == ["bread"]
+    assert find({"category": {"$in": ["dairy", "frozen"]}}) == ["milk"]
+    assert find({"category": {"$ne": "dairy"}}) == ["bread", "jam"]
+    assert find({"category": None}) == ["jam"]
+    assert find({"category": {"$exists": False}}) == ["jam"]
+    assert find({"tags": "cold"}) == ["milk"]
+    assert find({"$or": [{"name": "jam"}, {"price": {"$lt": 2}}]}) == ["milk", "jam"]
+    assert find({"$and": [{"tags": "fresh"}, {"category": "bakery"}]}) == ["bread"]
+    with pytest.raises(ValueError):
+        find({"name": {"$regex": "m"}})
+
+def test_cursor_sorts_skips_limits_and_projects():
+    products = memory_db(asynchronous=False)["products"]
+    products.insert_many([{"name": n, "price": p} for n, p in [("a", 3), ("b", 1), ("c", 2), ("d", 1)]])
+    docs = list(products.find({}, {"name": 1, "_id": 0}).sort([("price", ASCENDING), ("name", -1)]).skip(1).limit(2))
+    assert docs == [{"name": "b"}, {"name": "c"}]
+
+def test_updates_and_upserts():
+    counters = memory_db(asynchronous=False)["counters"]
+    doc = counters.find_one_and_update(
+        {"_id": "k:1"}, {"$inc": {"count": 1}, "$setOnInsert": {"key": "k"}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    assert doc == {"_id": "k:1", "count": 1, "key": "k"}
+    doc = counters.find_one_and_update(
+        {"_id": "k:1"}, {"$inc": {"count": 1}, "$setOnInsert": {"key": "other"}, "$unset": {"missing": ""}},
+        return_document=ReturnDocument.AFTER
+    )
+    assert doc == {"_id": "k:1", "count": 2, "key": "k"}
+    before = counters.find_one_and_update({"_id": "k:1"}, {"$set": {"count": 0}, "$push": {"log": "reset"}})
+    assert before["count"] == 2
+    assert counters.find_one("k:1")["log"] == ["reset"]
+    result = counters.update_one({"_id": "k:2", "key": "k"}, {"$set": {"count": 5}}, upsert=True)
+    assert result.upserted_id == "k:2"
+    assert counters.find_one({"_id": "k:2"}) == {"_id": "k:2", "key": "k", "count": 5}
+    assert counters.update_many({"key": "k"}, {"$inc": {"count": 1}}).modified_count == 2
+
+def test_returned_documents_are_copies():
+    products = memory_db(asynchronous=False)["products"]
+    doc = {"name": "milk"}
+    products.insert_one(doc)
+    assert isinstance(doc["_id"], ObjectId)
+    found = products.find_one({"_id": doc["_id"]})
+    found["name"] = "changed"
+    assert products.find_one({"_id": doc["_id"]})["name"] == "milk"
+
+def test_unique_indexes_reject_duplicates():
+    users = memory_db(asynchronous=False)["users"]
+    users.create_indexes([IndexModel([("email", ASCENDING)], unique=True, name="email_unique")])
+    users.insert_one({"email": "a@example.com"})
+    with pytest.raises(DuplicateKeyError):
+        users.insert_one({"email": "a@example.com"})
+    with pytest.raises(BulkWriteError) as excinfo:
+        users.insert_many([{"email": "b@example.com"}, {"email": "a@example.com"}, {"email": "c@example.com"}], ordered=False)
+    assert excinfo.value.details["nInserted"] == 2
+    assert [err["index"] for err in excinfo.value.details["writeErrors"]] == [1]
+    users.update_one({"email": "b@example.com"}, {"$set": {"email": "d@example.com"}})
+    users.insert_one({"email": "b@example.com"})
+    assert users.count_documents({}) == 4
+
+def test_bulk_write_with_conditional_updates():
+    products = memory_db(asynchronous=False)["products"]
+    products.insert_many([{"_id": 1, "in_stock": 5}, {"_id": 2, "in_stock": 1}])
+    result = products.bulk_write([
+        UpdateOne({"_id": 1, "in_stock": {"$gte": 3}}, {"$inc": {"in_stock": -3}}),
+        UpdateOne({"_id": 2, "in_stock": {"$gte": 3}}, {"$inc": {"in_stock": -3}}),
+    ], ordered=False)
+    assert result.matched_count == 1
+    assert [doc["in_stock"] for doc in products.find().sort("_id")] == [2, 1]
+
+def test_aggregate_groups():
+    products = memory_db(asynchronous=False)["products"]
+    products.insert_many([
+        {"category": "dairy", "price": 1.0, "in_stock": 2},
+        {"category": "dairy", "price": 3.0, "in_stock": 0},
+        {"category": "bakery", "price": 2.0, "in_stock": 4},
+    ])
+    groups = list(products.aggregate([
+        {"$group": {"_id": "$category", "count": {"$sum": 1}, "stock": {"$sum": "$in_stock"}, "min_price": {"$min": "$price"}}},
+        {"$sort": {"_id": 1}},
+    ]))
+    assert groups == [
+        {"_id": "bakery", "count": 1, "stock": 4, "min_price": 2.0},
+        {"_id": "dairy", "count": 2, "stock": 2, "min_price": 1.0},
+    ]
+
+def test_product_service_end_to_end():
+    db = memory_db()
+    collection = db["products"]
+    service = ProductService(collection, loader=DataLoader(lambda ids: fetch_products_by_id(collection, ids)))
+
+    async def run():
+        for i in range(5):
+            await service.add_product(ProductCreateModel(name=f"p{i}", price=float(i + 1), in_stock=i, category="dairy" if i % 2 else "bakery"))
+        page, cursor = await service.get_products_page(limit=2, filters=ProductFilterModel(sort="-price"))
+        rest, end = await service.get_products_page(limit=10, cursor=cursor, filters=ProductFilterModel(sort="-price"))
+        assert [p.name for p in page + rest] == ["p4", "p3", "p2", "p1", "p0"]
+        assert end is None
+        in_stock, _ = await service.get_products_page(filters=ProductFilterModel(category="dairy", in_stock_only=True))
+        assert [p.name for p in in_stock] == ["p1", "p3"]
+        updated = await service.update_product(page[0].id, ProductUpdateModel(price=9.5), expected_version=1)
+        assert (updated.price, updated.version) == (9.5, 2)
+        with pytest.raises(HTTPException) as excinfo:
+            await service.update_product(page[0].id, ProductUpdateModel(price=1.0), expected_version=1)
+        assert excinfo.value.status_code == 409
+        assert (await service.get_product(page[0].id)).price == 9.5
+
+    asyncio.run(run())
+
+def test_auth_repositories_on_memory_backend():
+    db = memory_db()
+
+    async def run():
+        await ensure_indexes(db)
+        users = UserRepository(db=db)
+        created = await users.create({"email": "a@example.com", "password": "x"})
+        assert (await users.get_by_email("a@example.com"))["id"] == created["id"]
+        with pytest.raises(DuplicateKeyError):
+            await users.create({"email": "a@example.com", "password": "y"})
+        otps = OTPRepository(db=db)
+        await otps.save_otp("a@example.com", "123456", datetime.utcnow() + timedelta(minutes=5))
+        assert not await otps.consume_otp("a@example.com", "000000")
+        assert await otps.consume_otp("a@example.com", "123456")
+        assert not await otps.consume_otp("a@example.com", "123456")
+        limiter = MongoRateLimitBackend(limit=2, window_seconds=60, collection=db["rate_limits"])
+        assert [await limiter.hit("a") for _ in range(3)] == [True, True, False]
+
+    asyncio.run(run())
+
+def test_connection_manager_memory_backend_shares_data():
+    manager = MongoConnectionManager(db_name="testdb", backend="memory")
+
+    async def run():
+        await manager.get_database()["products"].insert_one({"name": "milk"})
+        assert await manager.ping() >= 0
+        assert await manager.warm(3) == 3
+
+    asyncio.run(run())
+    assert manager.get_sync_database()["products"].find_one({})["name"] == "milk"
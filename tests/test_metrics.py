@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.metrics import (
+    CommandTimingListener,
+    Histogram,
+    MetricsRegistry,
+    http_request_duration,
+    mongodb_command_duration,
+    operation_duration,
+    record_request_latency,
+    registry,
+    timed,
+)
+
+def series_count(histogram, **labels):
+    key = tuple(str(labels.get(name, "")) for name in histogram.labelnames)
+    series = histogram._series.get(key)
+    return sum(series[0]) if series else 0
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("op_seconds", "Test.", ("operation",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, operation="a")
+    histogram.observe(0.1, operation="a")
+    histogram.observe(5, operation="a")
+    lines = histogram.render()
+    assert 'op_seconds_bucket{operation="a",le="0.1"} 2' in lines
+    assert 'op_seconds_bucket{operation="a",le="1.0"} 2' in lines
+    assert 'op_seconds_bucket{operation="a",le="+Inf"} 3' in lines
+    assert 'op_seconds_count{operation="a"} 3' in lines
+
+def test_registry_exposes_numeric_stats_as_gauges():
+    metrics = MetricsRegistry()
+    metrics.register_stats("cache", lambda: {"hits": 3, "ratio": 0.5, "enabled": True, "name": "x"})
+    text = metrics.render()
+    assert "cache_hits 3\n" in text
+    assert "cache_ratio 0.5\n" in text
+    assert "cache_enabled 1\n" in text
+    assert "cache_name" not in text
+
+def test_timed_records_outcome_of_async_calls():
+    class Service:
+        @timed()
+        async def ok(self):
+            return 1
+
+        @timed("Service.custom")
+        async def fail(self):
+            raise ValueError("boom")
+
+    before_ok = series_count(operation_duration, operation="test_timed_records_outcome_of_async_calls.<locals>.Service.ok", outcome="ok")
+    assert asyncio.run(Service().ok()) == 1
+    with pytest.raises(ValueError):
+        asyncio.run(Service().fail())
+    assert series_count(operation_duration, operation="test_timed_records_outcome_of_async_calls.<locals>.Service.ok", outcome="ok") == before_ok + 1
+    assert series_count(operation_duration, operation="Service.custom", outcome="error") == 1
+
+def test_command_listener_records_driver_timings():
+    listener = CommandTimingListener()
+    before = series_count(mongodb_command_duration, command="find", outcome="ok")
+    listener.succeeded(SimpleNamespace(duration_micros=1500, command_name="find"))
+    listener.failed(SimpleNamespace(duration_micros=2000, command_name="find"))
+    assert series_count(mongodb_command_duration, command="find", outcome="ok") == before + 1
+    assert series_count(mongodb_command_duration, command="find", outcome="error") >= 1
+
+def test_requests_are_labelled_by_route_template():
+    app = FastAPI()
+    app.middleware("http")(record_request_latency)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    before = series_count(http_request_duration, method="GET", route="/items/{item_id}", status=200)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/nowhere")
+    assert series_count(http_request_duration, method="GET", route="/items/{item_id}", status=200) == before + 2
+    assert series_count(http_request_duration, method="GET", route="unmatched", status=404) >= 1
+    assert 'route="/items/{item_id}"' in registry.render()
@@ -0,0 +1,28 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.repositories.otp_repository import OTPRepository
+
+def make_repository(collection):
+    db = MagicMock()
+    db.__getitem__.return_value = collection
+    with patch("app.repositories.otp_repository.get_mongo_db", return_value=db):
+        return OTPRepository()
+
+def test_consume_otp_is_single_conditional_delete():
+    collection = MagicMock()
+    collection.find_one_and_delete = AsyncMock(return_value={"_id": "otp-1"})
+    repository = make_repository(collection)
+    assert asyncio.run(repository.consume_otp("a@example.com", "123456"))
+    collection.find_one_and_delete.assert_awaited_once()
+    query = collection.find_one_and_delete.await_args.args[0]
+    assert query["email"] == "a@example.com"
+    assert query["otp"] == "123456"
+    assert query["expires_at"]["$gt"] <= datetime.utcnow()
+    collection.find_one.assert_not_called()
+
+def test_consume_otp_rejects_missing_wrong_or_expired():
+    collection = MagicMock()
+    collection.find_one_and_delete = AsyncMock(return_value=None)
+    repository = make_repository(collection)
+    assert not asyncio.run(repository.consume_otp("a@example.com", "000000"))
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+from unittest.mock import patch
+from app.utils.password_hasher import PasswordHasher
+from app.utils.security import hash_password, hash_value, verify_password
+
+def test_hash_and_verify_password():
+    hashed = hash_password("password1234", iterations=1000)
+    assert hashed.startswith("pbkdf2_sha256$1000$")
+    assert hashed != hash_password("password1234", iterations=1000)  # salted
+    assert verify_password("password1234", hashed)
+    assert not verify_password("wrongpassword", hashed)
+
+def test_verify_legacy_sha256_hash():
+    assert verify_password("password1234", hash_value("password1234"))
+    assert not verify_password("wrongpassword", hash_value("password1234"))
+
+def test_hasher_runs_off_the_event_loop():
+    hasher = PasswordHasher(max_workers=2)
+
+    async def scenario():
+        with patch("app.utils.password_hasher.hash_password", side_effect=lambda pwd: threading.current_thread().name):
+            return await asyncio.gather(*(hasher.hash(f"pwd{i}") for i in range(5)))
+
+    try:
+        assert all(name.startswith("password-hash") for name in asyncio.run(scenario()))
+        stats = hasher.stats()
+        assert stats["calls"] == 5
+        assert stats["pending"] == 0
+        assert stats["max_queue_wait_seconds"] >= 0
+    finally:
+        hasher.shutdown()
+
+def test_hasher_verify():
+    hasher = PasswordHasher(max_workers=1)
+    try:
+        hashed = hash_password("password1234", iterations=1000)
+        assert asyncio.run(hasher.verify("password1234", hashed))
+        assert not asyncio.run(hasher.verify("nope", hashed))
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,119 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock
+from app.core.events import ProductEventBus, encode_sse, merge_events
+from app.models.product_model import ProductCreateModel, ProductUpdateModel, StockReservationItem
+from app.services.product_service import ProductService
+from app.storage import MemoryClient
+
+def test_merge_events_prefers_add_and_latest_snapshot():
+    add = {"type": "add", "product_id": "p", "product": {"price": 1}}
+    update = {"type": "update", "product_id": "p", "product": {"price": 2}}
+    assert merge_events(add, update) == {"type": "add", "product_id": "p", "product": {"price": 2}}
+    stock = {"type": "stock", "product_id": "p", "in_stock_delta": -2}
+    assert merge_events(update, stock) == {"type": "update", "product_id": "p"}
+    assert merge_events(stock, dict(stock, in_stock_delta=5))["in_stock_delta"] == 3
+
+def test_publish_coalesces_per_product_until_flush():
+    async def run():
+        bus = ProductEventBus(coalesce_window=60)
+        subscription = bus.subscribe()
+        bus.publish("update", "a", product={"price": 1})
+        bus.publish("update", "a", product={"price": 2})
+        bus.publish("stock", "b", in_stock_delta=-1)
+        bus.flush()
+        return bus, [await subscription.get(timeout=0) for _ in range(3)]
+
+    bus, (first, second, third) = asyncio.run(run())
+    assert first == {"type": "update", "product_id": "a", "product": {"price": 2}, "id": f"{bus.epoch}-1"}
+    assert second["id"] == f"{bus.epoch}-2" and second["in_stock_delta"] == -1
+    assert third is None
+    assert bus.stats()["coalesced"] == 1 and bus.stats()["emitted"] == 2
+
+def test_publish_flushes_after_coalesce_window():
+    async def run():
+        bus = ProductEventBus(coalesce_window=0.01)
+        subscription = bus.subscribe()
+        bus.publish("add", "a", product={})
+        return await subscription.get(timeout=1)
+
+    assert asyncio.run(run())["type"] == "add"
+
+def test_subscribe_resumes_from_buffer_or_resets():
+    async def run():
+        bus = ProductEventBus(buffer_size=2, coalesce_window=60)
+        for product_id in "abc":
+            bus.publish("update", product_id)
+            bus.flush()
+        resumed = bus.subscribe(f"{bus.epoch}-2")
+        too_old = bus.subscribe(f"{bus.epoch}-0")
+        other_process = bus.subscribe("1234-3")
+        return bus, [await s.get(timeout=0) for s in (resumed, resumed, too_old, other_process)]
+
+    bus, (resumed, nothing, too_old, other_process) = asyncio.run(run())
+    assert resumed["product_id"] == "c" and nothing is None
+    assert too_old == {"id": f"{bus.epoch}-3", "type": "reset"}
+    assert other_process["type"] == "reset"
+
+def test_slow_subscriber_is_dropped_after_its_queue_fills():
+    async def run():
+        bus = ProductEventBus(coalesce_window=60, subscriber_queue_size=1)
+        slow = bus.subscribe()
+        for product_id in "ab":
+            bus.publish("update", product_id)
+            bus.flush()
+        return bus, slow, [await slow.get(timeout=0), await slow.get(timeout=0)]
+
+    bus, slow, events = asyncio.run(run())
+    assert slow.lagged and events[0]["product_id"] == "a" and events[1] is None
+    assert bus.stats()["subscribers"] == 0 and bus.stats()["lagged_subscribers"] == 1
+
+def test_encode_sse_frames_event():
+    frame = encode_sse({"id": "e-1", "type": "stock", "product_id": "a", "in_stock_delta": -1})
+    lines = frame.decode().split("\n")
+    assert lines[:2] == ["id: e-1", "event: product.stock"]
+    assert json.loads(lines[2][len("data: "):])["in_stock_delta"] == -1
+    assert frame.endswith(b"\n\n")
+
+def test_service_write_paths_publish_events():
+    async def run():
+        bus = ProductEventBus(coalesce_window=60)
+        service = ProductService(MemoryClient()["testdb"]["products"], events=bus)
+        subscription = bus.subscribe()
+        product = await service.add_product(ProductCreateModel(name="Milk", price=1.0, in_stock=5))
+        bus.flush()
+        await service.update_product(product.id, ProductUpdateModel(price=2.0))
+        await service.reserve_stock([StockReservationItem(product_id=product.id, quantity=2)])
+        bus.flush()
+        reservation = await service.reserve_stock([StockReservationItem(product_id=product.id, quantity=1)])
+        bus.flush()
+        await service.release_stock(reservation.reservation_id)
+        await service.propagate_product_update(product.id)
+        bus.flush()
+        return product, [await subscription.get(timeout=0) for _ in range(5)]
+
+    product, (added, updated, reserved, released, nothing) = asyncio.run(run())
+    assert added["type"] == "add" and added["product"]["_id"] == product.id
+    # The reservation after the update makes the snapshot stale, so it is dropped
+    assert updated == {"type": "update", "product_id": product.id, "id": updated["id"]}
+    assert reserved["in_stock_delta"] == -1
+    assert released["type"] == "update" and "product" not in released
+    assert nothing is None
+
+def test_stream_ends_for_lagged_subscriber_and_unsubscribes():
+    from app.controllers.product_controller import stream_product_events
+
+    async def run():
+        bus = ProductEventBus(coalesce_window=60, subscriber_queue_size=1)
+        subscription = bus.subscribe()
+        for product_id in "ab":
+            bus.publish("update", product_id)
+            bus.flush()
+        request = MagicMock()
+        request.is_disconnected = AsyncMock(return_value=False)
+        return bus, [chunk async for chunk in stream_product_events(request, subscription, heartbeat=0)]
+
+    bus, chunks = asyncio.run(run())
+    assert chunks[0].startswith(b"retry:")
+    assert b"product.update" in chunks[1] and len(chunks) == 2
+    assert bus.stats()["subscribers"] == 0
@@ -1,9 +1,24 @@
+import asyncio
 import pytest
-from unittest.mock import MagicMock, patch
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
 from fastapi import HTTPException
-from app.models.product import ProductModel, ProductCreateModel, ProductUpdateModel
-from app.services.product_service import ProductService
+from pymongo.errors import BulkWriteError, PyMongoError
+from app.models.product_model import (
+    ProductModel,
+    ProductCreateModel,
+    ProductUpdateModel,
+    ProductFilterModel,
+    StockReservationItem,
+    parse_product_fields,
+)
+from app.services.product_service import ProductService, build_product_query
 from app.services.logging_service import LoggingService
+from app.utils.cache import TTLCache
+from app.utils.serialization import FastJSONResponse
+from app.utils.pagination import decode_cursor
+from app.utils.product_io import parse_csv, parse_ndjson, encode_csv, encode_ndjson
 
 # Fixtures for test data
 def sample_product_dict():
@@ -33,84 +48,520 @@ def sample_product_update():
 
 def test_add_product_success():
     collection = MagicMock()
+    collection.insert_one = AsyncMock()
     collection.insert_one.return_value.inserted_id = "507f1f77bcf86cd799439011"
     service = ProductService(collection)
     product_data = sample_product_create()
     with patch("app.services.product_service.ProductModel", autospec=True) as MockProductModel:
         MockProductModel.return_value = "product_model_instance"
-        result = service.add_product(product_data)
+        result = asyncio.run(service.add_product(product_data))
         assert result == "product_model_instance"
         collection.insert_one.assert_called_once()
 
 def test_add_product_db_error():
     collection = MagicMock()
-    collection.insert_one.side_effect = Exception("DB error")
+    collection.insert_one = AsyncMock(side_effect=Exception("DB error"))
     service = ProductService(collection)
     product_data = sample_product_create()
     with pytest.raises(HTTPException) as exc:
-        service.add_product(product_data)
+        asyncio.run(service.add_product(product_data))
     assert exc.value.status_code == 500
 
 def test_update_product_success():
     collection = MagicMock()
-    collection.update_one.return_value.matched_count = 1
+    # The pre-image comes back; the post-image is derived from it
+    collection.find_one_and_update = AsyncMock(return_value=dict(sample_product_dict(), version=1))
     service = ProductService(collection)
     update_data = sample_product_update()
-    with patch.object(service, 'get_product', return_value="updated_product") as mock_get:
-        result = service.update_product("507f1f77bcf86cd799439011", update_data)
-        assert result == "updated_product"
-        collection.update_one.assert_called_once()
-        mock_get.assert_called_once()
+    result = asyncio.run(service.update_product("507f1f77bcf86cd799439011", update_data))
+    assert result.name == "Updated Product"
+    assert result.price == 12.5
+    assert result.version == 2
+    # No follow-up read
+    collection.find_one_and_update.assert_awaited_once()
+    collection.find_one.assert_not_called()
+    query, update = collection.find_one_and_update.await_args.args
+    assert update["$inc"] == {"version": 1}
+    assert update["$set"].pop("updated_at") is not None
+    assert update["$set"] == {"name": "Updated Product", "price": 12.5}
 
 def test_update_product_not_found():
     collection = MagicMock()
-    collection.update_one.return_value.matched_count = 0
+    collection.find_one_and_update = AsyncMock(return_value=None)
     service = ProductService(collection)
     update_data = sample_product_update()
-    result = service.update_product("507f1f77bcf86cd799439011", update_data)
+    result = asyncio.run(service.update_product("507f1f77bcf86cd799439011", update_data))
     assert result is None
 
+def test_update_product_version_conflict():
+    collection = MagicMock()
+    collection.find_one_and_update = AsyncMock(return_value=None)
+    collection.count_documents = AsyncMock(return_value=1)
+    service = ProductService(collection)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(service.update_product("507f1f77bcf86cd799439011", sample_product_update(), expected_version=3))
+    assert exc.value.status_code == 409
+    query = collection.find_one_and_update.await_args.args[0]
+    assert query["version"] == 3
+
 def test_update_product_no_data():
     collection = MagicMock()
     service = ProductService(collection)
     update_data = ProductUpdateModel()
     with pytest.raises(HTTPException) as exc:
-        service.update_product("507f1f77bcf86cd799439011", update_data)
+        asyncio.run(service.update_product("507f1f77bcf86cd799439011", update_data))
     assert exc.value.status_code == 400
 
-def test_logging_addition_and_edit(monkeypatch):
-    logging_service = LoggingService()
-    logs = []
-    monkeypatch.setattr(logging_service.logger, "info", lambda msg: logs.append(msg))
+def test_logging_addition_and_edit():
+    pipeline = MagicMock()
+    logging_service = LoggingService(pipeline)
     # Test addition log
     logging_service.log_product_addition("507f1f77bcf86cd799439011", "tester", {"foo": "bar"})
-    assert any("[ADD] ProductID: 507f1f77bcf86cd799439011" in log for log in logs)
+    record = pipeline.submit.call_args.args[0]
+    assert record["event"] == "add"
+    assert record["product_id"] == "507f1f77bcf86cd799439011"
+    assert record["user"] == "tester"
+    assert record["details"] == {"foo": "bar"}
     # Test edit log
     logging_service.log_product_edit("507f1f77bcf86cd799439011", "tester", {"baz": "qux"})
-    assert any("[EDIT] ProductID: 507f1f77bcf86cd799439011" in log for log in logs)
+    record = pipeline.submit.call_args.args[0]
+    assert record["event"] == "edit"
+    assert record["changes"] == {"baz": "qux"}
 
 def test_data_consistency_on_add_and_update():
     collection = MagicMock()
-    # Simulate insert_one and update_one
+    # Simulate insert_one and find_one_and_update
+    collection.insert_one = AsyncMock()
     collection.insert_one.return_value.inserted_id = "507f1f77bcf86cd799439011"
-    collection.update_one.return_value.matched_count = 1
+    collection.find_one_and_update = AsyncMock(return_value=sample_product_dict())
     # Simulate find_one for get_product
-    collection.find_one.return_value = sample_product_dict()
+    collection.find_one = AsyncMock(return_value=sample_product_dict())
     service = ProductService(collection)
     # Add product
     product_data = sample_product_create()
     with patch("app.services.product_service.ProductModel", autospec=True) as MockProductModel:
         MockProductModel.return_value = "product_model_instance"
-        added = service.add_product(product_data)
+        added = asyncio.run(service.add_product(product_data))
         assert added == "product_model_instance"
     # Update product
     update_data = sample_product_update()
     with patch("app.services.product_service.ProductModel", autospec=True) as MockProductModel:
         MockProductModel.return_value = "updated_product_model_instance"
-        updated = service.update_product("507f1f77bcf86cd799439011", update_data)
+        updated = asyncio.run(service.update_product("507f1f77bcf86cd799439011", update_data))
         assert updated == "updated_product_model_instance"
     # Data consistency: get_product returns correct data
     with patch("app.services.product_service.ProductModel", autospec=True) as MockProductModel:
         MockProductModel.return_value = "product_model_instance"
-        product = service.get_product("507f1f77bcf86cd799439011")
+        product = asyncio.run(service.get_product("507f1f77bcf86cd799439011"))
         assert product == "product_model_instance"
+
+def test_get_products_uses_async_cursor():
+    collection = MagicMock()
+    cursor = collection.find.return_value.sort.return_value.limit.return_value
+    cursor.to_list = AsyncMock(return_value=[sample_product_dict()])
+    service = ProductService(collection)
+    products = asyncio.run(service.get_products(skip=0, limit=10))
+    assert len(products) == 1
+    assert products[0].name == "Test Product"
+    cursor.to_list.assert_awaited_once_with(length=11)
+
+def test_get_products_page_keyset_cursor():
+    first = dict(sample_product_dict(), _id=ObjectId("507f1f77bcf86cd799439011"))
+    second = dict(sample_product_dict(), _id=ObjectId("507f1f77bcf86cd799439012"))
+    collection = MagicMock()
+    cursor = collection.find.return_value.sort.return_value.limit.return_value
+    cursor.to_list = AsyncMock(return_value=[first, second])
+    service = ProductService(collection)
+    products, next_cursor = asyncio.run(service.get_products_page(limit=1))
+    assert len(products) == 1
+    assert decode_cursor(next_cursor)["id"] == first["_id"]
+    # The next page is selected by _id, not by skipping
+    asyncio.run(service.get_products_page(limit=1, cursor=next_cursor, skip=50))
+    collection.find.assert_called_with({"_id": {"$gt": first["_id"]}}, None)
+    collection.find.return_value.sort.return_value.skip.assert_not_called()
+
+def test_get_products_page_invalid_cursor():
+    service = ProductService(MagicMock())
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(service.get_products_page(cursor="not-a-cursor"))
+    assert exc.value.status_code == 400
+
+async def byte_stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+async def collect(rows):
+    return [row async for row in rows]
+
+def test_parse_ndjson_across_chunk_boundaries():
+    rows = asyncio.run(collect(parse_ndjson(byte_stream(
+        b'{"name": "Apple", "price": 1.5, "in_stock": 3}\n{"name": "Pe',
+        b'ar", "price": 2, "in_stock": 1}\n\nnot json\n'
+    ))))
+    assert [row for row, _ in rows] == [1, 2, 4]
+    assert rows[1][1]["name"] == "Pear"
+    assert isinstance(rows[2][1], ValueError)
+
+def test_parse_csv_with_quoted_newline():
+    rows = asyncio.run(collect(parse_csv(byte_stream(
+        b'name,description,price,in_stock,category\n',
+        b'Milk,"Whole,\nfresh",0.99,10,Dairy\nBread,,1.25,4,\n'
+    ))))
+    assert rows[0] == (1, {"name": "Milk", "description": "Whole,\nfresh", "price": "0.99", "in_stock": "10", "category": "Dairy"})
+    assert rows[1] == (2, {"name": "Bread", "price": "1.25", "in_stock": "4"})
+
+def test_parse_csv_keeps_stray_quotes_and_skips_bom():
+    rows = asyncio.run(collect(parse_csv(byte_stream(
+        b'\xef\xbb\xbfname,description,price,in_stock\n',
+        b'TV,32" screen,199,2\nRadio,,20,1\n'
+    ))))
+    assert rows == [
+        (1, {"name": "TV", "description": '32" screen', "price": "199", "in_stock": "2"}),
+        (2, {"name": "Radio", "price": "20", "in_stock": "1"}),
+    ]
+
+def test_parse_csv_reports_unterminated_field_at_end():
+    rows = asyncio.run(collect(parse_csv(byte_stream(b'name,price\nMilk,1\n"Bread,2\n'))))
+    assert rows[0] == (1, {"name": "Milk", "price": "1"})
+    assert isinstance(rows[1][1], ValueError)
+
+def test_bulk_add_products_reports_row_errors():
+    collection = MagicMock()
+    collection.insert_many = AsyncMock(side_effect=BulkWriteError({
+        "nInserted": 1,
+        "writeErrors": [{"index": 1, "errmsg": "duplicate key"}],
+    }))
+    service = ProductService(collection)
+    rows = byte_stream(
+        b'{"name": "Apple", "price": 1.5, "in_stock": 3}\n',
+        b'{"name": "Apple", "price": -1, "in_stock": 3}\n',
+        b'{"name": "Pear", "price": 2, "in_stock": 1}\n',
+    )
+    result = asyncio.run(service.bulk_add_products(parse_ndjson(rows)))
+    assert result.inserted == 1
+    assert result.failed == 2
+    assert [err.row for err in result.errors] == [2, 3]
+    docs = collection.insert_many.await_args.args[0]
+    assert [doc["name"] for doc in docs] == ["Apple", "Pear"]
+    assert collection.insert_many.await_args.kwargs["ordered"] is False
+
+def test_bulk_add_products_chunks_inserts():
+    collection = MagicMock()
+    collection.insert_many = AsyncMock(side_effect=lambda docs, ordered: MagicMock(inserted_ids=[None] * len(docs)))
+    service = ProductService(collection)
+    lines = [b'{"name": "Item %d", "price": 1, "in_stock": 1}\n' % i for i in range(5)]
+    result = asyncio.run(service.bulk_add_products(parse_ndjson(byte_stream(*lines)), chunk_size=2))
+    assert result.inserted == 5
+    assert collection.insert_many.await_count == 3
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = list(docs)
+        self.close = AsyncMock()
+
+    def sort(self, *args):
+        return self
+
+    def batch_size(self, size):
+        self.size = size
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.docs:
+            raise StopAsyncIteration
+        return self.docs.pop(0)
+
+def test_export_streams_ndjson_and_csv():
+    doc = dict(sample_product_dict(), _id=ObjectId("507f1f77bcf86cd799439011"))
+    collection = MagicMock()
+    collection.find.side_effect = lambda *args: FakeCursor([doc, doc])
+    service = ProductService(collection)
+    ndjson = b"".join(asyncio.run(collect(encode_ndjson(service.iter_product_documents(batch_size=1)))))
+    lines = ndjson.decode().splitlines()
+    assert len(lines) == 2
+    assert '"id": "507f1f77bcf86cd799439011"' in lines[0]
+    csv_body = b"".join(asyncio.run(collect(encode_csv(service.iter_product_documents())))).decode()
+    assert csv_body.splitlines()[0] == "id,name,description,price,in_stock,category"
+    assert csv_body.splitlines()[1] == "507f1f77bcf86cd799439011,Test Product,A test product.,10.0,5,TestCat"
+
+def test_get_product_read_through_cache():
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value=sample_product_dict())
+    cache = TTLCache(maxsize=10, ttl=60)
+    service = ProductService(collection, cache=cache)
+    first = asyncio.run(service.get_product("507f1f77bcf86cd799439011"))
+    second = asyncio.run(service.get_product("507f1f77bcf86cd799439011"))
+    assert first is second
+    collection.find_one.assert_awaited_once()
+    assert cache.stats()["hits"] == 1
+
+def test_update_product_refreshes_cache():
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value=sample_product_dict())
+    collection.find_one_and_update = AsyncMock(return_value=dict(sample_product_dict(), name="Updated Product"))
+    cache = TTLCache(maxsize=10, ttl=60)
+    service = ProductService(collection, cache=cache)
+    asyncio.run(service.get_product("507f1f77bcf86cd799439011"))
+    updated = asyncio.run(service.update_product("507f1f77bcf86cd799439011", sample_product_update()))
+    assert updated.name == "Updated Product"
+    assert cache.get("507f1f77bcf86cd799439011").name == "Updated Product"
+
+def test_build_product_query():
+    filters = ProductFilterModel(category="Dairy", min_price=1, max_price=5, in_stock_only=True)
+    assert build_product_query(filters) == {
+        "category": "Dairy",
+        "price": {"$gte": 1, "$lte": 5},
+        "in_stock": {"$gt": 0},
+    }
+    assert build_product_query(ProductFilterModel()) == {}
+
+def test_get_products_page_sorted_by_price():
+    first = dict(sample_product_dict(), _id=ObjectId("507f1f77bcf86cd799439011"), price=2.0)
+    second = dict(sample_product_dict(), _id=ObjectId("507f1f77bcf86cd799439012"), price=3.0)
+    collection = MagicMock()
+    cursor = collection.find.return_value.sort.return_value.limit.return_value
+    cursor.to_list = AsyncMock(return_value=[first, second])
+    service = ProductService(collection)
+    filters = ProductFilterModel(category="Dairy", sort="-price")
+    _, next_cursor = asyncio.run(service.get_products_page(limit=1, filters=filters))
+    collection.find.return_value.sort.assert_called_with([("price", -1), ("_id", -1)])
+    asyncio.run(service.get_products_page(limit=1, cursor=next_cursor, filters=filters))
+    collection.find.assert_called_with({"$and": [
+        {"category": "Dairy"},
+        {"$or": [{"price": {"$lt": 2.0}}, {"price": 2.0, "_id": {"$lt": first["_id"]}}]},
+    ]}, None)
+
+def test_get_products_page_rejects_cursor_from_other_sort():
+    doc = dict(sample_product_dict(), _id=ObjectId("507f1f77bcf86cd799439011"))
+    collection = MagicMock()
+    cursor = collection.find.return_value.sort.return_value.limit.return_value
+    cursor.to_list = AsyncMock(return_value=[doc, doc])
+    service = ProductService(collection)
+    _, next_cursor = asyncio.run(service.get_products_page(limit=1, filters=ProductFilterModel(sort="price")))
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(service.get_products_page(limit=1, cursor=next_cursor))
+    assert exc.value.status_code == 400
+
+def test_get_products_page_unsupported_sort():
+    service = ProductService(MagicMock())
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(service.get_products_page(filters=ProductFilterModel(sort="description")))
+    assert exc.value.status_code == 400
+
+def test_parse_product_fields():
+    assert parse_product_fields("price, name") == ("id", "name", "price")
+    with pytest.raises(ValueError):
+        parse_product_fields("name,secret")
+
+def test_get_product_with_fields_uses_projection():
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value={"_id": ObjectId("507f1f77bcf86cd799439011"), "price": 10.0})
+    service = ProductService(collection)
+    product = asyncio.run(service.get_product("507f1f77bcf86cd799439011", fields=("id", "price")))
+    assert product.dict(by_alias=True) == {"_id": "507f1f77bcf86cd799439011", "price": 10.0}
+    # The validators are read along with the fieldset for the response headers
+    assert collection.find_one.await_args.args[1] == {"price": 1, "version": 1, "updated_at": 1}
+
+def test_get_product_with_validators_reads_them_with_the_fieldset():
+    collection = MagicMock()
+    updated_at = datetime(2024, 5, 1)
+    collection.find_one = AsyncMock(return_value={
+        "_id": ObjectId("507f1f77bcf86cd799439011"), "price": 10.0, "version": 3, "updated_at": updated_at
+    })
+    service = ProductService(collection)
+    product, validators = asyncio.run(service.get_product_with_validators("507f1f77bcf86cd799439011", fields=("id", "price")))
+    assert validators == (3, updated_at)
+    assert product.dict(by_alias=True) == {"_id": "507f1f77bcf86cd799439011", "price": 10.0}
+    raw, _ = asyncio.run(service.get_product_with_validators("507f1f77bcf86cd799439011", fields=("id", "price"), raw=True))
+    assert raw == {"_id": ObjectId("507f1f77bcf86cd799439011"), "price": 10.0}
+    assert collection.find_one.await_count == 2
+
+def test_get_product_with_fields_trims_cached_product():
+    collection = MagicMock()
+    collection.find_one = AsyncMock(return_value=sample_product_dict())
+    service = ProductService(collection, cache=TTLCache(maxsize=10, ttl=60))
+    asyncio.run(service.get_product("507f1f77bcf86cd799439011"))
+    product = asyncio.run(service.get_product("507f1f77bcf86cd799439011", fields=("id", "name")))
+    assert product.dict(by_alias=True) == {"_id": "507f1f77bcf86cd799439011", "name": "Test Product"}
+    collection.find_one.assert_awaited_once()
+
+def test_get_products_page_with_fields_keeps_sort_key_for_cursor():
+    docs = [
+        {"_id": ObjectId("507f1f77bcf86cd799439011"), "name": "A", "price": 2.0},
+        {"_id": ObjectId("507f1f77bcf86cd799439012"), "name": "B", "price": 3.0},
+    ]
+    collection = MagicMock()
+    cursor = collection.find.return_value.sort.return_value.limit.return_value
+    cursor.to_list = AsyncMock(return_value=docs)
+    service = ProductService(collection)
+    products, next_cursor = asyncio.run(service.get_products_page(
+        limit=1, filters=ProductFilterModel(sort="price"), fields=("id", "name")
+    ))
+    # The version is read for the page ETag but not returned
+    assert collection.find.call_args.args[1] == {"name": 1, "price": 1, "version": 1}
+    assert products[0].dict(by_alias=True) == {"_id": "507f1f77bcf86cd799439011", "name": "A"}
+    assert decode_cursor(next_cursor)["v"] == 2.0
+
+def test_get_products_page_raw_skips_validation():
+    doc = dict(sample_product_dict(), _id=ObjectId("507f1f77bcf86cd799439011"), price=0)  # would fail ProductModel
+    collection = MagicMock()
+    cursor = collection.find.return_value.sort.return_value.limit.return_value
+    cursor.to_list = AsyncMock(return_value=[doc])
+    service = ProductService(collection)
+    with patch("app.services.product_service.ProductModel") as MockProductModel:
+        products, _ = asyncio.run(service.get_products_page(raw=True))
+        MockProductModel.assert_not_called()
+    assert products == [doc]
+    assert "version" in collection.find.call_args.args[1]
+
+def test_fast_json_response_encodes_object_ids():
+    doc = dict(sample_product_dict(), _id=ObjectId("507f1f77bcf86cd799439011"))
+    body = FastJSONResponse(content=[doc]).body
+    assert b'"_id":"507f1f77bcf86cd799439011"' in body
+
+def make_stock_service(stock):
+    """ProductService over the in-memory backend with one product per entry of `stock`."""
+    from app.storage import MemoryClient
+    collection = MemoryClient()["testdb"]["products"]
+    service = ProductService(collection, cache=TTLCache(maxsize=10, ttl=60))
+    ids = []
+    for i, in_stock in enumerate(stock):
+        product = asyncio.run(service.add_product(ProductCreateModel(name=f"p{i}", price=1.0, in_stock=in_stock)))
+        ids.append(product.id)
+    return service, collection, ids
+
+def test_reserve_stock_reports_each_item():
+    service, collection, (a, b) = make_stock_service([5, 1])
+    result = asyncio.run(service.reserve_stock([
+        StockReservationItem(product_id=a, quantity=2),
+        StockReservationItem(product_id=a, quantity=1),
+        StockReservationItem(product_id=b, quantity=2),
+        StockReservationItem(product_id=str(ObjectId()), quantity=1),
+        StockReservationItem(product_id="bad", quantity=1),
+    ]))
+    assert not result.reserved
+    assert [(i.quantity, i.reserved, i.error) for i in result.items] == [
+        (3, True, None), (2, False, "insufficient_stock"), (1, False, "not_found"), (1, False, "invalid_id")
+    ]
+    product = asyncio.run(service.get_product(a))
+    assert (product.in_stock, product.version) == (2, 2)
+
+def test_concurrent_reservations_never_oversell():
+    service, collection, (a,) = make_stock_service([10])
+
+    async def run():
+        return await asyncio.gather(*(service.reserve_stock([StockReservationItem(product_id=a, quantity=3)]) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert sum(r.reserved for r in results) == 3
+    assert asyncio.run(service.get_product(a)).in_stock == 1
+
+def test_release_restores_stock_once_and_commit_finalizes():
+    service, collection, (a, b) = make_stock_service([5, 5])
+    items = [StockReservationItem(product_id=a, quantity=2), StockReservationItem(product_id=b, quantity=4)]
+    first = asyncio.run(service.reserve_stock(items))
+    released = asyncio.run(service.release_stock(first.reservation_id))
+    assert {(i.product_id, i.quantity) for i in released.items} == {(a, 2), (b, 4)}
+    assert asyncio.run(service.release_stock(first.reservation_id)) is None
+    assert [asyncio.run(service.get_product(pid)).in_stock for pid in (a, b)] == [5, 5]
+    second = asyncio.run(service.reserve_stock(items))
+    assert asyncio.run(service.commit_stock(second.reservation_id)).products == 2
+    assert asyncio.run(service.release_stock(second.reservation_id)) is None
+    assert [asyncio.run(service.get_product(pid)).in_stock for pid in (a, b)] == [3, 1]
+    assert asyncio.run(collection.count_documents({"reservations.id": second.reservation_id})) == 0
+
+def test_release_reports_only_products_it_restored():
+    service, collection, (a, b) = make_stock_service([5, 5])
+    reservation = asyncio.run(service.reserve_stock(
+        [StockReservationItem(product_id=a, quantity=2), StockReservationItem(product_id=b, quantity=4)]
+    ))
+    original = collection.find_one_and_update
+
+    async def commit_b_first(filter, update, **kwargs):
+        # A commit of product b lands between the pre-read and the conditional update
+        if filter["_id"] == ObjectId(b):
+            await collection.update_one({"_id": filter["_id"]}, {"$pull": {"reservations": {"id": reservation.reservation_id}}})
+        return await original(filter, update, **kwargs)
+
+    collection.find_one_and_update = commit_b_first
+    released = asyncio.run(service.release_stock(reservation.reservation_id))
+    assert [(i.product_id, i.quantity) for i in released.items] == [(a, 2)]
+    assert [asyncio.run(service.get_product(pid)).in_stock for pid in (a, b)] == [5, 1]
+
+def test_release_expired_reservations_keeps_recent_and_committed_ones():
+    service, collection, (a, b) = make_stock_service([5, 5])
+    old = asyncio.run(service.reserve_stock([StockReservationItem(product_id=a, quantity=2)]))
+    committed = asyncio.run(service.reserve_stock([StockReservationItem(product_id=b, quantity=1)]))
+    asyncio.run(service.commit_stock(committed.reservation_id))
+    recent = asyncio.run(service.reserve_stock([StockReservationItem(product_id=b, quantity=3)]))
+    # Backdate the first reservation past the expiry age
+    asyncio.run(collection.update_one(
+        {"_id": ObjectId(a)}, {"$set": {"reservations": [{"id": old.reservation_id, "qty": 2, "ts": datetime(2020, 1, 1)}]}}
+    ))
+    released = asyncio.run(service.release_expired_reservations(max_age=600))
+    assert [(r.reservation_id, [(i.product_id, i.quantity) for i in r.items]) for r in released] == [(old.reservation_id, [(a, 2)])]
+    assert [asyncio.run(service.get_product(pid)).in_stock for pid in (a, b)] == [5, 1]
+    assert asyncio.run(collection.count_documents({"reservations.id": recent.reservation_id})) == 1
+
+def test_reserve_stock_all_or_nothing_rolls_back():
+    service, collection, (a, b) = make_stock_service([5, 0])
+    result = asyncio.run(service.reserve_stock(
+        [StockReservationItem(product_id=a, quantity=1), StockReservationItem(product_id=b, quantity=1)], all_or_nothing=True
+    ))
+    assert [(i.reserved, i.error) for i in result.items] == [(False, "rolled_back"), (False, "insufficient_stock")]
+    assert asyncio.run(service.get_product(a)).in_stock == 5
+
+def test_reserve_stock_all_or_nothing_reports_items_the_rollback_left_reserved():
+    service, collection, (a, b, c) = make_stock_service([5, 5, 0])
+    items = [StockReservationItem(product_id=pid, quantity=1) for pid in (a, b, c)]
+    original = collection.find_one_and_update
+
+    async def fail_for_b(filter, update, **kwargs):
+        if filter["_id"] == ObjectId(b):
+            raise PyMongoError("connection lost")
+        return await original(filter, update, **kwargs)
+
+    collection.find_one_and_update = fail_for_b
+    result = asyncio.run(service.reserve_stock(items, all_or_nothing=True))
+    assert not result.reserved
+    assert [(i.reserved, i.error) for i in result.items] == [(False, "rolled_back"), (True, None), (False, "insufficient_stock")]
+    assert [asyncio.run(service.get_product(pid)).in_stock for pid in (a, b)] == [5, 4]
+    # The client can still release what the rollback could not
+    collection.find_one_and_update = original
+    released = asyncio.run(service.release_stock(result.reservation_id))
+    assert [(i.product_id, i.quantity) for i in released.items] == [(b, 1)]
+
+def test_reserve_stock_all_or_nothing_returns_result_when_rollback_fails():
+    service, collection, (a, b) = make_stock_service([5, 0])
+    collection.find_one_and_update = AsyncMock(side_effect=PyMongoError("connection lost"))
+    result = asyncio.run(service.reserve_stock(
+        [StockReservationItem(product_id=a, quantity=1), StockReservationItem(product_id=b, quantity=1)], all_or_nothing=True
+    ))
+    assert [(i.reserved, i.error) for i in result.items] == [(True, None), (False, "insufficient_stock")]
+    assert asyncio.run(collection.count_documents({"reservations.id": result.reservation_id})) == 1
+
+def test_list_products_rejects_out_of_range_limit():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.controllers.product_controller import get_product_service
+    service = MagicMock()
+    app.dependency_overrides[get_product_service] = lambda: service
+    try:
+        client = TestClient(app)
+        for limit in (0, -1, 1001):
+            assert client.get(f"/products/?limit={limit}").status_code == 422
+    finally:
+        app.dependency_overrides.pop(get_product_service, None)
+    service.get_products_page_with_etag.assert_not_called()
+
+def test_get_products_page_rejects_limit_below_one():
+    service = ProductService(MagicMock())
+    for limit in (0, -1):
+        with pytest.raises(HTTPException) as excinfo:
+            asyncio.run(service.get_products_page(limit=limit))
+        assert excinfo.value.status_code == 400
+        with pytest.raises(HTTPException):
+            asyncio.run(service.get_products_page_etag(limit=limit))
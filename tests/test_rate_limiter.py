@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from app.utils.rate_limiter import InMemoryRateLimitBackend, MongoRateLimitBackend, RateLimiter
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def hits(limiter, key, count):
+    return [asyncio.run(limiter.allow(key)) for _ in range(count)]
+
+def test_memory_backend_limits_per_key():
+    limiter = RateLimiter(InMemoryRateLimitBackend(limit=3, window_seconds=300, timer=FakeClock()))
+    assert hits(limiter, "a@example.com", 4) == [True, True, True, False]
+    assert hits(limiter, "b@example.com", 1) == [True]
+
+def test_memory_backend_refills_over_time():
+    clock = FakeClock()
+    limiter = RateLimiter(InMemoryRateLimitBackend(limit=3, window_seconds=300, timer=clock))
+    hits(limiter, "a@example.com", 3)
+    clock.now = 100  # one token back
+    assert hits(limiter, "a@example.com", 2) == [True, False]
+
+def test_memory_backend_bounded_and_expiring():
+    clock = FakeClock()
+    backend = InMemoryRateLimitBackend(limit=1, window_seconds=10, max_keys=2, timer=clock)
+    limiter = RateLimiter(backend)
+    for key in ("a", "b", "c"):
+        hits(limiter, key, 1)
+    assert len(backend) == 2
+    clock.now = 20
+    hits(limiter, "d", 1)
+    assert len(backend) == 1
+
+def test_mongo_backend_counts_atomically():
+    collection = MagicMock()
+    collection.find_one_and_update = AsyncMock(side_effect=[{"count": 1}, {"count": 2}])
+    limiter = RateLimiter(MongoRateLimitBackend(limit=1, window_seconds=300, collection=collection))
+    assert hits(limiter, "a@example.com", 2) == [True, False]
+    query, update = collection.find_one_and_update.await_args.args
+    assert query["_id"].startswith("a@example.com:")
+    assert update["$inc"] == {"count": 1}
+    assert "expires_at" in update["$setOnInsert"]
+    assert collection.find_one_and_update.await_args.kwargs["upsert"] is True
+
+def test_mongo_backend_retries_upsert_race():
+    collection = MagicMock()
+    collection.find_one_and_update = AsyncMock(side_effect=[DuplicateKeyError("dup"), {"count": 2}])
+    limiter = RateLimiter(MongoRateLimitBackend(limit=3, window_seconds=300, collection=collection))
+    assert hits(limiter, "a@example.com", 1) == [True]
+    assert "upsert" not in collection.find_one_and_update.await_args.kwargs
+
+def test_mongo_backend_fails_open():
+    collection = MagicMock()
+    collection.find_one_and_update = AsyncMock(side_effect=PyMongoError("down"))
+    limiter = RateLimiter(MongoRateLimitBackend(limit=1, window_seconds=300, collection=collection))
+    assert hits(limiter, "a@example.com", 1) == [True]
+
+def test_mongo_backend_windows_follow_utc_epoch():
+    collection = MagicMock()
+    collection.find_one_and_update = AsyncMock(return_value={"count": 1})
+    limiter = RateLimiter(MongoRateLimitBackend(limit=1, window_seconds=300, collection=collection))
+    with patch("app.utils.rate_limiter.time.time", return_value=1_700_000_123.5):
+        hits(limiter, "a@example.com", 1)
+    query, update = collection.find_one_and_update.await_args.args
+    assert query["_id"] == "a@example.com:1700000100"
+    assert update["$setOnInsert"]["expires_at"] == datetime(2023, 11, 14, 22, 20)
@@ -2,6 +2,7 @@ import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch
 from app.main import app
+from app.routes.user import get_current_user
 
 client = TestClient(app)
 
@@ -22,8 +23,10 @@ def override_get_current_user():
 
 @pytest.fixture(autouse=True)
 def override_dependencies():
-    with patch('app.routes.user.get_current_user', new=override_get_current_user):
-        yield
+    # Depends() holds the function itself, so patching the module attribute would not reach the routes
+    app.dependency_overrides[get_current_user] = override_get_current_user
+    yield
+    app.dependency_overrides.pop(get_current_user, None)
 
 def test_get_profile_success(mock_services):
     mock_user_service, _ = mock_services